@@ -0,0 +1,108 @@
+import io
+import os
+import pickle
+import tarfile
+import zipfile
+
+import pytest
+
+import text_stripper_archives
+import text_stripper_cli
+from text_stripper_archives import (ArchiveMemberPath, input_size, input_stat, iter_archive_members, open_input,
+                                    output_stem, display_name, split_member_path)
+from text_stripper_engine import DEFAULT_SETTINGS
+from text_stripper_inputs import iter_input_files
+
+MEMBERS = {
+    'a.txt': "A short note about the archive, written as a full sentence.\n",
+    'docs/b.txt': "The second document has a sentence of its own to keep.\n" * 50,
+    'docs/.secret.txt': "Hidden member.\n",
+    '.cache/c.txt': "Hidden folder member.\n",
+}
+VISIBLE = ['a.txt', 'docs/b.txt']
+ARCHIVES = ['x.zip', 'x.tar', 'x.tar.gz', 'x.tar.bz2', 'x.tar.xz']
+
+
+def _make_archive(path, prefix=''):
+    if path.endswith('.zip'):
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr('docs/', b'')
+            for name, text in MEMBERS.items(): zf.writestr(name, text)
+        return
+    mode = {'.tar': 'w', '.gz': 'w:gz', '.bz2': 'w:bz2', '.xz': 'w:xz'}[os.path.splitext(path)[1]]
+    with tarfile.open(path, mode) as tf:
+        folder = tarfile.TarInfo(prefix + 'docs'); folder.type = tarfile.DIRTYPE
+        tf.addfile(folder)
+        for name, text in MEMBERS.items():
+            data = text.encode('utf-8')
+            info = tarfile.TarInfo(prefix + name); info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+
+@pytest.fixture
+def archives(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for name in ARCHIVES: _make_archive(name)
+    return tmp_path
+
+
+@pytest.mark.parametrize('archive', ARCHIVES)
+def test_members_are_listed_in_archive_order(archives, archive):
+    assert [split_member_path(path)[1] for path in iter_archive_members(archive)] == VISIBLE
+    assert [split_member_path(path)[1] for path in iter_archive_members(archive, include_hidden=True)] == list(MEMBERS)
+
+@pytest.mark.parametrize('archive', ARCHIVES)
+@pytest.mark.parametrize('inline_bytes', [0, 1024 * 1024]) # Compressed tar members by offset, then with their bytes
+def test_members_read_back_after_pickling(archives, archive, inline_bytes, monkeypatch):
+    monkeypatch.setattr(text_stripper_archives, 'TAR_INLINE_BYTES', inline_bytes)
+    for path in iter_archive_members(archive, include_hidden=True):
+        path = pickle.loads(pickle.dumps(path)) # As sent to a worker
+        expected = MEMBERS[split_member_path(path)[1]].encode('utf-8')
+        with open_input(path) as f:
+            assert f.read() == expected
+        with open_input(path, in_memory=True) as f:
+            assert f.read() == expected
+        assert input_size(path) == input_stat(path).st_size == len(expected)
+        assert input_stat(path).st_mtime_ns == os.stat(archive).st_mtime_ns
+
+@pytest.mark.parametrize('archive', ARCHIVES)
+def test_typed_member_paths_work(archives, archive):
+    path = archive + "!/docs/b.txt" # A plain string, as given on the command line
+    with open_input(path) as f:
+        assert f.read() == MEMBERS['docs/b.txt'].encode('utf-8')
+    assert output_stem(path) == archive + "!docs!b" and display_name(path) == archive + "!/docs/b.txt"
+    with pytest.raises(FileNotFoundError):
+        input_stat(archive + "!/docs/missing.txt")
+
+def test_dot_slash_tar_names_are_not_hidden(tmp_path):
+    archive = str(tmp_path / 'dot.tar.gz')
+    _make_archive(archive, prefix='./')
+    paths = list(iter_archive_members(archive))
+    assert [split_member_path(path)[1] for path in paths] == ['./' + name for name in VISIBLE]
+    assert output_stem(paths[1]) == archive + "!docs!b"
+
+def test_member_paths_pickle_with_their_details():
+    path = ArchiveMemberPath("x.tar!/a.txt", 5, 123, offset=512)
+    copy = pickle.loads(pickle.dumps(path))
+    assert copy == path and (copy.size, copy.mtime_ns, copy.data, copy.offset) == (5, 123, None, 512)
+
+def test_input_expansion_reads_archives_and_reports_damaged_ones(archives):
+    with open('bad.zip', 'wb') as f: f.write(b"PK\x03\x04 not really a zip")
+    errors = []
+    paths = list(iter_input_files(['x.zip', 'bad.zip', 'x.tar.gz'], on_error=lambda path, e: errors.append(path), read_archives=True))
+    assert paths == ['x.zip!/a.txt', 'x.zip!/docs/b.txt', 'x.tar.gz!/a.txt', 'x.tar.gz!/docs/b.txt']
+    assert errors == ['bad.zip']
+    assert list(iter_input_files(['x.zip'])) == ['x.zip']
+
+def test_batch_output_matches_the_unpacked_files(archives):
+    os.mkdir('unpacked'); os.mkdir(os.path.join('unpacked', 'docs'))
+    for name in VISIBLE:
+        with open(os.path.join('unpacked', name), 'w', encoding='utf-8') as f: f.write(MEMBERS[name])
+    settings = dict(DEFAULT_SETTINGS)
+    stats = text_stripper_cli.run_batch(iter_input_files(['x.tar.gz', 'x.zip', 'unpacked'], read_archives=True), settings, jobs=2)
+    assert stats.failures == [] and stats.counts == {'success': 6}
+    for archive in ('x.tar.gz', 'x.zip'):
+        for name in VISIBLE:
+            stem = os.path.splitext(name)[0]
+            with open(f"{archive}!{stem.replace('/', '!')}_processed.txt", 'rb') as f: packed = f.read()
+            with open(os.path.join('unpacked', stem + '_processed.txt'), 'rb') as f: unpacked = f.read()
+            assert packed == unpacked and packed
@@ -0,0 +1,161 @@
+import bz2
+import gzip
+import json
+import lzma
+import os
+import re
+import time
+
+import pytest
+
+import text_stripper_cli
+import text_stripper_consolidated
+from text_stripper_consolidated import ConsolidatedWriter
+from text_stripper_engine import DEFAULT_SETTINGS
+
+
+def _read(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def _entries(text):
+    """Names of the files in a consolidated text output, in order."""
+    return re.findall(r"^--- Start of file: (.*) ---$", text, re.M)
+
+def _sleepy_extract(filepath, settings=None, stream_path=None, pdf_shard=None):
+    """Stands in for extract_file: files named slow* finish last."""
+    if os.path.basename(filepath).startswith('slow'): time.sleep(0.5)
+    return 'success', f"Text of {os.path.basename(filepath)}."
+
+
+def test_outputs_are_written_in_reserved_order(tmp_path):
+    writer = ConsolidatedWriter(str(tmp_path / 'all.txt'))
+    seqs = [writer.reserve() for _ in range(4)]
+    for seq in reversed(seqs):
+        writer.put(seq, f"f{seq}.txt", f"Text {seq}." if seq != 1 else None)
+    writer.close()
+    assert _entries(_read(tmp_path / 'all.txt')) == ['f0.txt', 'f2.txt', 'f3.txt']
+    assert writer.errors == [] and os.listdir(tmp_path) == ['all.txt']
+
+def test_order_holds_when_early_outputs_spill(tmp_path, monkeypatch):
+    monkeypatch.setattr(text_stripper_consolidated, 'REORDER_BUFFER_CHARS', 10)
+    writer = ConsolidatedWriter(str(tmp_path / 'all.txt'))
+    seqs = [writer.reserve() for _ in range(20)]
+    for seq in seqs[1:]: writer.put(seq, f"f{seq}.txt", f"Text of file {seq}, long enough to spill.")
+    writer.put(seqs[0], "f0.txt", "First.")
+    writer.close()
+    assert _entries(_read(tmp_path / 'all.txt')) == [f"f{seq}.txt" for seq in seqs]
+
+def test_put_without_a_reserved_sequence_number_fails(tmp_path):
+    writer = ConsolidatedWriter(str(tmp_path / 'all.txt'))
+    with pytest.raises(ValueError):
+        writer.put(None, "f.txt", "Text.")
+    writer.close()
+
+def test_writer_failure_is_reported_and_raised(tmp_path, monkeypatch):
+    writer = ConsolidatedWriter(str(tmp_path / 'all.txt'), shard_files=1)
+    def no_room(): raise OSError("No space left on device")
+    monkeypatch.setattr(writer, '_open_shard', no_room) # The roll to the second shard fails
+    seqs = [writer.reserve() for _ in range(3 * text_stripper_consolidated.HANDOFF_QUEUE_SIZE)]
+    started = time.monotonic()
+    for seq in seqs: writer.put(seq, f"f{seq}.txt", f"Text {seq}.", tag='success')
+    assert time.monotonic() - started < 10 # No put waits forever on a stopped writer
+    with pytest.raises(RuntimeError, match="No space left"):
+        writer.close()
+    assert sorted(filename for filename, _, _ in writer.errors) == sorted(f"f{seq}.txt" for seq in seqs[1:])
+    assert all(tag == 'success' for _, tag, _ in writer.errors)
+    assert os.listdir(tmp_path) == ['all.00001.txt'] # The finished shard; no temp files
+
+def test_batch_output_is_in_input_order_with_duplicates(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(text_stripper_cli, 'extract_file', _sleepy_extract)
+    names = ['slow.txt', 'a.txt', 'b.txt', 'slow.txt', 'a.txt', 'c.txt']
+    for name in set(names): (tmp_path / name).write_text("input", encoding='utf-8')
+    settings = dict(DEFAULT_SETTINGS, consolidate_output_enabled_var=1, consolidated_output_filename_var='all.txt')
+    stats = text_stripper_cli.run_batch(names, settings, jobs=3)
+    assert stats.failures == [] and stats.counts == {'success': len(names)}
+    text = _read(tmp_path / 'all.txt')
+    assert _entries(text) == names
+    assert text.count("Text of slow.txt.") == 2
+
+def test_batch_reports_a_failed_writer(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(text_stripper_cli, 'extract_file', _sleepy_extract)
+    opened = []
+    real_open_shard = ConsolidatedWriter._open_shard
+    def open_shard_once(self):
+        if opened: raise OSError("No space left on device")
+        opened.append(True)
+        return real_open_shard(self)
+    monkeypatch.setattr(ConsolidatedWriter, '_open_shard', open_shard_once)
+    names = ['a.txt', 'b.txt', 'c.txt']
+    for name in names: (tmp_path / name).write_text("input", encoding='utf-8')
+    settings = dict(DEFAULT_SETTINGS, consolidate_output_enabled_var=1, consolidated_output_filename_var='all.txt',
+                    consolidated_shard_files_var=1)
+    stats = text_stripper_cli.run_batch(names, settings, jobs=2)
+    failed = {os.path.basename(path) for path, status, _ in stats.failures if status == 'error'}
+    assert failed == {'all.txt', 'b.txt', 'c.txt'}
+    assert stats.counts == {'success': 1, 'error': 2}
+
+
+def _write_batch(path, count, **options):
+    writer = ConsolidatedWriter(str(path), **options)
+    for seq in [writer.reserve() for _ in range(count)]:
+        writer.put(seq, f"f{seq}.txt", f"Text of file {seq}.")
+    writer.close()
+    return writer
+
+def _index(directory):
+    with open(directory / 'all.index.json', 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def test_shards_roll_over_by_file_count(tmp_path):
+    writer = _write_batch(tmp_path / 'all.txt', 5, shard_files=2)
+    assert sorted(os.listdir(tmp_path)) == ['all.00001.txt', 'all.00002.txt', 'all.00003.txt', 'all.index.json']
+    assert _entries(_read(tmp_path / 'all.00002.txt')) == ['f2.txt', 'f3.txt']
+    index = _index(tmp_path)
+    assert index['format'] == text_stripper_consolidated.INDEX_FORMAT and index['compression'] == 'none'
+    assert [shard['inputs'] for shard in index['shards']] == [['f0.txt', 'f1.txt'], ['f2.txt', 'f3.txt'], ['f4.txt']]
+    assert index['shards'][0]['characters'] == len(_read(tmp_path / 'all.00001.txt'))
+    assert writer.owns(tmp_path / 'all.00003.txt') and writer.owns(tmp_path / 'all.index.json')
+
+def test_shards_roll_over_by_size_between_files(tmp_path):
+    _write_batch(tmp_path / 'all.txt', 3, shard_chars=1) # Every file is over the limit, but still written whole
+    assert [shard['inputs'] for shard in _index(tmp_path)['shards']] == [['f0.txt'], ['f1.txt'], ['f2.txt']]
+
+def test_rerun_rewrites_the_index_and_removes_stale_shards(tmp_path):
+    _write_batch(tmp_path / 'all.txt', 5, shard_files=2)
+    (tmp_path / 'keep.txt').write_text("not a shard", encoding='utf-8')
+    index = _index(tmp_path)
+    index['shards'].append({'file': 'keep.txt', 'characters': 0, 'inputs': []}) # Never removed: not a shard name
+    (tmp_path / 'all.index.json').write_text(json.dumps(index), encoding='utf-8')
+    _write_batch(tmp_path / 'all.txt', 3, shard_files=2)
+    assert sorted(os.listdir(tmp_path)) == ['all.00001.txt', 'all.00002.txt', 'all.index.json', 'keep.txt']
+    assert [shard['file'] for shard in _index(tmp_path)['shards']] == ['all.00001.txt', 'all.00002.txt']
+    _write_batch(tmp_path / 'all.txt', 3) # Unsharded again: index and shards go
+    assert sorted(os.listdir(tmp_path)) == ['all.txt', 'keep.txt']
+
+def test_compressed_shards_hold_the_same_text(tmp_path):
+    plain, packed = tmp_path / 'plain', tmp_path / 'packed'
+    plain.mkdir(); packed.mkdir()
+    _write_batch(plain / 'all.txt', 3, shard_files=2)
+    for compression, module in (('gzip', gzip), ('xz', lzma), ('bz2', bz2)):
+        _write_batch(packed / 'all.txt', 3, shard_files=2, compression=compression)
+        suffix = text_stripper_consolidated.COMPRESSION_SUFFIXES[compression]
+        for number in (1, 2):
+            with module.open(packed / f'all.0000{number}.txt{suffix}', 'rt', encoding='utf-8') as f:
+                assert f.read() == _read(plain / f'all.0000{number}.txt')
+        assert _index(packed)['compression'] == compression
+    assert sorted(os.listdir(packed)) == ['all.00001.txt.bz2', 'all.00002.txt.bz2', 'all.index.json']
+
+def test_shards_get_the_mode_of_a_plain_open(tmp_path):
+    umask = os.umask(0o027)
+    try:
+        _write_batch(tmp_path / 'all.txt', 3, shard_files=2)
+    finally:
+        os.umask(umask)
+    assert {os.stat(tmp_path / name).st_mode & 0o777 for name in ('all.00001.txt', 'all.00002.txt')} == {0o640}
+
+def test_unknown_compression_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        ConsolidatedWriter(str(tmp_path / 'all.txt'), compression='zip')
@@ -0,0 +1,110 @@
+import random
+
+import pytest
+
+from text_stripper_engine import (NUMPY_SCORING_MIN_SEGMENTS, filter_segments, get_filter_plan, make_settings,
+                                  segment_stats)
+
+
+def _mixed_segments(count):
+    """Prose, code, digit runs (ASCII and not), symbol noise, blanks and NBSP, shuffled."""
+    rng = random.Random(13)
+    words = "the quick brown fox jumps over a lazy dog while rivers run to distant seas".split()
+    kinds = [
+        lambda: " ".join(rng.choice(words) for _ in range(rng.randint(1, 20))).capitalize() + rng.choice(".!? "),
+        lambda: f"def f_{rng.randint(0, 99)}(x): return {{'k': x[{rng.randint(0, 9)}]}} if x else None;",
+        lambda: " ".join(str(rng.randint(0, 10 ** rng.randint(1, 12))) for _ in range(rng.randint(1, 8))),
+        lambda: " ".join("".join(rng.choice("٠١٢٣٤٥٦٧٨٩０１２３４５²³¹") for _ in range(rng.randint(1, 10)))
+                         for _ in range(rng.randint(1, 6))),
+        lambda: "".join(rng.choice("#$%^&*<>|~=+-_/\\{}();:") for _ in range(rng.randint(1, 40))),
+        lambda: rng.choice(["", " ", "\t", "\u00a0", " \u00a0 "]),
+        lambda: "\u00a0".join(rng.choice(words) for _ in range(rng.randint(2, 12))) + ".\u00a0",
+        lambda: "Größe ２０２４ café " + " ".join(rng.choice(words) for _ in range(rng.randint(3, 9))) + ".",
+    ]
+    return [rng.choice(kinds)() for _ in range(count)]
+
+SCORING_SETTINGS = [
+    {},
+    {'remove_number_heavy_var': 1},
+    {'remove_number_heavy_var': 1, 'max_consecutive_digits_var': 3, 'min_words_to_exempt_digits_var': 0,
+     'number_ratio_threshold_var': 0.2, 'min_digits_for_ratio_check_var': 1},
+    {'remove_number_heavy_var': 1, 'alphanum_filter_enabled_var': 0, 'remove_code_blocks_var': 0,
+     'min_words_general_var': 2, 'min_words_sentence_var': 1},
+    {'min_code_keywords_var': 0, 'min_code_symbols_var': 1, 'code_symbol_density_var': 0.05},
+    {'code_symbol_mode_var': 'only', 'code_custom_symbols_var': '{}();a5٣'},
+    {'code_symbol_mode_var': 'except', 'code_custom_symbols_var': '-_/'},
+    {'alnum_min_len_for_ratio_var': 30, 'alphanum_threshold_var': 0.95, 'alnum_abs_count_fallback_var': 40},
+]
+
+def _scalar_flags(segments, plan):
+    flags = []
+    for segment in segments:
+        stats = segment_stats(segment, plan.symbol_set, plan.digit_runs)
+        flags.append(any(check(stats, *args) for check, args in plan.checks))
+    return flags
+
+def _filtered(segments, overrides, numpy_scoring):
+    settings = make_settings(dict(overrides, numpy_scoring_var=numpy_scoring, segment_memo_var=0))
+    return filter_segments(segments, settings)
+
+
+@pytest.mark.parametrize('overrides', SCORING_SETTINGS)
+def test_numpy_reject_flags_match_the_scalar_checks(overrides):
+    text_stripper_vector = pytest.importorskip('text_stripper_vector')
+    if not text_stripper_vector.available(): pytest.skip("NumPy is not installed")
+    segments = _mixed_segments(2000)
+    plan = get_filter_plan(make_settings(overrides))
+    flags = text_stripper_vector.reject_flags(segments, plan)
+    assert flags == _scalar_flags(segments, plan)
+    assert any(flags) and not all(flags)
+
+@pytest.mark.parametrize('overrides', SCORING_SETTINGS)
+def test_numpy_scoring_keeps_the_same_segments(overrides):
+    pytest.importorskip('numpy')
+    segments = _mixed_segments(2000)
+    assert len(segments) >= NUMPY_SCORING_MIN_SEGMENTS
+    assert _filtered(segments, overrides, 1) == _filtered(segments, overrides, 0)
+
+def test_numpy_scoring_over_several_batches(monkeypatch):
+    text_stripper_vector = pytest.importorskip('text_stripper_vector')
+    if not text_stripper_vector.available(): pytest.skip("NumPy is not installed")
+    monkeypatch.setattr(text_stripper_vector, 'MAX_BATCH_CHARS', 500)
+    segments = _mixed_segments(1000)
+    overrides = {'remove_number_heavy_var': 1, 'max_consecutive_digits_var': 4}
+    assert _filtered(segments, overrides, 1) == _filtered(segments, overrides, 0)
+
+def test_empty_and_blank_segments_are_rejected_by_both_paths():
+    text_stripper_vector = pytest.importorskip('text_stripper_vector')
+    if not text_stripper_vector.available(): pytest.skip("NumPy is not installed")
+    segments = ["", " ", "\u00a0", "\t \u2028"] * NUMPY_SCORING_MIN_SEGMENTS
+    for overrides in ({}, {'alphanum_filter_enabled_var': 0, 'remove_code_blocks_var': 0, 'remove_number_heavy_var': 1,
+                           'min_words_general_var': 0, 'min_words_sentence_var': 0}):
+        plan = get_filter_plan(make_settings(overrides))
+        assert text_stripper_vector.reject_flags(segments, plan) == [True] * len(segments)
+        assert _scalar_flags(segments, plan) == [True] * len(segments)
+
+def test_unicode_digits_count_as_digits_but_only_decimals_make_runs():
+    text_stripper_vector = pytest.importorskip('text_stripper_vector')
+    if not text_stripper_vector.available(): pytest.skip("NumPy is not installed")
+    # Arabic-Indic and fullwidth digits are decimals (\d); superscripts are digits but not decimals
+    segments = ["Total ٣٤٥٦٧٨ units were shipped this year to the buyers.",
+                "Total ３４５６７８ units were shipped this year to the buyers.",
+                "Total ²³¹²³¹ units were shipped this year to the buyers.",
+                "Total ²³¹²³¹²³¹²³¹²³¹²³¹²³¹²³¹ twice."] * NUMPY_SCORING_MIN_SEGMENTS
+    number_only = {'remove_number_heavy_var': 1, 'min_words_to_exempt_digits_var': 0, 'remove_code_blocks_var': 0,
+                   'alphanum_filter_enabled_var': 0, 'min_words_general_var': 1, 'min_words_sentence_var': 1}
+    runs = dict(number_only, max_consecutive_digits_var=6, number_ratio_threshold_var=0)
+    ratio = dict(number_only, max_consecutive_digits_var=0, number_ratio_threshold_var=0.5)
+    for overrides, expected in ((runs, [True, True, False, False]), (ratio, [False, False, False, True])):
+        plan = get_filter_plan(make_settings(overrides))
+        assert text_stripper_vector.reject_flags(segments, plan) == expected * NUMPY_SCORING_MIN_SEGMENTS
+        assert _scalar_flags(segments, plan) == expected * NUMPY_SCORING_MIN_SEGMENTS
+        assert _filtered(segments, overrides, 1) == _filtered(segments, overrides, 0)
+
+def test_line_feed_in_the_symbol_set_falls_back_to_the_scalar_checks():
+    text_stripper_vector = pytest.importorskip('text_stripper_vector')
+    overrides = {'code_symbol_mode_var': 'only', 'code_custom_symbols_var': '{}();\n'}
+    segments = _mixed_segments(1000) + ["one\ntwo\nthree\nfour five six seven eight nine ten eleven."] * 10
+    # The line feed joins the segments in the batch buffer, so batch scoring would count it
+    assert text_stripper_vector.reject_flags(segments, get_filter_plan(make_settings(overrides))) is None
+    assert _filtered(segments, overrides, 1) == _filtered(segments, overrides, 0)
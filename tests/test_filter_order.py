@@ -0,0 +1,73 @@
+import concurrent.futures
+import random
+
+import text_stripper_engine
+from text_stripper_engine import CheckOrder, make_settings, process_text
+
+
+def _mixed_text(num_paragraphs):
+    """Prose, code, number tables and symbol noise, shuffled, so every reject check has work."""
+    rng = random.Random(7)
+    words = "the quick brown fox jumps over a lazy dog while rivers run to distant seas".split()
+    kinds = [
+        lambda: " ".join(rng.choice(words) for _ in range(rng.randint(3, 25))).capitalize() + ".",
+        lambda: f"def f_{rng.randint(0, 99)}(x): return {{'k': x[{rng.randint(0, 9)}]}} if x else None;",
+        lambda: " ".join(str(rng.randint(0, 10 ** 6)) for _ in range(rng.randint(2, 12))),
+        lambda: "".join(rng.choice("#$%^&*<>|~=+-_/\\") for _ in range(rng.randint(5, 40))),
+        lambda: " ".join(rng.choice(words) for _ in range(rng.randint(1, 3))),
+    ]
+    return "\n\n".join(rng.choice(kinds)() for _ in range(num_paragraphs))
+
+
+def test_adaptive_order_keeps_the_same_segments(monkeypatch):
+    # Small windows, so the order is settled and measured again several times in one text
+    monkeypatch.setattr(text_stripper_engine, 'ADAPTIVE_ORDER_SAMPLE', 50)
+    monkeypatch.setattr(text_stripper_engine, 'ADAPTIVE_ORDER_REMEASURE', 40)
+    text = _mixed_text(3000)
+    overrides = {'remove_number_heavy_var': 1, 'alphanum_filter_enabled_var': 1, 'remove_code_blocks_var': 1}
+    fixed = process_text(text, make_settings(dict(overrides, adaptive_filter_order_var=0)))
+    adaptive = process_text(text, make_settings(dict(overrides, adaptive_filter_order_var=1)))
+    assert adaptive == fixed
+    assert "The" in fixed or "the" in fixed
+
+def test_settled_order_puts_the_cheapest_rejection_first(monkeypatch):
+    now = [0.0]
+    def slow_rarely_rejects(stats):
+        now[0] += 10.0
+        return False
+    def fast_always_rejects(stats):
+        now[0] += 1.0
+        return True
+    monkeypatch.setattr(text_stripper_engine, 'ADAPTIVE_ORDER_SAMPLE', 10)
+    monkeypatch.setattr(text_stripper_engine.time, 'perf_counter', lambda: now[0])
+    order = CheckOrder(((slow_rarely_rejects, ()), (fast_always_rejects, ())), adaptive=True)
+    for _ in range(10):
+        stats, dropped = order.sample("some words here", frozenset(), False)
+        assert dropped
+    assert not order.sampling
+    assert [check for check, _ in order.before_classes + order.after_classes] == [fast_always_rejects, slow_rarely_rejects]
+
+def test_fixed_order_never_samples():
+    order = CheckOrder(((len, ()),), adaptive=False)
+    assert not order.sampling
+    order.count(10 ** 7)
+    assert not order.sampling and order.describe() == "character counts, len"
+
+def test_each_file_measures_its_own_order(monkeypatch):
+    monkeypatch.setattr(text_stripper_engine, 'ADAPTIVE_ORDER_SAMPLE', 50)
+    settings = make_settings({'adaptive_filter_order_var': 1, 'numpy_scoring_var': 0})
+    plan = text_stripper_engine.get_filter_plan(settings)
+    first, second = plan.new_check_order(), plan.new_check_order()
+    text_stripper_engine.filter_segments(_mixed_text(300).split("\n\n"), settings, check_order=first)
+    assert not first.sampling and second.sampling and second.sampled == 0
+    process_text(_mixed_text(300), settings) # Measures with an order of its own
+    assert plan.new_check_order().sampling and not hasattr(plan, 'check_order')
+
+def test_threads_filter_with_orders_of_their_own(monkeypatch):
+    monkeypatch.setattr(text_stripper_engine, 'ADAPTIVE_ORDER_SAMPLE', 50)
+    monkeypatch.setattr(text_stripper_engine, 'ADAPTIVE_ORDER_REMEASURE', 40)
+    settings = make_settings({'adaptive_filter_order_var': 1, 'remove_number_heavy_var': 1, 'numpy_scoring_var': 0})
+    texts = [_mixed_text(1500) + f"\n\nThe closing sentence of text number {i} is here." for i in range(8)]
+    expected = [process_text(text, make_settings(dict(settings, adaptive_filter_order_var=0))) for text in texts]
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+        assert list(executor.map(lambda text: process_text(text, settings), texts)) == expected
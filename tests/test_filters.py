@@ -0,0 +1,140 @@
+import random
+import re
+
+import pytest
+
+from text_stripper_engine import CODE_KEYWORDS_LIST, CODE_SYMBOLS_SET, filter_segments, make_settings, process_text
+
+# No rewrites, so every kept segment comes out as it went in
+PLAIN = {'remove_symbol_enclosed_var': 0, 'min_len_concat_check_var': 10 ** 6, 'numpy_scoring_var': 0}
+
+
+# The per-segment checks as they were before segment_stats, one character scan per count,
+# kept here as the reference the gathered statistics must agree with
+def _original_rejects(segment_text, params):
+    words = segment_text.split(' ')
+    segment_len = len(segment_text)
+    if params['remove_code_blocks_var'] and len(words) >= params['min_words_code_check_var'] and segment_len:
+        symbol_set = CODE_SYMBOLS_SET
+        if params['code_symbol_mode_var'] == "only": symbol_set = set(params['code_custom_symbols_var'])
+        elif params['code_symbol_mode_var'] == "except": symbol_set = CODE_SYMBOLS_SET - set(params['code_custom_symbols_var'])
+        min_keywords, min_symbols = params['min_code_keywords_var'], params['min_code_symbols_var']
+        keyword_hits = sum(1 for word in words if word in CODE_KEYWORDS_LIST or word.lower() in CODE_KEYWORDS_LIST)
+        symbol_hits = sum(1 for char in segment_text if char in symbol_set)
+        if (keyword_hits >= min_keywords and symbol_hits >= min_symbols) or \
+           symbol_hits / segment_len > params['code_symbol_density_var'] or \
+           (symbol_hits > min_symbols * 2.5 and keyword_hits >= max(0, min_keywords // 2)):
+            return True
+    if params['remove_number_heavy_var'] and segment_len and \
+       not (params['min_words_to_exempt_digits_var'] > 0 and len(words) >= params['min_words_to_exempt_digits_var']):
+        max_consecutive = params['max_consecutive_digits_var']
+        if max_consecutive > 0 and re.search(r'\d{' + str(max_consecutive) + r',}', segment_text):
+            return True
+        if params['number_ratio_threshold_var'] > 0:
+            digit_count = sum(1 for char in segment_text if char.isdigit())
+            if digit_count >= params['min_digits_for_ratio_check_var'] and digit_count / segment_len > params['number_ratio_threshold_var']:
+                return True
+    if params['alphanum_filter_enabled_var']:
+        alnum = sum(1 for char in segment_text if char.isalnum())
+        if segment_len == 0: return True
+        if segment_len < params['alnum_min_len_for_ratio_var']:
+            if alnum == 0: return True
+        elif alnum / segment_len < params['alphanum_threshold_var'] and alnum < params['alnum_abs_count_fallback_var']:
+            return True
+    stripped_words = segment_text.split()
+    if not stripped_words: return True
+    if segment_text.rstrip().endswith(('.', '!', '?')) and len(stripped_words) >= params['min_words_sentence_var']: return False
+    return len(stripped_words) < params['min_words_general_var']
+
+def _segments(count):
+    rng = random.Random(11)
+    words = "the quick brown fox jumps over a lazy dog while rivers run to distant seas return var".split()
+    digits = "0123456789٠١٢٣٤٥٦٧٨٩０１２３४५६²³¹½"
+    kinds = [
+        lambda: " ".join(rng.choice(words) for _ in range(rng.randint(1, 14))) + rng.choice(["", ".", "!", "?", ". "]),
+        lambda: " ".join("".join(rng.choice(digits) for _ in range(rng.randint(1, 9))) for _ in range(rng.randint(1, 5))),
+        lambda: " ".join(rng.choice(words + ["{", "}", "();", "=", "x[0]", "@a", "a5", "ab"]) for _ in range(rng.randint(1, 10))),
+        lambda: "".join(rng.choice("#$%^&*<>|~=+-_/\\{}();:.,'\"  ") for _ in range(rng.randint(1, 30))),
+        lambda: "Größe " + "".join(rng.choice(digits) for _ in range(rng.randint(1, 12))) + " café naïve",
+    ]
+    return [rng.choice(kinds)() for _ in range(count)]
+
+FILTER_SETTINGS = [
+    {},
+    {'remove_number_heavy_var': 1, 'min_words_general_var': 2, 'min_words_sentence_var': 1},
+    {'remove_number_heavy_var': 1, 'max_consecutive_digits_var': 3, 'number_ratio_threshold_var': 0.3,
+     'min_digits_for_ratio_check_var': 2, 'min_words_to_exempt_digits_var': 0, 'min_words_general_var': 1},
+    {'code_symbol_mode_var': 'only', 'code_custom_symbols_var': '{}();a5', 'min_words_general_var': 1},
+    {'code_symbol_mode_var': 'except', 'code_custom_symbols_var': '(){}', 'min_words_general_var': 1},
+    {'min_code_keywords_var': 0, 'min_code_symbols_var': 3, 'min_words_code_check_var': 0, 'min_words_general_var': 1},
+    {'alnum_min_len_for_ratio_var': 12, 'alphanum_threshold_var': 0.9, 'alnum_abs_count_fallback_var': 6,
+     'remove_code_blocks_var': 0, 'min_words_general_var': 1},
+    {'alnum_min_len_for_ratio_var': 0, 'alphanum_threshold_var': 0.5, 'alnum_abs_count_fallback_var': 0,
+     'remove_code_blocks_var': 0, 'min_words_general_var': 1},
+]
+
+
+@pytest.mark.parametrize('overrides', FILTER_SETTINGS)
+def test_segment_statistics_match_the_original_scans(overrides):
+    params = make_settings(dict(PLAIN, **overrides))
+    segments = _segments(3000)
+    expected = [segment for segment in segments if not _original_rejects(segment, params)]
+    kept = filter_segments(segments, params)
+    assert kept == expected
+    assert 0 < len(kept) < len(segments)
+
+NUMBER_HEAVY = dict(PLAIN, remove_number_heavy_var=1, remove_code_blocks_var=0, alphanum_filter_enabled_var=0,
+                    min_words_general_var=1, min_words_to_exempt_digits_var=0)
+CASES = [
+    # Runs count decimal digits of any script, as \d does; superscripts and fractions never make a run
+    (dict(NUMBER_HEAVY, max_consecutive_digits_var=4, number_ratio_threshold_var=0),
+     "Code 1234 here\n\nCode ١٢٣٤ here\n\nCode １２３４ here\n\nCode ²³¹² here\n\nCode 123 here",
+     "Code ²³¹² here\n\nCode 123 here"),
+    # The digit ratio counts every digit, superscripts included, but not fractions (not str.isdigit)
+    (dict(NUMBER_HEAVY, max_consecutive_digits_var=0, number_ratio_threshold_var=0.4, min_digits_for_ratio_check_var=3),
+     "ab ²³¹\n\nab ½½½\n\nab ٣٤٥\n\nab 12",
+     "ab ½½½\n\nab 12"),
+    # min_digits_for_ratio_check_var: too few digits are never number-heavy, whatever the ratio
+    (dict(NUMBER_HEAVY, max_consecutive_digits_var=0, number_ratio_threshold_var=0.1, min_digits_for_ratio_check_var=4),
+     "a 123\n\na 1234",
+     "a 123"),
+    # Words at or over min_words_to_exempt_digits_var exempt a segment
+    (dict(NUMBER_HEAVY, max_consecutive_digits_var=3, number_ratio_threshold_var=0, min_words_to_exempt_digits_var=3),
+     "id 12345\n\nid 12345 ok",
+     "id 12345 ok"),
+    # Custom symbols: only the listed ones count (letters and digits too), or all but the listed ones
+    (dict(PLAIN, code_symbol_mode_var='only', code_custom_symbols_var='a5', code_symbol_density_var=0.3,
+          min_code_keywords_var=9, min_code_symbols_var=99, min_words_code_check_var=1, alphanum_filter_enabled_var=0,
+          min_words_general_var=1),
+     "a a 5 b\n\n{}{}{} xyz\n\nbanana\n\nbob xyz",
+     "{}{}{} xyz\n\nbob xyz"),
+    (dict(PLAIN, code_symbol_mode_var='except', code_custom_symbols_var='{}', code_symbol_density_var=0.3,
+          min_code_keywords_var=9, min_code_symbols_var=99, min_words_code_check_var=1, alphanum_filter_enabled_var=0,
+          min_words_general_var=1),
+     "{}{}{} xyz\n\n(());; xyz",
+     "{}{}{} xyz"),
+    # Keywords plus enough symbols make code, unless there are too few words to check
+    (dict(PLAIN, min_code_keywords_var=1, min_code_symbols_var=2, min_words_code_check_var=3, code_symbol_density_var=1,
+          alphanum_filter_enabled_var=0, min_words_general_var=1),
+     "return (x)\n\nreturn (x) now\n\nplain (x) now",
+     "return (x)\n\nplain (x) now"),
+    # Shorter than alnum_min_len_for_ratio_var: kept if there is any alphanumeric at all
+    (dict(PLAIN, remove_code_blocks_var=0, alnum_min_len_for_ratio_var=6, alphanum_threshold_var=0.9,
+          alnum_abs_count_fallback_var=100, min_words_general_var=1),
+     "a ...\n\n.. ...\n\n٣ ...\n\nab ....",
+     "a ...\n\n٣ ..."),
+    # At or over it: the alphanumeric ratio must reach the threshold, or the count the fallback ('½' is alphanumeric)
+    (dict(PLAIN, remove_code_blocks_var=0, alnum_min_len_for_ratio_var=4, alphanum_threshold_var=0.5,
+          alnum_abs_count_fallback_var=5, min_words_general_var=1),
+     "abc ..\n\nab ...\n\nabcde ......\n\nä½ .\n\nä‰ .",
+     "abc ..\n\nabcde ......\n\nä½ ."),
+    # Sentences need min_words_sentence_var words, anything else min_words_general_var
+    (dict(PLAIN, min_words_sentence_var=3, min_words_general_var=5),
+     "Two words.\n\nThree words here.\n\nfour words no stop\n\nfive words and no stop",
+     "Three words here.\n\nfive words and no stop"),
+]
+
+@pytest.mark.parametrize('overrides, text, expected', CASES)
+def test_process_text_fixtures(overrides, text, expected):
+    params = make_settings(dict(overrides, html_stripping_mode_var='off'))
+    assert process_text(text, params) == expected
@@ -0,0 +1,48 @@
+import os
+import time
+
+import pytest
+
+from text_stripper_pool import WorkerPool
+
+
+def _sleep_then_echo(name, seconds):
+    time.sleep(seconds)
+    return 'success', (name, os.getpid())
+
+def _fail(name):
+    raise RuntimeError(f"broken {name}")
+
+
+def test_results_arrive_in_completion_order():
+    with WorkerPool(_sleep_then_echo, 3) as pool:
+        results = list(pool.run([('slow', ('slow', 0.6)), ('medium', ('medium', 0.3)), ('fast', ('fast', 0.0))]))
+    assert [task_id for task_id, _, _ in results] == ['fast', 'medium', 'slow']
+    assert all(status == 'success' and data[0] == task_id for task_id, status, data in results)
+
+def test_workers_stay_warm_between_runs():
+    with WorkerPool(_sleep_then_echo, 2) as pool:
+        first = {data[1] for _, _, data in pool.run((i, (i, 0.1)) for i in range(4))}
+        second = {data[1] for _, _, data in pool.run((i, (i, 0.1)) for i in range(4))}
+    assert len(first) == 2 and first == second
+
+def test_timeout_replaces_only_the_stuck_worker():
+    with WorkerPool(_sleep_then_echo, 2) as pool:
+        results = {task_id: status for task_id, status, _ in pool.run([('stuck', ('stuck', 30)), ('a', ('a', 0)), ('b', ('b', 0))], timeout=1)}
+        assert results == {'stuck': 'timeout', 'a': 'success', 'b': 'success'}
+        assert [status for _, status, _ in pool.run([('again', ('again', 0))])] == ['success']
+
+def test_exceptions_become_error_results():
+    with WorkerPool(_fail, 1) as pool:
+        [(task_id, status, data)] = pool.run([('x', ('x',))])
+    assert (task_id, status) == ('x', 'error') and "broken x" in data
+
+def test_none_with_nothing_running_is_an_error():
+    with WorkerPool(_sleep_then_echo, 1) as pool:
+        with pytest.raises(RuntimeError):
+            list(pool.run(iter([None])))
+        tasks = iter([('a', ('a', 0)), None, None]) # Fine while 'a' runs, an error once it is done
+        results = pool.run(tasks)
+        assert next(results)[0] == 'a'
+        with pytest.raises(RuntimeError):
+            next(results)
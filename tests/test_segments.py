@@ -0,0 +1,123 @@
+import random
+import re
+
+import pytest
+
+from text_stripper_engine import _SENTENCE_START, is_valid_paragraph, line_spans, make_settings, segment_spans, split_segments
+
+# The splitter segment_spans replaced (a paragraph re.split, then a lookbehind sentence split per
+# paragraph, with a strip at each step), kept here as the reference it must agree with
+_PREVIOUS_SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+(?=' + _SENTENCE_START + r')|(?<=[.!?])\s*$')
+_PREVIOUS_PARAGRAPH_BREAK = re.compile(r'\n\s*\n+')
+
+def _previous_split_segments(processed_text, params, check_paragraphs=True):
+    paragraphs = _PREVIOUS_PARAGRAPH_BREAK.split(processed_text.strip())
+    segments_for_filtering = []
+    for para_text in paragraphs:
+        para_text_stripped = para_text.strip()
+        if not para_text_stripped: continue
+        if check_paragraphs and params['para_filter_enabled_var']:
+            if not is_valid_paragraph(para_text_stripped,
+                                      params['para_min_sentences_var'], params['para_min_words_var'],
+                                      params['para_min_avg_len_var'], params['para_max_avg_len_var']):
+                continue
+        sentence_candidates = _PREVIOUS_SENTENCE_BREAK.split(para_text_stripped)
+        for s_candidate in sentence_candidates:
+            s_candidate_stripped = s_candidate.strip()
+            if not s_candidate_stripped: continue
+            split_by_newline_further = False
+            if len(sentence_candidates) == 1 and "\n" in s_candidate_stripped:
+                split_by_newline_further = True
+            elif len(s_candidate_stripped) > params['max_segment_len_var'] and "\n" in s_candidate_stripped:
+                split_by_newline_further = True
+            if split_by_newline_further:
+                for line in s_candidate_stripped.splitlines():
+                    if line.strip(): segments_for_filtering.append(line.strip())
+            else:
+                segments_for_filtering.append(s_candidate_stripped)
+    return segments_for_filtering
+
+_PIECES = ["word", "Word", "two words", "Then", "1999", "\"Quoted", "(aside", "• bullet", "- dash", "x",
+           ".", "!", "?", "...", "?!", " ", "  ", "\t", "\n", "\n\n", " \n \n ", "\r\n", "\r\n\r\n", "\r",
+           "\x85", "\x1c", "\u2028", "\u00a0", "\u00a0\n\u00a0\n", "\x0b", "\x0c"]
+
+def _random_text(rng):
+    return "".join(rng.choice(_PIECES) for _ in range(rng.randint(0, 40)))
+
+PARAMS = [
+    make_settings(),
+    make_settings({'max_segment_len_var': 10}),
+    make_settings({'max_segment_len_var': 0}),
+    make_settings({'para_filter_enabled_var': 1, 'para_min_sentences_var': 1, 'para_min_words_var': 2,
+                   'para_min_avg_len_var': 1, 'para_max_avg_len_var': 6}),
+]
+
+
+@pytest.mark.parametrize('params', PARAMS)
+def test_segment_spans_match_the_previous_splitter(params):
+    rng = random.Random(14)
+    for _ in range(5000):
+        text = _random_text(rng)
+        expected = _previous_split_segments(text, params)
+        assert split_segments(text, params) == expected, repr(text)
+        assert [text[start:end] for start, end in segment_spans(text, params)] == expected
+        assert split_segments(text, params, check_paragraphs=False) == _previous_split_segments(text, params, False)
+
+CASES = [
+    # Paragraph breaks: two line feeds with any whitespace around them
+    ("First para here.\n\nSecond para here.", ["First para here.", "Second para here."]),
+    ("One\n \t\n\n  Two", ["One", "Two"]),
+    # Sentence breaks need whitespace and a sentence-start character after the terminator
+    ("It rained. Then it stopped! (Briefly) Why? 42 times.", ["It rained.", "Then it stopped!", "(Briefly) Why?", "42 times."]),
+    ("Values e.g. this one. lower case stays", ["Values e.g. this one. lower case stays"]),
+    ("Ends here.No space", ["Ends here.No space"]),
+    ("Quote. \"Next\" and • bullet. • Item", ["Quote.", "\"Next\" and • bullet.", "• Item"]),
+    # The only candidate of a paragraph is split into lines...
+    ("line one\nline two\n  line three  ", ["line one", "line two", "line three"]),
+    # ... unless it ends in a terminator, which leaves an empty candidate behind it
+    ("line one\nline two.", ["line one\nline two."]),
+    ("line one\nline two.  \n", ["line one\nline two."]),
+    # With several candidates, only those longer than max_segment_len_var are split
+    ("Short\nbit. Another\nshort bit.", ["Short\nbit.", "Another\nshort bit."]),
+    # Windows and other line breaks
+    ("Para one.\r\n\r\nPara two.", ["Para one.", "Para two."]),
+    ("alpha\r\nbeta\r\ngamma", ["alpha", "beta", "gamma"]),
+    ("alpha\x85beta\u2028gamma\nomega", ["alpha", "beta", "gamma", "omega"]),
+    ("alpha\x85beta", ["alpha\x85beta"]), # No line feed, so no line split
+    # NBSP is whitespace for the strips and the sentence break, but never a line break
+    ("\u00a0Lead and trail.\u00a0 Next one.\u00a0", ["Lead and trail.", "Next one."]),
+    ("left\u00a0\nright", ["left", "right"]),
+    # Trailing terminators and whitespace-only input
+    ("Done.", ["Done."]),
+    ("Done?!  \n\n  ", ["Done?!"]),
+    ("...", ["..."]),
+    ("", []),
+    (" \n\n\t ", []),
+]
+
+@pytest.mark.parametrize('text, expected', CASES)
+def test_segment_rules(text, expected):
+    params = make_settings()
+    assert split_segments(text, params) == expected
+    assert _previous_split_segments(text, params) == expected
+
+def test_long_candidates_are_split_into_lines():
+    text = "Short one. " + "A long\ncandidate that runs on.  Next\nshort."
+    assert split_segments(text, make_settings({'max_segment_len_var': 20})) == \
+        ["Short one.", "A long", "candidate that runs on.", "Next\nshort."]
+    assert split_segments(text, make_settings({'max_segment_len_var': 350})) == \
+        ["Short one.", "A long\ncandidate that runs on.", "Next\nshort."]
+
+def test_paragraph_filter_drops_whole_paragraphs():
+    params = make_settings({'para_filter_enabled_var': 1, 'para_min_sentences_var': 2, 'para_min_words_var': 4,
+                            'para_min_avg_len_var': 1, 'para_max_avg_len_var': 40})
+    text = "Kept here. And here too.\n\nDropped single sentence.\n\nAlso kept. Two sentences."
+    assert split_segments(text, params) == ["Kept here.", "And here too.", "Also kept.", "Two sentences."]
+    assert split_segments(text, params, check_paragraphs=False)[2] == "Dropped single sentence."
+
+def test_line_spans_strip_each_splitlines_line():
+    rng = random.Random(15)
+    for _ in range(2000):
+        text = _random_text(rng)
+        expected = [line.strip() for line in text.splitlines() if line.strip()]
+        assert [text[start:end] for start, end in line_spans(text)] == expected, repr(text)
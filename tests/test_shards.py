@@ -0,0 +1,110 @@
+import os
+import threading
+
+import pytest
+
+import text_stripper_cli
+from text_stripper_engine import DEFAULT_SETTINGS, StreamPaths, extract_file
+from text_stripper_pool import WorkerPool
+from text_stripper_shards import run_sharded, shard_bounds
+
+pytest.importorskip('PyPDF2')
+
+PAGE_TEXT = "Page {} of the report holds a full sentence, so that the filters keep it in the output."
+
+
+def write_pdf(path, pages):
+    """A minimal PDF with one line of Helvetica text per page."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        stream = b"BT /F1 12 Tf 72 720 Td (" + text.encode('latin-1') + b") Tj ET"
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects))
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), len(kids))
+    out, offsets = bytearray(b"%PDF-1.4\n"), []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, 'wb') as f:
+        f.write(bytes(out))
+
+
+class CountingPool(WorkerPool):
+    """Counts the tasks handed to the workers; a split PDF adds its shards and merge."""
+    dispatched = 0
+
+    def run(self, tasks, timeout=None, stop_event=None):
+        def counted():
+            for task in tasks:
+                if task is not None: CountingPool.dispatched += 1
+                yield task
+        return super().run(counted(), timeout, stop_event)
+
+
+@pytest.fixture
+def batch_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(text_stripper_cli, 'WorkerPool', CountingPool)
+    CountingPool.dispatched = 0
+    write_pdf(tmp_path / 'big.pdf', [PAGE_TEXT.format(i) for i in range(9)])
+    return tmp_path
+
+def _settings(**overrides):
+    return dict(DEFAULT_SETTINGS, pdf_shard_pages_var=2, file_processing_timeout_var=60, **overrides)
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_shard_bounds_cover_every_page_once():
+    assert shard_bounds(9, 5) == [0, 1, 3, 5, 7, 9]
+    assert shard_bounds(3, 3) == [0, 1, 2, 3]
+
+def test_sharded_output_matches_serial(batch_dir):
+    text_stripper_cli.run_batch(['big.pdf'], _settings(), jobs=1)
+    serial = _read('big_processed.txt')
+    os.remove('big_processed.txt')
+    CountingPool.dispatched = 0
+    stats = text_stripper_cli.run_batch(['big.pdf'], _settings(), jobs=3)
+    assert stats.failures == [] and stats.counts == {'success': 1}
+    assert CountingPool.dispatched == 1 + 5 + 1 # The file, its shards of 2 pages, the merge
+    assert _read('big_processed.txt') == serial
+    assert all(PAGE_TEXT.format(i).encode() in serial for i in range(9))
+    assert not [name for name in os.listdir(batch_dir) if name.endswith('.part')]
+
+def test_run_sharded_accepts_repeated_task_ids(batch_dir):
+    settings, stream_paths = _settings(), StreamPaths(_settings())
+    tasks = [('big.pdf', ('big.pdf', settings, stream_paths.claim('big.pdf'), 'auto')) for _ in range(2)]
+    with CountingPool(extract_file, 3) as pool:
+        results = list(run_sharded(pool, tasks, timeout=60))
+    assert [(task_id, status) for task_id, status, _ in results] == [('big.pdf', 'success')] * 2
+    assert tasks[0][1][2] != tasks[1][1][2] # Each task streams to its own .part file
+    outputs = {_read(data.path) for _, _, data in results}
+    assert len(outputs) == 1 and PAGE_TEXT.format(8).encode() in outputs.pop()
+
+def test_stopping_reports_a_pdf_waiting_to_be_extracted_serially(batch_dir):
+    class StopOnSplitPool(WorkerPool):
+        """Stop is pressed while a one-worker pool's PDF waits to be extracted serially."""
+        def run(self, tasks, timeout=None, stop_event=None):
+            for task_id, status, data in super().run(tasks, timeout, stop_event):
+                if status == 'split': stop_event.set()
+                yield task_id, status, data
+    settings = _settings()
+    with StopOnSplitPool(extract_file, 1) as pool:
+        results = list(run_sharded(pool, [('big.pdf', ('big.pdf', settings, 'big.part', 'auto'))], timeout=60, stop_event=threading.Event()))
+    assert [(task_id, status) for task_id, status, _ in results] == [('big.pdf', 'error')]
+
+def test_duplicate_pdf_is_processed_twice(batch_dir):
+    settings = _settings(consolidate_output_enabled_var=1, consolidated_output_filename_var='all.txt')
+    stats = text_stripper_cli.run_batch(['big.pdf', 'big.pdf'], settings, jobs=3)
+    assert stats.failures == [] and stats.counts == {'success': 2}
+    consolidated = _read('all.txt').decode('utf-8')
+    assert consolidated.count(PAGE_TEXT.format(8)) == 2
+    assert not [name for name in os.listdir(batch_dir) if name.endswith('.part')]
@@ -0,0 +1,93 @@
+import codecs
+import io
+import random
+import tarfile
+import zipfile
+
+import pytest
+
+import text_stripper_archives
+from text_stripper_archives import iter_archive_members
+from text_stripper_engine import extract_file, make_settings
+from text_stripper_sniff import LEGACY_ENCODING, SAMPLE_BYTES, sniff_text_file
+
+PROSE = "Le café était fermé, alors nous avons marché jusqu'à la plage. "
+
+
+def _write(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.mark.parametrize('bom, encoding, expected', [
+    (codecs.BOM_UTF8, 'utf-8', 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le', 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16-be', 'utf-16'),
+    (codecs.BOM_UTF32_LE, 'utf-32-le', 'utf-32'), (codecs.BOM_UTF32_BE, 'utf-32-be', 'utf-32'),
+])
+def test_byte_order_marks(tmp_path, bom, encoding, expected):
+    assert sniff_text_file(_write(tmp_path, 'bom.txt', bom + (PROSE * 3).encode(encoding))) == (expected, None)
+
+@pytest.mark.parametrize('encoding', ['utf-16-le', 'utf-16-be'])
+def test_utf16_without_bom(tmp_path, encoding):
+    assert sniff_text_file(_write(tmp_path, 'wide.txt', (PROSE * 500).encode(encoding))) == (encoding, None)
+
+@pytest.mark.parametrize('header, description', [
+    (b'\x89PNG\r\n\x1a\n', "PNG image"), (b'%PDF-1.7\n', "PDF document"), (b'\x7fELF\x02\x01\x01', "ELF executable"),
+    (b'PK\x03\x04', "zip archive or Office document"), (b'\x00\x00\x00\x18ftypmp42', "MP4/QuickTime media"),
+])
+def test_magic_numbers(tmp_path, header, description):
+    assert sniff_text_file(_write(tmp_path, 'file.txt', header + b"readable text after the header " * 100)) == (None, description)
+
+def test_random_bytes_are_binary(tmp_path):
+    data = random.Random(1).randbytes(3 * SAMPLE_BYTES)
+    assert sniff_text_file(_write(tmp_path, 'noise.txt', data)) == (None, "binary data")
+
+def test_binary_tail_is_caught(tmp_path):
+    data = b"A plain text header line.\n" * 1000 + bytes(range(32)) * 500
+    assert sniff_text_file(_write(tmp_path, 'dump.txt', data)) == (None, "binary data")
+
+def test_utf8_and_ascii(tmp_path):
+    assert sniff_text_file(_write(tmp_path, 'ascii.txt', b"Plain ASCII text.\n" * 10)) == ('utf-8', None)
+    assert sniff_text_file(_write(tmp_path, 'utf8.txt', (PROSE * 500).encode('utf-8'))) == ('utf-8', None)
+    assert sniff_text_file(_write(tmp_path, 'empty.txt', b"")) == ('utf-8', None)
+
+def test_utf8_cut_at_the_tail_sample_boundary(tmp_path):
+    data = ("€" * 10000).encode('utf-8') # 3 bytes each, so the tail sample starts inside a character
+    assert (len(data) - SAMPLE_BYTES) % 3 != 0
+    assert sniff_text_file(_write(tmp_path, 'euro.txt', data)) == ('utf-8', None)
+
+def test_legacy_8bit_text(tmp_path):
+    assert sniff_text_file(_write(tmp_path, 'latin.txt', (PROSE * 500).encode('cp1252'))) == (LEGACY_ENCODING, None)
+    ascii_then_legacy = b"Plain ASCII text.\n" * 1000 + (PROSE * 200).encode('cp1252')
+    assert sniff_text_file(_write(tmp_path, 'mixed.txt', ascii_then_legacy)) == (LEGACY_ENCODING, None)
+    utf8_then_legacy = (PROSE * 200).encode('utf-8') + (PROSE * 200).encode('cp1252')
+    assert sniff_text_file(_write(tmp_path, 'both.txt', utf8_then_legacy)) == ('utf-8', None)
+
+def test_archive_members_are_sniffed(tmp_path):
+    archive = str(tmp_path / 'x.zip')
+    with zipfile.ZipFile(archive, 'w') as zf:
+        zf.writestr('latin.txt', (PROSE * 500).encode('cp1252'))
+        zf.writestr('image.txt', b'\x89PNG\r\n\x1a\n' + bytes(5000))
+    assert sniff_text_file(archive + "!/latin.txt") == (LEGACY_ENCODING, None)
+    assert sniff_text_file(archive + "!/image.txt") == (None, "PNG image")
+
+def test_extract_file_rejects_binaries_and_decodes_legacy_text(tmp_path):
+    settings = make_settings({'file_processing_mode_var': 'all_files'})
+    status, message = extract_file(_write(tmp_path, 'photo.dat', b'\xff\xd8\xff\xe0' + bytes(5000)), settings)
+    assert status == 'skipped_unknown' and "JPEG image" in message
+    status, text = extract_file(_write(tmp_path, 'latin.txt', (PROSE * 20).encode('cp1252')), settings)
+    assert status == 'success' and "café était fermé" in text and "\ufffd" not in text
+
+def test_streamed_tar_members_are_sampled_at_the_start_only(tmp_path, monkeypatch):
+    archive = str(tmp_path / 'x.tar.gz')
+    data = b"Plain ASCII text.\n" * 2000 + bytes(range(32)) * 500 # Binary only past the head sample
+    with tarfile.open(archive, 'w:gz') as tf:
+        info = tarfile.TarInfo('dump.txt'); info.size = len(data)
+        tf.addfile(info, io.BytesIO(data))
+    monkeypatch.setattr(text_stripper_archives, 'TAR_INLINE_BYTES', 0)
+    [streamed] = iter_archive_members(archive)
+    assert streamed.data is None and sniff_text_file(streamed) == ('utf-8', None)
+    monkeypatch.setattr(text_stripper_archives, 'TAR_INLINE_BYTES', len(data))
+    [inline] = iter_archive_members(archive)
+    assert inline.data is not None and sniff_text_file(inline) == (None, "binary data")
@@ -0,0 +1,151 @@
+import json
+import os
+import random
+
+import pytest
+
+import text_stripper_engine
+from text_stripper_engine import (PARTIAL_OUTPUT_NOTE, StreamedOutput, _drop_incomplete_line, extract_file, make_settings,
+                                  process_text, salvage_stream_output, stream_filter_text)
+
+HTML_MODES = ["off", "strip_tags", "parse_html", "discard_segments"]
+CHUNK_SIZES = [1, 7, 64, 1000]
+
+
+def _document(num_blocks, seed=8):
+    """Prose, HTML, code, number tables and URLs, with blank-line runs of every shape between them."""
+    rng = random.Random(seed)
+    words = "the quick brown fox jumps over a lazy dog while rivers run to distant seas".split()
+    sentence = lambda: " ".join(rng.choice(words) for _ in range(rng.randint(4, 16))).capitalize() + rng.choice(".!?")
+    kinds = [
+        lambda: " ".join(sentence() for _ in range(rng.randint(1, 4))),
+        lambda: "\n".join(sentence() for _ in range(rng.randint(2, 4))),
+        lambda: f"<p class=\"x\">{sentence()} <b>{sentence()}</b></p>\n<div>{sentence()}<br>{sentence()}</div>",
+        lambda: f"<script>var x = '<p>{sentence()}</p>';</script><style>p {{ color: red; }}</style>{sentence()}",
+        lambda: f"<!-- {sentence()} --><ul><li>{sentence()}</li><li>{sentence()}</li></ul>&amp; {sentence()} &#169;",
+        lambda: f"function f() {{ return this.x; }} if (x) {{ y = [1, 2]; }} // {sentence()}",
+        lambda: " ".join(str(rng.randint(0, 10 ** 9)) for _ in range(rng.randint(2, 10))),
+        lambda: f"See https://example.com/{rng.choice(words)}?q={rng.randint(0, 99)} and www.{rng.choice(words)}.org. {sentence()}",
+        lambda: sentence() + "\r\n" + sentence(),
+    ]
+    breaks = ["\n\n", "\n \t\n", "\n\n\n\n", "\r\n\r\n", " \n\n ", "\n", " "]
+    return "".join(rng.choice(kinds)() + rng.choice(breaks) for _ in range(num_blocks))
+
+def _streamed(text, params, chunk_size, collect_url_list=False, source=None):
+    out = []
+    chunk_source = lambda: (text[i:i + chunk_size] for i in range(0, len(text), chunk_size))
+    stream_filter_text(chunk_source, params, out.append, collect_url_list, source=source)
+    return "".join(out)
+
+
+@pytest.mark.parametrize('html_mode', HTML_MODES)
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_streaming_matches_whole_text(html_mode, chunk_size):
+    text = _document(60)
+    params = make_settings({'html_stripping_mode_var': html_mode})
+    expected = process_text(text, params)
+    assert expected
+    assert _streamed(text, params, chunk_size) == expected
+
+@pytest.mark.parametrize('html_mode', HTML_MODES)
+@pytest.mark.parametrize('overrides', [{'segment_locations_var': 1}, {'output_format_var': 'jsonl'}])
+def test_streaming_matches_whole_text_with_locations(html_mode, overrides):
+    text = _document(40, seed=9)
+    params = make_settings(dict(overrides, html_stripping_mode_var=html_mode))
+    expected = process_text(text, params, source='doc.html')
+    assert expected
+    for chunk_size in (5, 333):
+        assert _streamed(text, params, chunk_size, source='doc.html') == expected
+
+@pytest.mark.parametrize('html_mode', HTML_MODES)
+@pytest.mark.parametrize('para_ok', [True, False])
+def test_streaming_matches_whole_text_with_the_paragraph_filter(html_mode, para_ok):
+    # With strip_tags the whole text is one paragraph, counted in a first pass; when it is rejected,
+    # the second pass filters it as the single line process_text falls back to
+    text = _document(30, seed=10)
+    overrides = {'html_stripping_mode_var': html_mode, 'para_filter_enabled_var': 1, 'para_min_sentences_var': 2,
+                 'para_min_words_var': 20, 'para_min_avg_len_var': 3,
+                 'para_max_avg_len_var': 40 if para_ok else 4, 'max_segment_len_var': 100000,
+                 'remove_code_blocks_var': 0, 'alphanum_filter_enabled_var': 0} # So the one-line fallback is kept
+    for extra in ({}, {'output_format_var': 'jsonl'}):
+        params = make_settings(dict(overrides, **extra))
+        expected = process_text(text, params, source='doc.html')
+        assert expected
+        for chunk_size in (3, 50, 4096):
+            assert _streamed(text, params, chunk_size, source='doc.html') == expected
+
+def test_streaming_fallback_when_every_paragraph_is_rejected():
+    text = "Short bit.\nAnother line of text that keeps going on and on for quite a while now.\n\nTiny.\n"
+    params = make_settings({'html_stripping_mode_var': 'off', 'para_filter_enabled_var': 1, 'para_min_sentences_var': 9})
+    expected = process_text(text, params)
+    assert expected == "Another line of text that keeps going on and on for quite a while now."
+    for chunk_size in CHUNK_SIZES:
+        assert _streamed(text, params, chunk_size) == expected
+
+@pytest.mark.parametrize('html_mode', HTML_MODES)
+@pytest.mark.parametrize('output_format', ['text', 'jsonl'])
+def test_streamed_file_matches_whole_file(tmp_path, monkeypatch, html_mode, output_format):
+    read_chunks = text_stripper_engine.iter_text_file_chunks
+    monkeypatch.setattr(text_stripper_engine, 'iter_text_file_chunks',
+                        lambda filepath, chunk_size=None, encoding='utf-8': read_chunks(filepath, 97, encoding))
+    path = tmp_path / "doc.txt"
+    path.write_text(_document(60, seed=11), encoding='utf-8', newline='')
+    settings = {'html_stripping_mode_var': html_mode, 'extract_urls_enabled_var': 1, 'output_format_var': output_format,
+                'stream_threshold_mb_var': 0}
+    status, whole = extract_file(str(path), settings)
+    stream_path = str(tmp_path / "doc.part")
+    streamed_status, streamed = extract_file(str(path), settings, stream_path=stream_path)
+    assert (status, streamed_status) == ('success', 'success')
+    assert isinstance(streamed, StreamedOutput)
+    with open(stream_path, encoding='utf-8', newline='') as f:
+        assert f.read() == whole
+
+
+# A worker killed mid-file leaves a .part file that ends wherever the last flush did
+def _write_part(path, content):
+    with open(path, 'w', encoding='utf-8', newline='') as f: f.write(content)
+
+def _read(path):
+    with open(path, encoding='utf-8', newline='') as f: return f.read()
+
+def test_salvaged_text_output_gets_the_partial_note(tmp_path):
+    stream_path = str(tmp_path / "doc_processed.txt.part")
+    written = "First kept segment.\n\nSecond kept segm"
+    _write_part(stream_path, written)
+    salvaged = salvage_stream_output("doc.txt", make_settings(), "timed out after 60s", stream_path)
+    assert isinstance(salvaged, StreamedOutput) and salvaged.path == stream_path
+    # Text output is kept as it is, cut segment and all, and the note says the rest is missing
+    assert _read(stream_path) == written + PARTIAL_OUTPUT_NOTE.format(reason="timed out after 60s")
+
+def test_salvaged_jsonl_output_drops_the_cut_record(tmp_path):
+    text = _document(20, seed=12)
+    params = make_settings({'output_format_var': 'jsonl'})
+    full = process_text(text, params, source='doc.txt')
+    lines = [line + "\n" for line in full.split("\n")[:-1]]
+    assert len(lines) > 4
+    stream_path = str(tmp_path / "doc_processed.jsonl.part")
+    for cut in (len(lines[0]) + len(lines[1]) + 5, len(full) - 3, len(lines[0]) + len(lines[1])):
+        _write_part(stream_path, full[:cut])
+        salvaged = salvage_stream_output("doc.txt", params, "worker crashed", stream_path)
+        assert isinstance(salvaged, StreamedOutput)
+        records = [json.loads(line) for line in _read(stream_path).split("\n")[:-1]]
+        whole_lines = full[:cut].count("\n")
+        assert records[:-1] == [json.loads(line) for line in lines[:whole_lines]]
+        assert records[-1] == {'type': 'partial', 'file': 'doc.txt', 'reason': "worker crashed"}
+
+@pytest.mark.parametrize('output_format, content', [('text', ""), ('jsonl', ""), ('jsonl', '{"type":"segment","te')])
+def test_salvage_with_nothing_whole_written(tmp_path, output_format, content):
+    stream_path = str(tmp_path / "doc.part")
+    _write_part(stream_path, content)
+    assert salvage_stream_output("doc.txt", make_settings({'output_format_var': output_format}), "timed out", stream_path) is None
+    assert not os.path.exists(stream_path)
+    assert salvage_stream_output("doc.txt", make_settings(), "timed out", stream_path) is None # No file at all
+
+def test_drop_incomplete_line_searches_back_over_several_reads(tmp_path, monkeypatch):
+    monkeypatch.setattr(text_stripper_engine, 'STREAM_CHUNK_SIZE', 4)
+    path = str(tmp_path / "records.jsonl.part")
+    for content, expected in (('{"a":1}\n{"b":"' + "x" * 30, '{"a":1}\n'), ('{"a":1}\n{"b":2}\n', '{"a":1}\n{"b":2}\n'),
+                              ('{"a":"é' + "y" * 21, ''), ('{"a":"ü"}\n{"b":"ä', '{"a":"ü"}\n')):
+        _write_part(path, content)
+        _drop_incomplete_line(path)
+        assert _read(path) == expected
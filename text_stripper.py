@@ -17,12 +17,24 @@ Key Features:
     - Supports user-defined custom file extensions (comma-separated, e.g., .log, .md)
       to be processed as plain text.
     - Drag-and-drop interface for easy file processing.
-    - Customizable output file suffix (e.g., "_cleaned"), with output always as .txt.
+    - Customizable output file suffix (e.g., "_cleaned"), with output as .txt, or as
+      .jsonl with one JSON record per kept segment (offsets, page, filter stats) and URL.
     - Optional extraction, deduplication, and sorted listing of all URLs found in
       the original raw text, appended to the processed output.
     - New: Can consolidate all processed output into a single file.
     - New: A configurable timeout for each file processing operation to prevent
       the application from hanging on large or corrupted files.
+    - New: Files are processed by a pool of long-lived worker processes (configurable,
+      one per CPU core by default). A file that exceeds the timeout only causes its
+      own worker to be killed and replaced.
+    - New: Folders can be dropped (or listed) too. They are walked recursively and
+      streamed into the worker pool, so processing starts before the whole tree has
+      been listed. Hidden files and symlinked folders are optional.
+    - New: Optionally, zip and tar archives are read member by member without
+      unpacking them; each member is routed by its own extension.
+    - New: Files read as plain text are sniffed first (BOM, magic numbers, control
+      bytes, UTF-8/UTF-16 validity on a small head and tail sample): binaries are
+      skipped before being read, and text is decoded with its detected encoding.
 
 2.  User Interface (Single Window, All Controls Visible):
     - Main sections for "Filter Settings," "Filter Test Pad," and "Process Files."
@@ -85,7 +97,10 @@ A. File Processing (`process_file` function):
       `processed_text_content`.
     7. If consolidation is OFF, constructs the output filename using the user-defined suffix
       and saves the combined data as a new .txt file.
-    8. If consolidation is ON, appends the processed content to the single consolidated file.
+    8. If consolidation is ON, hands the processed content to the batch's `ConsolidatedWriter`,
+      which writes the files in input order (whichever finishes first) and replaces the
+      consolidated file in one rename when the batch is done (rolling to numbered, optionally
+      compressed shards with an index, if set).
     9. Updates the status bar with the result.
 
 B. Text Segmentation and Filtering (`process_text` function):
@@ -130,6 +145,8 @@ B. Text Segmentation and Filtering (`process_text` function):
 
 Key Function Details:
 --------------------------------------------------------------------------------
+(The extraction and filtering functions live in `text_stripper_engine.py`, which has no
+ GUI dependencies and can be imported on its own; this file only holds the Tk front end.)
 - `setup_variables()`: Initializes all Tkinter variables for settings with default values.
 - `load_app_settings()`: Loads settings from `SETTINGS_FILENAME` at startup, overriding defaults.
 - `save_app_settings()`: Saves current settings to `SETTINGS_FILENAME` when the application closes.
@@ -139,103 +156,68 @@ Key Function Details:
   button for the Filter Test Pad.
 - `process_pasted_text()`: Handles the logic for the Test Pad, using current settings.
 - `extract_text_from_txt/docx/pdf(filepath)`: Perform raw text extraction from the respective file types.
+- `sniff_text_file(filepath)`: Samples a file routed as text; returns the encoding to read it with, or None for binaries.
 - `get_alphanumeric_ratio(segment)`: Calculates the ratio of alphanumeric characters in a text segment.
-- `is_sentence_or_long_sequence(segment, min_gen, min_punc)`: Checks if a segment meets
+- `segment_stats(segment, symbol_set)`: One pass over a segment that records its length,
+  alphanumeric/digit/symbol/word counts, longest digit run and terminal punctuation.
+  Every per-segment filter reads from this record instead of rescanning the text.
+- `is_sentence_or_long_sequence(stats, min_gen, min_punc)`: Checks if a segment meets
   minimum word count criteria for general or punctuated text.
 - `split_concatenated_token(token)`: Attempts to break a single long token into conceptual
   sub-words based on camel/pascal casing and digit transitions.
-- `is_code_like_segment(segment, words, params...)`: Uses heuristics (keywords, symbols, density)
+- `concat_token_ends(token, min_sub_words)`: What the filter actually needs from that split
+  (the first and last sub-word, or None if there are too few), found in one scan that stops
+  early, with repeated tokens answered from an LRU memo.
+- `is_code_like_segment(stats, params...)`: Uses heuristics (keywords, symbols, density)
   to determine if a segment is likely computer code or markup.
 - `extract_and_format_urls(text_content)`: Finds all URLs in the given text,
   deduplicates them, sorts them, and returns a formatted list string.
+- `text_stripper_vector.reject_flags(segments, plan)`: With NumPy installed, runs the code,
+  number, alphanumeric and word-count checks over a whole list of segments at once
+  (same decisions as the per-segment checks).
+- `get_filter_plan(settings)`: Compiles the filter settings (regexes, symbol set, the list
+  of enabled checks) into a `FilterPlan` once per distinct settings, shared by every segment.
+  Each file's `CheckOrder` times the checks on its first segments and then runs them cheapest
+  rejection first (the word-count check can even skip `segment_stats`' character pass).
 - `process_text(full_text, all_settings...)`: The main engine that applies the entire
   segmentation and filtering pipeline described above.
 - `process_file(filepath)`: Orchestrates file reading, URL extraction (from raw), calling
   `process_text`, and writing the final output (processed text + URL list) to a file.
+- `process_files(filepaths)`: Runs a batch through the warm worker pool (`get_worker_pool()`),
+  enforcing the per-file timeout by replacing only a stuck worker.
+- `text_stripper.py batch ...`: Headless command-line batch mode (see `text_stripper_cli.py`).
 - `drop_handler(event)`: Manages files dropped onto the GUI, passing them to `process_file`.
 - `create_..._setting()` helpers: Utility functions to build common UI patterns for settings.
 - `toggle_controls_state()`: Enables/disables sensitivity controls based on master filter toggles.
 --------------------------------------------------------------------------------
 """
 
+import time
+_STARTUP_T0 = time.perf_counter() # Start of module import, for the startup time report
 
-import tkinter as tk
-from tkinter import ttk
-from tkinter import (Label, Frame, IntVar, BooleanVar, DoubleVar, Scale, Entry, Checkbutton, Spinbox, Button, Text, Scrollbar, PanedWindow, Radiobutton,
-                     SUNKEN, W, X, Y, BOTTOM, LEFT, TOP, BOTH, HORIZONTAL, RIGHT, NW, DISABLED, NORMAL, END, RAISED, VERTICAL, StringVar)
-import tkinter.filedialog as filedialog
 import os
 import re
+import sys
 import json
-import traceback
-from docx import Document
-import PyPDF2
 # NEW IMPORTS FOR TIMEOUT FEATURE
 import multiprocessing
-import queue
-
-try:
-    from tkinterdnd2 import TkinterDnD, DND_FILES
-    print("INFO: tkinterdnd2 imported successfully.")
-    DND_AVAILABLE = True
-except ImportError:
-    print("WARNING: tkinterdnd2 library not found. Drag and drop will be disabled.")
-    DND_AVAILABLE = False
-    class TkinterDnD: # Mock class
-        @staticmethod
-        def Tk(): return tk.Tk()
-    DND_FILES = None
+from text_stripper_engine import (SETTINGS_FILENAME, DEFAULT_SETTINGS,
+                                  process_text, extract_and_format_urls, extract_file,
+                                  get_extension_router, skipped_unknown_result, output_path_for,
+                                  StreamPaths, salvage_stream_output, save_output) # Workers import the engine anyway
+
+# tkinter and the batch modules only the GUI uses are loaded by load_gui_libraries(): worker
+# processes started with 'spawn' re-import this module, and shouldn't pay for (or print about)
+# libraries they never use
+DND_AVAILABLE, TkinterDnD, DND_FILES = False, None, None
+_IMPORTS_DONE = time.perf_counter() # Moved on by load_gui_libraries(), so the budget covers the GUI imports too
+STARTUP_BUDGET_IMPORTS = 0.5 # Seconds
+STARTUP_BUDGET_FIRST_WINDOW = 1.5
 
 APP_VERSION = "1.7.4" # Fixed multiprocessing NameError
 
-# NEW DEFAULT VALUE
-DEFAULT_FILE_PROCESSING_TIMEOUT = 60 # New: Default timeout for file processing in seconds
-
-# --- Default values ---
-DEFAULT_MIN_WORDS_GENERAL = 11; DEFAULT_MIN_WORDS_SENTENCE = 5
-DEFAULT_ALPHANUM_ENABLED = 1; DEFAULT_ALPHANUM_THRESHOLD = 0.75
-DEFAULT_ALPHANUM_MIN_LEN_FOR_RATIO = 5; DEFAULT_ALPHANUM_ABS_COUNT_FALLBACK = 15
-DEFAULT_MAX_SEGMENT_LEN_BEFORE_NEWLINE_SPLIT = 350
-DEFAULT_PARA_FILTER_ENABLED = 0; DEFAULT_PARA_MIN_SENTENCES = 2; DEFAULT_PARA_MIN_WORDS = 20; DEFAULT_PARA_MIN_AVG_LEN = 5; DEFAULT_PARA_MAX_AVG_LEN = 40
-DEFAULT_REMOVE_CODE_BLOCKS = 1; DEFAULT_MIN_CODE_KEYWORDS = 1; DEFAULT_MIN_CODE_SYMBOLS = 2; DEFAULT_MIN_WORDS_CODE_CHECK = 2; DEFAULT_CODE_SYMBOL_DENSITY 
-
-= 0.20
-DEFAULT_REMOVE_CONCAT_ENTIRELY = 1; DEFAULT_MIN_LEN_CONCAT_CHECK = 18; DEFAULT_MIN_SUB_WORDS_REPLACE = 3
-DEFAULT_REMOVE_SYMBOL_ENCLOSED = 1; DEFAULT_MAX_SYMBOLS_AROUND = 3
-DEFAULT_CUSTOM_REGEX_ENABLED = 0; DEFAULT_CUSTOM_REGEX_PATTERN = ""; DEFAULT_CUSTOM_REGEX_MODE = "remove_matches"; DEFAULT_CUSTOM_REGEX_CASE_SENSITIVE = 0
-DEFAULT_CUSTOM_FILE_EXTENSIONS = ""
-DEFAULT_OUTPUT_FILE_SUFFIX = "_processed"
-DEFAULT_EXTRACT_URLS_ENABLED = 0
-DEFAULT_FILE_PROCESSING_MODE = "specified"
-DEFAULT_INCLUDE_EXTENSIONS = ""
-DEFAULT_IGNORE_EXTENSIONS = ".zip, .rar, .7z, .exe, .dll, .msi, .pkg, .dmg, .iso, .img, .jpg, .jpeg, .png, .gif, .bmp, .tiff, .webp, .mp3, .wav, .aac, 
-
-.ogg, .mp4, .mov, .avi, .mkv, .webm"
-DEFAULT_REMOVE_NUMBER_HEAVY = 0; DEFAULT_NUMBER_RATIO_THRESHOLD = 0.5; DEFAULT_MIN_DIGITS_FOR_RATIO_CHECK = 5; DEFAULT_MAX_CONSECUTIVE_DIGITS = 8; 
-
-DEFAULT_MIN_WORDS_TO_EXEMPT_DIGITS = 10
-DEFAULT_CODE_SYMBOL_MODE = "all"; DEFAULT_CODE_CUSTOM_SYMBOLS = ""
-DEFAULT_HTML_STRIPPING_MODE = "strip_tags"
-DEFAULT_CONSOLIDATE_OUTPUT = 0
-DEFAULT_CONSOLIDATED_OUTPUT_FILENAME = "consolidated_output.txt"
-DEFAULT_PAGES_TO_PROCESS = 0
-
-CODE_KEYWORDS_LIST = {
-    'var', 'let', 'const', 'function', 'return', 'this', 'class', 'constructor', 'new', 'Error', 'throw', 'if', 'else', 'for', 'while', 'switch', 'case',
-'break', 'continue', 'try', 'catch', 'finally', 'import', 'export', 'super', 'extends', 'async', 'await', 'yield', 'true', 'false', 'null', 'undefined',
-'typeof', 'instanceof', 'void', 'delete', 'prototype', 'static', 'get', 'set', 'document', 'window', 'JSON', 'Map', 'Promise', 'Object', 'Array',
-'String', 'Number', 'Boolean', 'Symbol', '=>', '...','require','module','exports','googletag','pubads','slot',
-'addEventListener','removeEventListener','querySelector','getElementById','getElementsByClassName',
-'createElement','appendChild','innerHTML','outerHTML','style','console','log','warn','info',
-'ajax','fetch','XMLHttpRequest','jQuery','angular','react','vue', 'webpack', 'chunk', 'props', 'state',
-    'div', 'span', 'p', 'a', 'img', 'ul', 'ol', 'li', 'table', 'tr', 'td', 'th', 'form', 'input', 'button', 'href', 'src', 'alt', 'class', 'id', 'rel',
-'target', 'type', 'value', 'placeholder', 'html', 'head', 'body', 'title', 'meta', 'link', 'script'
-}
-CODE_SYMBOLS_SET = {
-    '{', '}', '(', ')', '[', ']', ';', '=', '<', '>', '%', ':', '-', '+', '!', '#', '$', '&', '*', '|', '~', '`', '/', '\\', '@', '^', '_'
-}
-
 # --- Global Tkinter Variables ---
+pre_filter_enabled_var = None
 min_words_general_var, min_words_sentence_var = (None,) * 2
 alphanum_filter_enabled_var, alphanum_threshold_var, \
     alnum_min_len_for_ratio_var, alnum_abs_count_fallback_var = (None,) * 4
@@ -258,60 +240,27 @@ consolidated_output_filename_var = None
 pages_to_process_var = None
 # NEW GLOBAL VARIABLE
 file_processing_timeout_var = None
-
-SETTINGS_FILENAME = "text_extractor_settings.json"
-SETTINGS_CONFIG = {
-    'html_stripping_mode_var': (tk.StringVar, DEFAULT_HTML_STRIPPING_MODE),
-    'min_words_general_var': (tk.IntVar, DEFAULT_MIN_WORDS_GENERAL),
-    'min_words_sentence_var': (tk.IntVar, DEFAULT_MIN_WORDS_SENTENCE),
-    'alphanum_filter_enabled_var': (tk.IntVar, DEFAULT_ALPHANUM_ENABLED),
-    'alphanum_threshold_var': (tk.DoubleVar, DEFAULT_ALPHANUM_THRESHOLD),
-    'alnum_min_len_for_ratio_var': (tk.IntVar, DEFAULT_ALPHANUM_MIN_LEN_FOR_RATIO),
-    'alnum_abs_count_fallback_var': (tk.IntVar, DEFAULT_ALPHANUM_ABS_COUNT_FALLBACK),
-    'max_segment_len_var': (tk.IntVar, DEFAULT_MAX_SEGMENT_LEN_BEFORE_NEWLINE_SPLIT),
-    'para_filter_enabled_var': (tk.IntVar, DEFAULT_PARA_FILTER_ENABLED),
-    'para_min_sentences_var': (tk.IntVar, DEFAULT_PARA_MIN_SENTENCES),
-    'para_min_words_var': (tk.IntVar, DEFAULT_PARA_MIN_WORDS),
-    'para_min_avg_len_var': (tk.IntVar, DEFAULT_PARA_MIN_AVG_LEN),
-    'para_max_avg_len_var': (tk.IntVar, DEFAULT_PARA_MAX_AVG_LEN),
-    'file_processing_mode_var': (tk.StringVar, DEFAULT_FILE_PROCESSING_MODE),
-    'custom_file_extensions_var': (tk.StringVar, DEFAULT_CUSTOM_FILE_EXTENSIONS),
-    'include_extensions_var': (tk.StringVar, DEFAULT_INCLUDE_EXTENSIONS),
-    'ignore_extensions_var': (tk.StringVar, DEFAULT_IGNORE_EXTENSIONS),
-    'custom_output_suffix_var': (tk.StringVar, DEFAULT_OUTPUT_FILE_SUFFIX),
-    'extract_urls_enabled_var': (tk.IntVar, DEFAULT_EXTRACT_URLS_ENABLED),
-    'remove_number_heavy_var': (tk.IntVar, DEFAULT_REMOVE_NUMBER_HEAVY),
-    'number_ratio_threshold_var': (tk.DoubleVar, DEFAULT_NUMBER_RATIO_THRESHOLD),
-    'min_digits_for_ratio_check_var': (tk.IntVar, DEFAULT_MIN_DIGITS_FOR_RATIO_CHECK),
-    'max_consecutive_digits_var': (tk.IntVar, DEFAULT_MAX_CONSECUTIVE_DIGITS),
-    'min_words_to_exempt_digits_var': (tk.IntVar, DEFAULT_MIN_WORDS_TO_EXEMPT_DIGITS),
-    'remove_code_blocks_var': (tk.IntVar, DEFAULT_REMOVE_CODE_BLOCKS),
-    'min_code_keywords_var': (tk.IntVar, DEFAULT_MIN_CODE_KEYWORDS),
-    'min_code_symbols_var': (tk.IntVar, DEFAULT_MIN_CODE_SYMBOLS),
-    'min_words_code_check_var': (tk.IntVar, DEFAULT_MIN_WORDS_CODE_CHECK),
-    'code_symbol_density_var': (tk.DoubleVar, DEFAULT_CODE_SYMBOL_DENSITY),
-    'code_symbol_mode_var': (tk.StringVar, DEFAULT_CODE_SYMBOL_MODE),
-    'code_custom_symbols_var': (tk.StringVar, DEFAULT_CODE_CUSTOM_SYMBOLS),
-    'remove_concat_entirely_var': (tk.IntVar, DEFAULT_REMOVE_CONCAT_ENTIRELY),
-    'min_len_concat_check_var': (tk.IntVar, DEFAULT_MIN_LEN_CONCAT_CHECK),
-    'min_sub_words_replace_var': (tk.IntVar, DEFAULT_MIN_SUB_WORDS_REPLACE),
-    'remove_symbol_enclosed_var': (tk.IntVar, DEFAULT_REMOVE_SYMBOL_ENCLOSED),
-    'max_symbols_around_var': (tk.IntVar, DEFAULT_MAX_SYMBOLS_AROUND),
-    'custom_regex_enabled_var': (tk.IntVar, DEFAULT_CUSTOM_REGEX_ENABLED),
-    'custom_regex_pattern_var': (tk.StringVar, DEFAULT_CUSTOM_REGEX_PATTERN),
-    'custom_regex_mode_var': (tk.StringVar, DEFAULT_CUSTOM_REGEX_MODE),
-    'custom_regex_case_sensitive_var': (tk.IntVar, DEFAULT_CUSTOM_REGEX_CASE_SENSITIVE),
-    'consolidate_output_enabled_var': (tk.IntVar, DEFAULT_CONSOLIDATE_OUTPUT),
-    'consolidated_output_filename_var': (tk.StringVar, DEFAULT_CONSOLIDATED_OUTPUT_FILENAME),
-    'pages_to_process_var': (tk.IntVar, DEFAULT_PAGES_TO_PROCESS),
-    # NEW SETTINGS ENTRY
-    'file_processing_timeout_var': (tk.IntVar, DEFAULT_FILE_PROCESSING_TIMEOUT),
-}
+worker_count_var = None
+include_hidden_files_var, follow_symlinks_var, skip_unchanged_files_var = (None,) * 3
+read_archives_var = None
+raw_cache_enabled_var, raw_cache_dir_var, raw_cache_max_mb_var = (None,) * 3
+stream_threshold_mb_var, pdf_shard_pages_var, numpy_scoring_var, segment_locations_var = (None,) * 4
+segment_memo_var, collapse_duplicate_segments_var = None, None
+adaptive_filter_order_var = None
+near_duplicate_mode_var, near_duplicate_threshold_var = None, None
+consolidated_shard_mb_var, consolidated_shard_files_var, consolidated_compression_var = (None,) * 3
+output_format_var = None
+
+# Tk variable type for each setting, chosen from the type of its default in text_stripper_engine
+_TK_VAR_TYPES = {int: 'IntVar', float: 'DoubleVar', str: 'StringVar'} # tkinter class names, it isn't imported yet
+SETTINGS_CONFIG = {var_name: (_TK_VAR_TYPES[type(default_value)], default_value) for var_name, default_value in DEFAULT_SETTINGS.items()}
 g_test_pad_input_text = None; g_test_pad_output_text = None
 g_processed_files_list = [] # Global list to track files processed for consolidation
+g_worker_pool = None # Warm worker processes, created on first use
 
 def setup_variables():
-    for var_name, (var_type, default_value) in SETTINGS_CONFIG.items():
+    for var_name, (var_type_name, default_value) in SETTINGS_CONFIG.items():
+        var_type = getattr(tk, var_type_name)
         if globals().get(var_name) is None or not isinstance(globals().get(var_name), var_type):
             globals()[var_name] = var_type(value=default_value)
 def load_app_settings():
@@ -337,7 +286,7 @@ def save_app_settings():
         print(f"INFO: Settings saved to {SETTINGS_FILENAME}")
     except Exception as e: print(f"ERROR: Failed to save settings: {e}")
 
-def create_entry_setting(parent, label_text, var, label_width=28, entry_width=30, indent=0, side_to_pack_label=LEFT, side_to_pack_entry=LEFT):
+def create_entry_setting(parent, label_text, var, label_width=28, entry_width=30, indent=0, side_to_pack_label='left', side_to_pack_entry='left'):
     frame = Frame(parent); frame.pack(side=TOP, fill=X, padx=5, pady=1)
     Label(frame, text=label_text, width=label_width, anchor=W).pack(side=side_to_pack_label, padx=(indent,2))
     entry = Entry(frame, textvariable=var, width=entry_width)
@@ -402,14 +351,11 @@ def populate_settings_content(parent_scrollable_frame):
     Radiobutton(html_frame, text="Off", variable=html_stripping_mode_var, value="off").pack(side=TOP, anchor=W, padx=10)
     Radiobutton(html_frame, text="Strip Tags & Keep Content", variable=html_stripping_mode_var, value="strip_tags").pack(side=TOP, anchor=W, padx=10)
     Radiobutton(html_frame, text="Discard Segments w/ Tags", variable=html_stripping_mode_var, value="discard_segments").pack(side=TOP, anchor=W, padx=10)
+    Radiobutton(html_frame, text="Parse HTML (Skip Scripts, Keep Blocks)", variable=html_stripping_mode_var, value="parse_html").pack(side=TOP, anchor=W, padx=10)
 
     create_synchronized_setting(col1_frame, "Min Words (General Seq):", min_words_general_var, 1, 100, is_int=True, label_width=24, control_length=90)
-    create_synchronized_setting(col1_frame, "Min Words (Punctuated Sent.):", min_words_sentence_var, 1, 50, is_int=True, label_width=24, 
-
-control_length=90)
-    create_synchronized_setting(col1_frame, "Max Chars Seg (for NL split):", max_segment_len_var, 50, 2000, resolution=50, is_int=True, label_width=24, 
-
-control_length=90)
+    create_synchronized_setting(col1_frame, "Min Words (Punctuated Sent.):", min_words_sentence_var, 1, 50, is_int=True, label_width=24, control_length=90)
+    create_synchronized_setting(col1_frame, "Max Chars Seg (for NL split):", max_segment_len_var, 50, 2000, resolution=50, is_int=True, label_width=24, control_length=90)
 
     # --- Column 2: Alphanum, Number & Paragraph Filters ---
     Label(col2_frame, text="Content Structure Filters:", font=('Helvetica', 10, 'bold')).pack(side=TOP, pady=(5,2), anchor=NW, padx=5)
@@ -419,34 +365,20 @@ control_length=90)
     def update_alphanum_status_and_toggle(*args): toggle_controls_state(alphanum_filter_enabled_var, alnum_sensitivity_controls)
     alphanum_filter_enabled_var.trace_add("write", update_alphanum_status_and_toggle)
     Checkbutton(alphanum_main_frame, text="Enable", variable=alphanum_filter_enabled_var).pack(side=LEFT, anchor=W)
-    ratio_widgets = create_synchronized_setting(col2_frame, "Ratio Threshold:", alphanum_threshold_var, 0.0, 1.0, resolution=0.01, is_int=False, 
-
-label_width=22, indent=10, control_length=90)
+    ratio_widgets = create_synchronized_setting(col2_frame, "Ratio Threshold:", alphanum_threshold_var, 0.0, 1.0, resolution=0.01, is_int=False, label_width=22, indent=10, control_length=90)
     alnum_sensitivity_controls.extend(ratio_widgets)
-    alnum_sensitivity_controls.extend(create_synchronized_setting(col2_frame, "Min Seg Len for Ratio Test:", alnum_min_len_for_ratio_var, 1, 50, 
-
-is_int=True, label_width=22, indent=10, control_length=90))
-    alnum_sensitivity_controls.extend(create_synchronized_setting(col2_frame, "Abs Alnum Fallback Count:", alnum_abs_count_fallback_var, 0, 100, 
-
-is_int=True, label_width=22, indent=10, control_length=90))
+    alnum_sensitivity_controls.extend(create_synchronized_setting(col2_frame, "Min Seg Len for Ratio Test:", alnum_min_len_for_ratio_var, 1, 50, is_int=True, label_width=22, indent=10, control_length=90))
+    alnum_sensitivity_controls.extend(create_synchronized_setting(col2_frame, "Abs Alnum Fallback Count:", alnum_abs_count_fallback_var, 0, 100, is_int=True, label_width=22, indent=10, control_length=90))
     update_alphanum_status_and_toggle()
 
     Label(col2_frame, text="Number-Heavy Filter:", font=('Helvetica', 9, 'bold')).pack(side=TOP, pady=(10,0), anchor=NW, padx=5)
     cb_remove_number_heavy = Checkbutton(col2_frame, text="Enable", variable=remove_number_heavy_var)
     cb_remove_number_heavy.pack(side=TOP, anchor=W, padx=15)
     temp_number_controls = []
-    temp_number_controls.extend(create_synchronized_setting(col2_frame, "Digit Ratio Threshold >", number_ratio_threshold_var, 0.01, 1.0, resolution=0.01, 
-
-is_int=False, label_width=22, indent=10, control_length=90))
-    temp_number_controls.extend(create_synchronized_setting(col2_frame, "Min Digits for Ratio Chk:", min_digits_for_ratio_check_var, 1, 50, is_int=True, 
-
-label_width=22, indent=10, control_length=90))
-    temp_number_controls.extend(create_synchronized_setting(col2_frame, "Max Consecutive Digits:", max_consecutive_digits_var, 3, 50, is_int=True, 
-
-label_width=22, indent=10, control_length=90))
-    temp_number_controls.extend(create_synchronized_setting(col2_frame, "Min Words to Exempt:", min_words_to_exempt_digits_var, 0, 50, is_int=True, 
-
-label_width=22, indent=10, control_length=90))
+    temp_number_controls.extend(create_synchronized_setting(col2_frame, "Digit Ratio Threshold >", number_ratio_threshold_var, 0.01, 1.0, resolution=0.01, is_int=False, label_width=22, indent=10, control_length=90))
+    temp_number_controls.extend(create_synchronized_setting(col2_frame, "Min Digits for Ratio Chk:", min_digits_for_ratio_check_var, 1, 50, is_int=True, label_width=22, indent=10, control_length=90))
+    temp_number_controls.extend(create_synchronized_setting(col2_frame, "Max Consecutive Digits:", max_consecutive_digits_var, 3, 50, is_int=True, label_width=22, indent=10, control_length=90))
+    temp_number_controls.extend(create_synchronized_setting(col2_frame, "Min Words to Exempt:", min_words_to_exempt_digits_var, 0, 50, is_int=True, label_width=22, indent=10, control_length=90))
     remove_number_heavy_var.trace_add("write", lambda *args: toggle_controls_state(remove_number_heavy_var, temp_number_controls))
     toggle_controls_state(remove_number_heavy_var, temp_number_controls)
 
@@ -454,18 +386,10 @@ label_width=22, indent=10, control_length=90))
     cb_para_filter = Checkbutton(col2_frame, text="Enable", variable=para_filter_enabled_var)
     cb_para_filter.pack(side=TOP, anchor=W, padx=15)
     para_sensitivity_controls = []
-    para_sensitivity_controls.extend(create_synchronized_setting(col2_frame, "Min Sentences / Para:", para_min_sentences_var, 1, 20, is_int=True, 
-
-label_width=22, indent=10, control_length=90))
-    para_sensitivity_controls.extend(create_synchronized_setting(col2_frame, "Min Words / Para:", para_min_words_var, 1, 200, resolution=5, is_int=True, 
-
-label_width=22, indent=10, control_length=90))
-    para_sensitivity_controls.extend(create_synchronized_setting(col2_frame, "Min Avg Sent. Len:", para_min_avg_len_var, 1, 50, is_int=True, 
-
-label_width=22, indent=10, control_length=90))
-    para_sensitivity_controls.extend(create_synchronized_setting(col2_frame, "Max Avg Sent. Len:", para_max_avg_len_var, 5, 100, is_int=True, 
-
-label_width=22, indent=10, control_length=90))
+    para_sensitivity_controls.extend(create_synchronized_setting(col2_frame, "Min Sentences / Para:", para_min_sentences_var, 1, 20, is_int=True, label_width=22, indent=10, control_length=90))
+    para_sensitivity_controls.extend(create_synchronized_setting(col2_frame, "Min Words / Para:", para_min_words_var, 1, 200, resolution=5, is_int=True, label_width=22, indent=10, control_length=90))
+    para_sensitivity_controls.extend(create_synchronized_setting(col2_frame, "Min Avg Sent. Len:", para_min_avg_len_var, 1, 50, is_int=True, label_width=22, indent=10, control_length=90))
+    para_sensitivity_controls.extend(create_synchronized_setting(col2_frame, "Max Avg Sent. Len:", para_max_avg_len_var, 5, 100, is_int=True, label_width=22, indent=10, control_length=90))
     para_filter_enabled_var.trace_add("write", lambda *args: toggle_controls_state(para_filter_enabled_var, para_sensitivity_controls))
     toggle_controls_state(para_filter_enabled_var, para_sensitivity_controls)
 
@@ -480,14 +404,30 @@ label_width=22, indent=10, control_length=90))
     create_entry_setting(col3_frame, "Always IGNORE these (,.ext):", ignore_extensions_var, entry_width=20, label_width=22)
     create_entry_setting(col3_frame, "Additional Text Exts:", custom_file_extensions_var, entry_width=20, label_width=22)
     create_entry_setting(col3_frame, "Output File Suffix:", custom_output_suffix_var, entry_width=20, label_width=22)
+    output_format_frame = Frame(col3_frame); output_format_frame.pack(side=TOP, anchor=W, padx=5)
+    Label(output_format_frame, text="Output Format:").pack(side=LEFT)
+    Radiobutton(output_format_frame, text="Text", variable=output_format_var, value="text").pack(side=LEFT)
+    Radiobutton(output_format_frame, text="JSONL (record per segment)", variable=output_format_var, value="jsonl").pack(side=LEFT)
 
     # New Pages to Process
     create_synchronized_setting(col3_frame, "Pages to Process (0=all):", pages_to_process_var, 0, 500, is_int=True, label_width=22, control_length=80)
     
     # NEW UI ELEMENT FOR TIMEOUT
-    create_synchronized_setting(col3_frame, "File Processing Timeout (secs):", file_processing_timeout_var, 1, 300, is_int=True, label_width=22, 
-
-control_length=80)
+    create_synchronized_setting(col3_frame, "File Processing Timeout (secs):", file_processing_timeout_var, 1, 300, is_int=True, label_width=22, control_length=80)
+    create_synchronized_setting(col3_frame, "Worker Processes (0=auto):", worker_count_var, 0, 64, is_int=True, label_width=22, control_length=80)
+    Checkbutton(col3_frame, text="Include hidden files in folders", variable=include_hidden_files_var).pack(side=TOP, anchor=W, padx=5)
+    Checkbutton(col3_frame, text="Follow folder symlinks", variable=follow_symlinks_var).pack(side=TOP, anchor=W, padx=5)
+    Checkbutton(col3_frame, text="Read inside zip/tar archives", variable=read_archives_var).pack(side=TOP, anchor=W, padx=5)
+    Checkbutton(col3_frame, text="Skip unchanged files on re-runs", variable=skip_unchanged_files_var).pack(side=TOP, anchor=W, padx=5)
+    Checkbutton(col3_frame, text="Cache extracted PDF/DOCX text", variable=raw_cache_enabled_var).pack(side=TOP, anchor=W, padx=5)
+    create_synchronized_setting(col3_frame, "Text Cache Size (MB):", raw_cache_max_mb_var, 16, 8192, is_int=True, label_width=22, control_length=80)
+    create_synchronized_setting(col3_frame, "Stream Files Over (MB):", stream_threshold_mb_var, 1, 4096, is_int=True, label_width=22, control_length=80)
+    create_synchronized_setting(col3_frame, "Split PDFs Over (Pages):", pdf_shard_pages_var, 0, 5000, is_int=True, label_width=22, control_length=80)
+    Checkbutton(col3_frame, text="Tag segments with source location", variable=segment_locations_var).pack(side=TOP, anchor=W, padx=5)
+    Checkbutton(col3_frame, text="Drop repeated segments (keep first)", variable=collapse_duplicate_segments_var).pack(side=TOP, anchor=W, padx=5)
+    Checkbutton(col3_frame, text="Score segments in bulk (NumPy)", variable=numpy_scoring_var).pack(side=TOP, anchor=W, padx=5)
+    Checkbutton(col3_frame, text="Decide repeated segments once", variable=segment_memo_var).pack(side=TOP, anchor=W, padx=5)
+    Checkbutton(col3_frame, text="Order filter checks by measured cost", variable=adaptive_filter_order_var).pack(side=TOP, anchor=W, padx=5)
 
 
     # Updated URL extraction label
@@ -501,9 +441,20 @@ control_length=80)
     consolidation_controls = []
     cb_consolidate = Checkbutton(col3_frame, text="Enable Consolidation", variable=consolidate_output_enabled_var)
     cb_consolidate.pack(side=TOP, anchor=W, padx=15)
-    consolidation_controls.append(create_entry_setting(col3_frame, "Consolidated Filename:", consolidated_output_filename_var, entry_width=20, 
-
-label_width=22, indent=10))
+    consolidation_controls.append(create_entry_setting(col3_frame, "Consolidated Filename:", consolidated_output_filename_var, entry_width=20, label_width=22, indent=10))
+    Label(col3_frame, text="Near-Duplicates Across Files:").pack(side=TOP, anchor=W, padx=15)
+    near_dup_frame = Frame(col3_frame); near_dup_frame.pack(side=TOP, anchor=W, padx=15)
+    for text, value in (("Off", "off"), ("Drop", "drop"), ("Flag", "flag")):
+        rb = Radiobutton(near_dup_frame, text=text, variable=near_duplicate_mode_var, value=value); rb.pack(side=LEFT)
+        consolidation_controls.append(rb)
+    consolidation_controls.extend(create_synchronized_setting(col3_frame, "Near-Dup Similarity:", near_duplicate_threshold_var, 0.5, 1.0, resolution=0.01, is_int=False, label_width=22, indent=10, control_length=80))
+    consolidation_controls.extend(create_synchronized_setting(col3_frame, "Roll Shard Every (MB):", consolidated_shard_mb_var, 0, 20480, label_width=22, indent=10, control_length=80))
+    consolidation_controls.extend(create_synchronized_setting(col3_frame, "Roll Shard Every (Files):", consolidated_shard_files_var, 0, 10000, label_width=22, indent=10, control_length=80))
+    Label(col3_frame, text="Compression:").pack(side=TOP, anchor=W, padx=15)
+    compression_frame = Frame(col3_frame); compression_frame.pack(side=TOP, anchor=W, padx=15)
+    for text, value in (("None", "none"), ("gzip", "gzip"), ("xz", "xz"), ("bz2", "bz2")):
+        rb = Radiobutton(compression_frame, text=text, variable=consolidated_compression_var, value=value); rb.pack(side=LEFT)
+        consolidation_controls.append(rb)
 
     def update_consolidation_controls(*args):
         toggle_controls_state(consolidate_output_enabled_var, consolidation_controls)
@@ -522,38 +473,22 @@ label_width=22, indent=10))
     cb_custom_regex.pack(side=TOP, anchor=W, padx=5, pady=(0,10))
     concat_sensitivity_label = Label(col4_frame, text="Concatenated Word Def.:", font=('Helvetica', 9, 'italic'))
     concat_sensitivity_label.pack(side=TOP, pady=(5,0), anchor=NW, padx=5)
-    create_synchronized_setting(col4_frame, "Min Length to Check:", min_len_concat_check_var, 10, 50, is_int=True, label_width=20, control_length=80, 
-
-indent=10)
-    create_synchronized_setting(col4_frame, "Min Sub-Words to Act:", min_sub_words_replace_var, 2, 10, is_int=True, label_width=20, control_length=80, 
-
-indent=10)
+    create_synchronized_setting(col4_frame, "Min Length to Check:", min_len_concat_check_var, 10, 50, is_int=True, label_width=20, control_length=80, indent=10)
+    create_synchronized_setting(col4_frame, "Min Sub-Words to Act:", min_sub_words_replace_var, 2, 10, is_int=True, label_width=20, control_length=80, indent=10)
     symbol_sensitivity_label = Label(col4_frame, text="Symbol-Enclosed Sens.:", font=('Helvetica', 9, 'italic'))
     symbol_sensitivity_label.pack(side=TOP, pady=(5,0), anchor=NW, padx=5); temp_symbol_controls = []
-    temp_symbol_controls.extend(create_synchronized_setting(col4_frame, "Max Symbols Around:", max_symbols_around_var, 1, 5, is_int=True, label_width=20, 
-
-control_length=80, indent=10))
-    remove_symbol_enclosed_var.trace_add("write", lambda *args: toggle_controls_state(remove_symbol_enclosed_var, temp_symbol_controls + 
-
-[symbol_sensitivity_label]))
+    temp_symbol_controls.extend(create_synchronized_setting(col4_frame, "Max Symbols Around:", max_symbols_around_var, 1, 5, is_int=True, label_width=20, control_length=80, indent=10))
+    remove_symbol_enclosed_var.trace_add("write", lambda *args: toggle_controls_state(remove_symbol_enclosed_var, temp_symbol_controls + [symbol_sensitivity_label]))
     toggle_controls_state(remove_symbol_enclosed_var, temp_symbol_controls + [symbol_sensitivity_label])
 
     # --- Column 5: Code Filter & Custom Regex Details ---
     Label(col5_frame, text="Code & Regex Details:", font=('Helvetica', 10, 'bold')).pack(side=TOP, pady=(5,2), anchor=NW, padx=5)
     code_sensitivity_label = Label(col5_frame, text="Code Filter Sensitivity:", font=('Helvetica', 9, 'italic'))
     code_sensitivity_label.pack(side=TOP, pady=(5,0), anchor=NW, padx=5); temp_code_controls = []
-    temp_code_controls.extend(create_synchronized_setting(col5_frame, "Min Keywords:", min_code_keywords_var, 0, 20, is_int=True, label_width=20, 
-
-control_length=80, indent=10))
-    temp_code_controls.extend(create_synchronized_setting(col5_frame, "Min Code Symbols:", min_code_symbols_var, 0, 30, is_int=True, label_width=20, 
-
-control_length=80, indent=10))
-    temp_code_controls.extend(create_synchronized_setting(col5_frame, "Min Words in Seg:", min_words_code_check_var, 1, 20, is_int=True, label_width=20, 
-
-control_length=80, indent=10))
-    temp_code_controls.extend(create_synchronized_setting(col5_frame, "Symbol Density >", code_symbol_density_var, 0.01, 0.5, resolution=0.01, 
-
-is_int=False, label_width=20, control_length=80, indent=10))
+    temp_code_controls.extend(create_synchronized_setting(col5_frame, "Min Keywords:", min_code_keywords_var, 0, 20, is_int=True, label_width=20, control_length=80, indent=10))
+    temp_code_controls.extend(create_synchronized_setting(col5_frame, "Min Code Symbols:", min_code_symbols_var, 0, 30, is_int=True, label_width=20, control_length=80, indent=10))
+    temp_code_controls.extend(create_synchronized_setting(col5_frame, "Min Words in Seg:", min_words_code_check_var, 1, 20, is_int=True, label_width=20, control_length=80, indent=10))
+    temp_code_controls.extend(create_synchronized_setting(col5_frame, "Symbol Density >", code_symbol_density_var, 0.01, 0.5, resolution=0.01, is_int=False, label_width=20, control_length=80, indent=10))
     code_symbol_mode_frame = Frame(col5_frame); code_symbol_mode_frame.pack(side=TOP, fill=X, padx=(15, 5))
     Label(code_symbol_mode_frame, text="Symbol Mode:").pack(side=TOP, anchor=W)
     Radiobutton(code_symbol_mode_frame, text="All Pre-def", variable=code_symbol_mode_var, value="all").pack(side=LEFT, padx=1)
@@ -575,455 +510,185 @@ is_int=False, label_width=20, control_length=80, indent=10))
     rb_keep.pack(side=LEFT, padx=1); temp_regex_controls.append(rb_keep)
     cb_case_sensitive = Checkbutton(regex_mode_frame_col5, text="Case Sens.", variable=custom_regex_case_sensitive_var)
     cb_case_sensitive.pack(side=LEFT, padx=2); temp_regex_controls.append(cb_case_sensitive)
-    custom_regex_enabled_var.trace_add("write", lambda *args: toggle_controls_state(custom_regex_enabled_var, temp_regex_controls + 
-
-[regex_sensitivity_label]))
+    custom_regex_enabled_var.trace_add("write", lambda *args: toggle_controls_state(custom_regex_enabled_var, temp_regex_controls + [regex_sensitivity_label]))
     toggle_controls_state(custom_regex_enabled_var, temp_regex_controls + [regex_sensitivity_label])
 
-def reset_consolidated_file():
-    """Wipes the consolidated file, preparing for a new batch."""
-    if consolidate_output_enabled_var.get() == 1:
-        consolidated_filename = consolidated_output_filename_var.get().strip()
-        if not consolidated_filename:
-            status_label.config(text="Error: Consolidated filename cannot be empty.")
-            return
-        
-        consolidated_output_path = os.path.join(os.getcwd(), consolidated_filename)
-        
-        try:
-            with open(consolidated_output_path, 'w', encoding='utf-8') as outfile:
-                outfile.write("") # Overwrite with empty content
-        except Exception as e:
-            status_label.config(text=f"Error resetting consolidated file: {e}")
-
-def append_to_consolidated(filename, content):
-    """Appends processed content from a single file to the consolidated output file."""
-    if consolidate_output_enabled_var.get() == 1:
-        consolidated_filename = consolidated_output_filename_var.get().strip()
-        if not consolidated_filename:
-            print("WARNING: Consolidated filename is empty. Skipping append.")
-            return
-            
-        consolidated_output_path = os.path.join(os.getcwd(), consolidated_filename)
-        
-        try:
-            with open(consolidated_output_path, 'a', encoding='utf-8') as outfile:
-                outfile.write(f"--- Start of file: {os.path.basename(filename)} ---\n\n")
-                outfile.write(content)
-                outfile.write(f"\n\n--- End of file: {os.path.basename(filename)} ---\n\n")
-        except Exception as e:
-            print(f"ERROR: Failed to append to consolidated file: {e}")
-            
-# MOVE FUNCTIONS INSIDE HERE
-def _process_file_in_process(filepath, params, result_queue):
-    """
-    A separate function to run file processing in a dedicated process.
-    It puts a tuple of (status, data) into a queue for the main process.
-    """
-    # --- TROUBLESHOOTING START POINT 1: ENTRY AND FILE TYPE
-    print(f"DEBUG: Starting worker process for: {filepath}")
-    
-    # Moved helper functions inside this function to ensure they are available to the new process
-    def extract_text_from_txt(filepath):
-        try:
-            with open(filepath, 'r', encoding='utf-8', errors='ignore') as f: return f.read()
-        except Exception as e:
-            # print(f"Error reading .txt {filepath}: {e}")
-            # status_label.config(text=f"Error reading .txt: {os.path.basename(filepath)}")
-            return ""
-    def extract_text_from_docx(filepath):
-        try:
-            doc = Document(filepath); return '\n'.join([para.text for para in doc.paragraphs])
-        except Exception as e:
-            # print(f"Error reading .docx {filepath}: {e}")
-            # status_label.config(text=f"Error reading .docx: {os.path.basename(filepath)}")
-            return ""
-    def extract_text_from_pdf(filepath, pages_to_process):
-        text = ""
-        try:
-            with open(filepath, 'rb') as f:
-                reader = PyPDF2.PdfReader(f)
-                if reader.is_encrypted:
-                    try: reader.decrypt('')
-                    except:
-                        # print(f"PDF Decryption failed for {filepath}")
-                        # status_label.config(text=f"PDF Decryption Failed: {os.path.basename(filepath)}")
-                        return ""
-                    
-                num_pages = len(reader.pages)
-                
-                # --- TROUBLESHOOTING START POINT 2: PAGE COUNT
-                print(f"DEBUG: {os.path.basename(filepath)} has {num_pages} pages. Processing up to {pages_to_process if pages_to_process > 0 and 
-
-pages_to_process < num_pages else num_pages} pages.")
-                
-                if pages_to_process > 0 and pages_to_process < num_pages:
-                    page_limit = pages_to_process
-                    # print(f"INFO: Processing first {page_limit} pages of {os.path.basename(filepath)}.")
-                else:
-                    page_limit = num_pages
-                    # print(f"INFO: Processing all {num_pages} pages of {os.path.basename(filepath)}.")
-                    
-                for i in range(page_limit):
-                    # --- TROUBLESHOOTING START POINT 3: PAGE-BY-PAGE PROGRESS
-                    print(f"DEBUG: Attempting to extract page {i+1}...")
-                    page_text = reader.pages[i].extract_text()
-                    text += (page_text + "\n") if page_text else ""
-        except Exception as e:
-            # print(f"Error reading .pdf {filepath}: {e}")
-            # status_label.config(text=f"Error reading .pdf: {os.path.basename(filepath)}")
-            print(f"ERROR: Exception in extract_text_from_pdf: {e}")
-            return ""
-        return text
-    def get_alphanumeric_ratio(text_segment):
-        if not text_segment: return 0.0
-        alphanumeric_chars = sum(1 for char in text_segment if char.isalnum())
-        return alphanumeric_chars / len(text_segment) if len(text_segment) > 0 else 0.0
-    def is_sentence_or_long_sequence(text_segment, min_words_general_sequence=6, min_words_punctuated_sentence=2):
-        stripped_segment = text_segment.strip();
-        if not stripped_segment: return False
-        words = stripped_segment.split(); word_count = len(words)
-        if stripped_segment.endswith(('.', '!', '?')) and word_count >= min_words_punctuated_sentence: return True
-        if word_count >= min_words_general_sequence: return True
-        return False
-    def split_concatenated_token(token):
-        if not token: return []
-        s1 = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", token)
-        s2 = re.sub(r"([A-Z]+)([A-Z][a-z])", r"\1 \2", s1)
-        s3 = re.sub(r"([a-zA-Z])(\d)", r"\1 \2", s2)
-        s4 = re.sub(r"(\d)([a-zA-Z])", r"\1 \2", s3)
-        return [word for word in s4.split(' ') if word]
-    def is_code_like_segment(segment_text, words_in_segment,
-                             min_keywords, min_symbols, min_words_check, symbol_density_thresh,
-                             symbol_mode, custom_symbols):
-        if len(words_in_segment) < min_words_check: return False
-        
-        active_symbol_set = CODE_SYMBOLS_SET
-        if symbol_mode == "only":
-            active_symbol_set = set(custom_symbols)
-        elif symbol_mode == "except":
-            active_symbol_set = CODE_SYMBOLS_SET - set(custom_symbols)
-        
-        keyword_hits = sum(1 for word in words_in_segment if word in CODE_KEYWORDS_LIST or word.lower() in CODE_KEYWORDS_LIST)
-        segment_len = len(segment_text)
-        if segment_len == 0: return False
-        symbol_hits = sum(1 for char in segment_text if char in active_symbol_set)
-        current_symbol_density = symbol_hits / segment_len if segment_len > 0 else 0
-        cond1 = (keyword_hits >= min_keywords and symbol_hits >= min_symbols)
-        cond2 = (current_symbol_density > symbol_density_thresh)
-        cond3 = (symbol_hits > (min_symbols * 2.5) and keyword_hits >= max(0, min_keywords // 2) )
-        if cond1 or cond2 or cond3: return True
-        return False
-    def is_number_heavy_segment(segment_text, words_in_segment,
-                                ratio_thresh, min_digits_for_ratio,
-                                max_consecutive, min_words_exempt):
-        if min_words_exempt > 0 and len(words_in_segment) >= min_words_exempt:
-            return False
-        segment_len = len(segment_text)
-        if segment_len == 0: return False
-        if max_consecutive > 0:
-            if re.search(r'\d{' + str(max_consecutive) + r',}', segment_text):
-                return True
-        if ratio_thresh > 0:
-            digit_count = sum(1 for char in segment_text if char.isdigit())
-            if digit_count >= min_digits_for_ratio:
-                digit_ratio = digit_count / segment_len
-                if digit_ratio > ratio_thresh:
-                    return True
-        return False
-    def is_valid_paragraph(para_text, min_sentences, min_words, min_avg_len, max_avg_len):
-        """
-        New helper to check if a paragraph meets structural criteria.
-        """
-        # A simple way to count sentences is by splitting by standard terminators
-        sentences = re.split(r'[.!?]+', para_text)
-        sentences = [s.strip() for s in sentences if s.strip()] # Filter out empty strings
-        num_sentences = len(sentences)
-        if num_sentences < min_sentences:
-            return False
-        words_in_para = para_text.split()
-        num_words = len(words_in_para)
-        if num_words < min_words:
-            return False
-        if num_sentences > 0:
-            avg_sentence_len = num_words / num_sentences
-            if avg_sentence_len < min_avg_len or avg_sentence_len > max_avg_len:
-                return False
-        return True
-    def process_text(full_text, params):
-        extracted_content = []
-        if not full_text or not full_text.strip(): return ""
-        
-        # --- STAGE 0: HTML Stripping (if enabled) ---
-        html_mode = params['html_stripping_mode_var']
-        if html_mode == "strip_tags":
-            # Surgically remove tags, keep content
-            processed_full_text = re.sub(r'<[^>]+>', ' ', full_text) # Replace tag with space
-            processed_full_text = re.sub(r'\s+', ' ', processed_full_text).strip() # Normalize spaces
-        elif html_mode == "discard_segments":
-            # Pre-split by newline, then filter
-            lines = full_text.splitlines()
-            processed_full_text = "\n".join([line for line in lines if not re.search(r'<[^>]+>', line)])
-        else: # Mode is "off"
-            processed_full_text = full_text
-        
-        # --- STAGE 1: Paragraph Segmentation ---
-        paragraphs = re.split(r'\n\s*\n+', processed_full_text.strip())
-        
-        segments_for_filtering = []
-        for para_text in paragraphs:
-            para_text_stripped = para_text.strip()
-            if not para_text_stripped: continue
-            if params['para_filter_enabled_var']:
-                if not is_valid_paragraph(para_text_stripped,
-                                         params['para_min_sentences_var'], params['para_min_words_var'],
-                                         params['para_min_avg_len_var'], params['para_max_avg_len_var']):
-                    continue # Discard this entire paragraph
-            sentence_candidates = re.split(r'(?<=[.!?])\s+(?=[A-Z"\'\(\[\d“‘\u2022\u2023\u25E6\u2043\u2219*+-])|(?<=[.!?])\s*$', para_text_stripped)
-            for s_candidate in sentence_candidates:
-                s_candidate_stripped = s_candidate.strip()
-                if not s_candidate_stripped: continue
-                split_by_newline_further = False
-                if len(sentence_candidates) == 1 and "\n" in s_candidate_stripped:
-                    split_by_newline_further = True
-                elif len(s_candidate_stripped) > params['max_segment_len_var'] and "\n" in s_candidate_stripped:
-                    split_by_newline_further = True
-                if split_by_newline_further:
-                    for line in s_candidate_stripped.splitlines():
-                        if line.strip(): segments_for_filtering.append(line.strip())
-                else:
-                    segments_for_filtering.append(s_candidate_stripped)
-        
-        if not segments_for_filtering and processed_full_text.strip():
-            segments_for_filtering = [line.strip() for line in processed_full_text.splitlines() if line.strip()]
-        compiled_regex = None
-        if params['custom_regex_enabled_var'] and params['custom_regex_pattern_var']:
-            try:
-                flags = 0 if params['custom_regex_case_sensitive_var'] else re.IGNORECASE
-                compiled_regex = re.compile(params['custom_regex_pattern_var'], flags)
-            except re.error as e:
-                # print(f"ERROR: Invalid custom regex: '{params['custom_regex_pattern_var']}' - {e}")
-                # status_label.config(text=f"Error: Invalid custom regex pattern!")
-                pass
-    
-        final_segments_before_regex = []
-        for segment_text in segments_for_filtering:
-            current_segment_to_check = segment_text
-            words_in_segment_original = current_segment_to_check.split(' ')
-            if params['remove_code_blocks_var']:
-                if is_code_like_segment(current_segment_to_check, words_in_segment_original,
-                                         params['min_code_keywords_var'], params['min_code_symbols_var'],
-                                         params['min_words_code_check_var'], params['code_symbol_density_var'],
-                                         params['code_symbol_mode_var'], params['code_custom_symbols_var']):
-                    continue
-            if params['remove_number_heavy_var']:
-                if is_number_heavy_segment(current_segment_to_check, words_in_segment_original,
-                                           params['number_ratio_threshold_var'], params['min_digits_for_ratio_check_var'],
-                                           params['max_consecutive_digits_var'], params['min_words_to_exempt_digits_var']):
-                    continue
-            if params['alphanum_filter_enabled_var']:
-                passes_alnum_filter = True
-                segment_len = len(current_segment_to_check)
-                if segment_len == 0: passes_alnum_filter = False
-                elif segment_len < params['alnum_min_len_for_ratio_var']:
-                    num_alnum_chars_short_seg = sum(1 for char in current_segment_to_check if char.isalnum())
-                    if num_alnum_chars_short_seg == 0: passes_alnum_filter = False
-                else:
-                    num_alnum_chars_long_seg = sum(1 for char in current_segment_to_check if char.isalnum())
-                    ratio = num_alnum_chars_long_seg / segment_len if segment_len > 0 else 0.0
-                    if ratio < params['alphanum_threshold_var']:
-                        if num_alnum_chars_long_seg < params['alnum_abs_count_fallback_var']: passes_alnum_filter = False
-                if not passes_alnum_filter: continue
-            if not is_sentence_or_long_sequence(current_segment_to_check, params['min_words_general_var'], params['min_words_sentence_var']):
-                continue
-            processed_words_for_segment = []
-            for word_token in words_in_segment_original:
-                token_processed_by_concat = False
-                if len(word_token) >= params['min_len_concat_check_var']:
-                    sub_words = split_concatenated_token(word_token)
-                    if len(sub_words) >= params['min_sub_words_replace_var']:
-                        if params['remove_concat_entirely_var']: token_processed_by_concat = True
-                        else: processed_words_for_segment.append(f"{sub_words[0]}...{sub_words[-1]}"); token_processed_by_concat = True
-                if not token_processed_by_concat: processed_words_for_segment.append(word_token)
-            modified_segment = ' '.join(processed_words_for_segment)
-            if params['remove_symbol_enclosed_var']:
-                max_sym = max(1, params['max_symbols_around_var'])
-                symbol_pattern = r'(?<!\w)\W{1,' + str(max_sym) + r'}\w+\W{1,' + str(max_sym) + r'}(?!\w)'
-                modified_segment = re.sub(symbol_pattern, '', modified_segment)
-                modified_segment = ' '.join(modified_segment.split())
-            if modified_segment.strip(): final_segments_before_regex.append(modified_segment)
-    
-        if params['custom_regex_enabled_var'] and compiled_regex:
-            output_after_regex = []
-            for segment in final_segments_before_regex:
-                if params['custom_regex_mode_var'] == "remove_matches":
-                    processed_segment = compiled_regex.sub('', segment).strip()
-                    if processed_segment: output_after_regex.append(processed_segment)
-                elif params['custom_regex_mode_var'] == "keep_matches":
-                    if compiled_regex.search(segment): output_after_regex.append(segment)
-            extracted_content = output_after_regex
-        else:
-            extracted_content = final_segments_before_regex
-        return "\n\n".join(extracted_content)
-
-    def extract_and_format_urls(text_content):
-        if not text_content: return "", []
-        # This pattern now better handles trailing punctuation and includes common TLDs
-        url_pattern = re.compile(r'(?:(?:https?|ftp):\/\/|www\.)(?:(?:[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?\.)+[a-zA-Z]{2,12}|localhost|\d{1,3}\.
-
-\d{1,3}\.\d{1,3}\.\d{1,3})(?::\d+)?(?:[/?#][^\s"<>()\[\]]*|\b)', re.IGNORECASE)
-        found_urls_raw = []
-        for match in url_pattern.finditer(text_content):
-            url = match.group(0)
-            # Remove trailing punctuation that might be part of the sentence, not the URL
-            cleaned_url = re.sub(r'[.,;!?"\')\]>]$', '', url)
-            # Handle cases like 'word(url)'
-            cleaned_url = re.sub(r'\(.*?\)', '', cleaned_url)
-            # Deduplicate with normalization
-            found_urls_raw.append(cleaned_url)
-
-        if not found_urls_raw: return "", []
-        
-        normalized_for_dedupe = {}
-        for url in found_urls_raw:
-            u_stripped = url.strip().rstrip('/')
-            u_lower_key = u_stripped.lower()
-            if u_lower_key.startswith('www.') and not (u_lower_key.startswith('http://') or u_lower_key.startswith('https://')):
-                u_display = 'http://' + u_stripped
-                u_norm_key = 'http://' + u_lower_key
-            else:
-                u_display = u_stripped
-                u_norm_key = u_lower_key
-            if u_norm_key not in normalized_for_dedupe:
-                normalized_for_dedupe[u_norm_key] = u_display
-                
-        unique_display_urls = sorted(list(normalized_for_dedupe.values()), key=lambda x: (x.lower(), x))
-        
-        if unique_display_urls:
-            url_list_string = "\n\n--- Detected URLs ---\n" + "\n".join(unique_display_urls)
-            return url_list_string, unique_display_urls
-        return "", []
-
+def start_consolidated_writer(params):
+    """The writer that builds the consolidated file for a new batch, or None if it can't be started."""
+    consolidated_filename = params['consolidated_output_filename_var'].strip()
+    if not consolidated_filename:
+        status_label.config(text="Error: Consolidated filename cannot be empty.")
+        return None
+    near_duplicates = None
+    if params['near_duplicate_mode_var'] in ('drop', 'flag'):
+        near_duplicates = NearDuplicateIndex(params['near_duplicate_threshold_var'])
     try:
-        filename_base, extension_raw = os.path.splitext(filepath)
-        extension = extension_raw.lower()
-        
-        # --- TROUBLESHOOTING START POINT 4: CONFIRMING EXTENSION
-        print(f"DEBUG: Identified file extension as '{extension}'")
-        
-        raw_full_text = ""
-        
-        pages_to_process = params['pages_to_process_var']
-        
-        # Determine which extractor to use
-        if extension == '.docx':
-            raw_full_text = extract_text_from_docx(filepath)
-        elif extension == '.pdf':
-            raw_full_text = extract_text_from_pdf(filepath, pages_to_process)
-        elif extension == '.txt' or extension in {ext.strip().lower() for ext in params['custom_file_extensions_var'].split(',') if ext.strip
-
-().startswith('.')}:
-            raw_full_text = extract_text_from_txt(filepath)
-        elif {ext.strip().lower() for ext in params['include_extensions_var'].split(',')} and extension in {ext.strip().lower() for ext in params
-
-['include_extensions_var'].split(',')}:
-            raw_full_text = extract_text_from_txt(filepath)
-        elif params['file_processing_mode_var'] == "all_files":
-            raw_full_text = extract_text_from_txt(filepath)
-        else:
-            result_queue.put(('skipped_unknown', f"Skipped (unknown extension '{extension}'): {os.path.basename(filepath)}."))
-            return
+        return ConsolidatedWriter(os.path.join(os.getcwd(), consolidated_filename), near_duplicates, params['near_duplicate_mode_var'],
+                                  params['consolidated_shard_mb_var'] * 1024 * 1024, params['consolidated_shard_files_var'],
+                                  params['consolidated_compression_var'], params['output_format_var'])
+    except Exception as e:
+        status_label.config(text=f"Error creating consolidated file: {e}")
+        return None
 
-        if not raw_full_text and os.path.getsize(filepath) > 0:
-            result_queue.put(('error', f"No text could be extracted from {os.path.basename(filepath)}. Check file integrity or type."))
-            return
-        
-        formatted_urls_from_raw = ""
-        if params['extract_urls_enabled_var'] == 1 and raw_full_text is not None :
-            formatted_urls_from_raw, _ = extract_and_format_urls(raw_full_text)
-        
-        processed_text_content = process_text(raw_full_text if raw_full_text is not None else "", params)
-                                             
-        final_output_data = processed_text_content
-        if not final_output_data.strip() and formatted_urls_from_raw:
-            final_output_data = "<No main content passed filters>" + formatted_urls_from_raw
-        elif final_output_data.strip() and formatted_urls_from_raw:
-            final_output_data += formatted_urls_from_raw
-        
-        if not final_output_data.strip():
-            result_queue.put(('skipped_empty', f"No content passed filters or URLs found for {os.path.basename(filepath)}."))
-            return
-            
-        result_queue.put(('success', final_output_data))
-    
+def finish_consolidated_writer(consolidated):
+    """Writes out the rest of the batch and puts the consolidated file in place."""
+    try:
+        consolidated.close()
     except Exception as e:
-        result_queue.put(('error', f"An unexpected error occurred during processing: {e}"))
-        print(f"ERROR: Exception in worker process for {filepath}: {traceback.format_exc()}")
-        
-# MODIFIED PROCESS_FILE FUNCTION
-def process_file(filepath):
-    global status_label
-    if not os.path.exists(filepath):
-        status_label.config(text=f"Error: File not found {filepath}"); return
-    
-    filename_base, extension_raw = os.path.splitext(filepath)
-    extension = extension_raw.lower()
-    raw_ignore_ext_str = ignore_extensions_var.get()
-    parsed_ignore_extensions = {ext.strip().lower() for ext in raw_ignore_ext_str.split(',') if ext.strip().startswith('.')}
-    if extension in parsed_ignore_extensions:
-        status_label.config(text=f"Skipped (ignored ext): {os.path.basename(filepath)}"); return
-    
-    status_label.config(text=f"Processing: {os.path.basename(filepath)}..."); root.update_idletasks()
-    
-    # Pass all settings to the worker process
-    params = {var_name: globals()[var_name].get() for var_name in SETTINGS_CONFIG.keys()}
-    
-    result_queue = multiprocessing.Queue()
-    worker_process = multiprocessing.Process(target=_process_file_in_process, args=(filepath, params, result_queue))
-    worker_process.start()
-    worker_process.join(timeout=file_processing_timeout_var.get())
-    
-    # --- FIXED CODE BLOCK ---
-    if worker_process.is_alive():
-        worker_process.terminate()
-        # Ensure the process is fully terminated and its resources are cleaned up.
-        worker_process.join() 
-        result_queue.close()
-        result_queue.join_thread()
-        status_label.config(text=f"Error: Processing timed out for {os.path.basename(filepath)}.")
+        print(f"ERROR: Failed to write consolidated file: {e}")
+        status_label.config(text=f"Error writing consolidated file: {e}")
         return
-    # --- END OF FIXED CODE BLOCK ---
-        
-    try:
-        status, result = result_queue.get_nowait()
-    except queue.Empty:
-        status_label.config(text=f"Error: Worker process for {os.path.basename(filepath)} finished but returned no result.")
+    finally: # Including the outputs a failed writer never wrote
+        for filename, _, message in consolidated.errors:
+            print(f"ERROR: Failed to append {os.path.basename(filename)} to consolidated file: {message}")
+    if consolidated.near_duplicates is not None: print(f"INFO: {consolidated.near_duplicates.summary()}.")
+    if consolidated.sharded: print(f"INFO: {consolidated.summary()}.")
+
+# Long-lived worker pool shared by every batch (replaces one Process + Queue per file)
+def get_worker_pool():
+    """Returns the warm worker pool, (re)creating it if the worker count setting changed."""
+    global g_worker_pool
+    num_workers = resolve_worker_count(worker_count_var.get())
+    if g_worker_pool is None or g_worker_pool.num_workers != num_workers:
+        if g_worker_pool is not None: g_worker_pool.shutdown()
+        g_worker_pool = WorkerPool(extract_file, num_workers)
+    return g_worker_pool
+
+def _check_input_file(filepath, router):
+    if not input_exists(filepath):
+        status_label.config(text=f"Error: File not found {filepath}"); return False
+    if router.is_ignored(filepath):
+        status_label.config(text=f"Skipped (ignored ext): {os.path.basename(filepath)}"); return False
+    if router.route(filepath) is None:
+        status_label.config(text=skipped_unknown_result(filepath)[1]); return False
+    return True
+
+def iter_dropped_files(paths):
+    """Lazily expands dropped/listed files and folders using the folder walking settings."""
+    on_error = lambda path, e: print(f"WARNING: Cannot read {path}: {e}")
+    return iter_input_files(paths, include_hidden_files_var.get() == 1, follow_symlinks_var.get() == 1, on_error,
+                            read_archives_var.get() == 1)
+
+def _handle_worker_result(filepath, status, result, params, consolidated=None, seq=None):
+    if consolidated is not None and status not in ('success', 'partial'):
+        consolidated.put(seq, filepath, None) # Nothing to write, but later files mustn't wait for it
+    if status == 'timeout':
+        status_label.config(text=f"Error: Processing timed out for {os.path.basename(filepath)}.")
         return
-
     if status == 'error':
         status_label.config(text=f"Error processing {os.path.basename(filepath)}: {result}")
         return
     elif status == 'skipped_unknown' or status == 'skipped_empty':
         status_label.config(text=result)
-        return
+        return status == 'skipped_empty'
 
-    # At this point, status must be 'success'
+    # At this point, status must be 'success' or 'partial'
     final_output_data = result
 
-    user_suffix = custom_output_suffix_var.get().strip()
-    actual_suffix = user_suffix if user_suffix else DEFAULT_OUTPUT_FILE_SUFFIX
-    output_filepath = filename_base + actual_suffix + ".txt"
+    output_filepath = output_path_for(filepath, params)
 
+    # 'partial' is the salvaged output of a file that timed out
     try:
-        if consolidate_output_enabled_var.get() == 0:
-            with open(output_filepath, 'w', encoding='utf-8') as f_out: f_out.write(final_output_data)
-            status_label.config(text=f"Successfully processed: {os.path.basename(filepath)}\nSaved to: {os.path.basename(output_filepath)}")
+        if consolidated is None:
+            save_output(final_output_data, output_filepath)
+            if status == 'partial':
+                status_label.config(text=f"Error: Processing timed out for {os.path.basename(filepath)}.\nPartial output saved to: {os.path.basename(output_filepath)}")
+            else:
+                status_label.config(text=f"Successfully processed: {os.path.basename(filepath)}\nSaved to: {os.path.basename(output_filepath)}")
         else:
-            append_to_consolidated(filepath, final_output_data)
-            status_label.config(text=f"Appended output from: {os.path.basename(filepath)} to consolidated file.")
+            consolidated.put(seq, filepath, final_output_data, status) # Written in input order
+            status_label.config(text=f"Appended {'partial ' if status == 'partial' else ''}output from: {os.path.basename(filepath)} to consolidated file.")
     except Exception as e:
         print(f"Error writing output {output_filepath}: {e}")
         status_label.config(text=f"Error writing output for {os.path.basename(filepath)}: {e}")
+        return False
+    return status == 'success' # The file is done; it only needs redoing if it or the settings change
+
+def process_files(filepaths):
+    """Runs a batch of files through the warm worker pool, each under the file processing timeout."""
+    # Pass all settings to the worker processes
+    params = {var_name: globals()[var_name].get() for var_name in SETTINGS_CONFIG.keys()}
+    router = get_extension_router(params)
+    # Outputs of this batch, so a folder walk that is still running doesn't pick them up as inputs
+    # (the consolidated output, when there is one, is recognized by `consolidated.owns`)
+    produced = set()
+    consolidated = None
+    if params['consolidate_output_enabled_var'] == 1:
+        consolidated = start_consolidated_writer(params)
+        if consolidated is None: return
+    manifest = None
+    if params['skip_unchanged_files_var'] == 1 and params['consolidate_output_enabled_var'] == 0:
+        manifest, settings_key = BatchManifest(MANIFEST_FILENAME), settings_hash(params)
+    # Task id -> (filepath, .part path, place in the consolidated file, stat for the manifest); one per dispatch
+    in_flight, stream_paths = {}, StreamPaths(params)
+    def tasks():
+        for task_id, filepath in enumerate(filepaths):
+            if consolidated is not None and consolidated.failure is not None: return # Nothing more can be written
+            if os.path.abspath(filepath) in produced or (consolidated is not None and consolidated.owns(filepath)): continue
+            if _check_input_file(filepath, router):
+                st = None
+                if manifest is not None:
+                    st = input_stat(filepath)
+                    if manifest.is_unchanged(filepath, st, settings_key):
+                        status_label.config(text=f"Skipped (unchanged): {os.path.basename(filepath)}"); continue
+                status_label.config(text=f"Processing: {os.path.basename(filepath)}..."); root.update_idletasks()
+                stream_path = stream_paths.claim(filepath)
+                produced.add(os.path.abspath(stream_path))
+                in_flight[task_id] = (filepath, stream_path, consolidated.reserve() if consolidated is not None else None, st)
+                yield task_id, (filepath, params, stream_path, 'auto')
+    try:
+        timeout_val = file_processing_timeout_var.get()
+        for task_id, status, result in run_sharded(get_worker_pool(), tasks(), timeout=timeout_val):
+            filepath, stream_path, seq, st = in_flight.pop(task_id)
+            if status == 'timeout':
+                partial = salvage_stream_output(filepath, params, f"processing timed out after {timeout_val}s", stream_path)
+                if partial is not None: status, result = 'partial', partial
+            finished = _handle_worker_result(filepath, status, result, params, consolidated, seq)
+            produced.add(os.path.abspath(output_path_for(filepath, params)))
+            if finished and st is not None:
+                manifest.record(filepath, st, settings_key, output_path_for(filepath, params) if status == 'success' else None)
+            root.update_idletasks()
+    finally:
+        if manifest is not None: manifest.save()
+        if consolidated is not None: finish_consolidated_writer(consolidated)
+
+def process_file(filepath):
+    process_files([filepath])
+
+def load_gui_libraries():
+    global tk, ttk, filedialog, Label, Frame, IntVar, BooleanVar, DoubleVar, Scale, Entry, Checkbutton, Spinbox, Button, Text, Scrollbar, \
+        PanedWindow, Radiobutton, SUNKEN, W, X, Y, BOTTOM, LEFT, TOP, BOTH, HORIZONTAL, RIGHT, NW, DISABLED, NORMAL, END, RAISED, VERTICAL, StringVar
+    global input_exists, input_stat, iter_input_files, MANIFEST_FILENAME, BatchManifest, settings_hash, \
+        WorkerPool, resolve_worker_count, run_sharded, NearDuplicateIndex, ConsolidatedWriter
+    global DND_AVAILABLE, TkinterDnD, DND_FILES, _IMPORTS_DONE
+    import tkinter as tk
+    from tkinter import ttk
+    from tkinter import (Label, Frame, IntVar, BooleanVar, DoubleVar, Scale, Entry, Checkbutton, Spinbox, Button, Text, Scrollbar, PanedWindow, Radiobutton,
+                         SUNKEN, W, X, Y, BOTTOM, LEFT, TOP, BOTH, HORIZONTAL, RIGHT, NW, DISABLED, NORMAL, END, RAISED, VERTICAL, StringVar)
+    import tkinter.filedialog as filedialog
+    from text_stripper_archives import input_exists, input_stat
+    from text_stripper_inputs import iter_input_files
+    from text_stripper_manifest import MANIFEST_FILENAME, BatchManifest, settings_hash
+    from text_stripper_pool import WorkerPool, resolve_worker_count
+    from text_stripper_shards import run_sharded
+    from text_stripper_neardup import NearDuplicateIndex
+    from text_stripper_consolidated import ConsolidatedWriter
+    try:
+        from tkinterdnd2 import TkinterDnD, DND_FILES
+        print("INFO: tkinterdnd2 imported successfully.")
+        DND_AVAILABLE = True
+    except ImportError:
+        print("WARNING: tkinterdnd2 library not found. Drag and drop will be disabled.")
+        DND_AVAILABLE = False
+    _IMPORTS_DONE = time.perf_counter()
+
+def report_startup_time():
+    """Prints how long module imports and showing the first window took, warning if over budget."""
+    imports = _IMPORTS_DONE - _STARTUP_T0
+    first_window = time.perf_counter() - _STARTUP_T0
+    print(f"INFO: Startup: imports {imports:.2f}s, first window {first_window:.2f}s.")
+    if imports > STARTUP_BUDGET_IMPORTS or first_window > STARTUP_BUDGET_FIRST_WINDOW:
+        print(f"WARN: Startup is over budget ({STARTUP_BUDGET_IMPORTS}s imports, {STARTUP_BUDGET_FIRST_WINDOW}s first window).")
 
 # --- Filter Test Pad UI Population & Logic ---
 def populate_test_pad_ui(parent_frame):
@@ -1054,6 +719,7 @@ def process_pasted_text():
         g_test_pad_output_text.insert(tk.END, "Input text is empty."); g_test_pad_output_text.config(state=tk.DISABLED)
         return
     params = {var_name: globals()[var_name].get() for var_name in SETTINGS_CONFIG.keys()}
+    params['output_format_var'] = "text" # The pad previews the filters as text, whatever the files get
     processed_text_content = process_text(raw_input_text, params)
     
     final_display_output = processed_text_content if processed_text_content.strip() else "<No main content passed filters>"
@@ -1068,8 +734,6 @@ def drop_handler(event):
     filepaths_str = event.data
     if not filepaths_str: return
     
-    reset_consolidated_file()
-    
     paths = []
     if filepaths_str.startswith('{') and filepaths_str.endswith('}'):
         path_segments = re.findall(r'\{[^{}]*\}|\S+', filepaths_str)
@@ -1077,9 +741,9 @@ def drop_handler(event):
     elif '\n' in filepaths_str: paths = filepaths_str.splitlines()
     elif ' ' in filepaths_str and not os.path.exists(filepaths_str): paths = filepaths_str.split(' ')
     else: paths = [filepaths_str]
-    actual_files = [p.strip() for p in paths if os.path.isfile(p.strip())]
+    actual_files = [p.strip() for p in paths if os.path.exists(p.strip())]
     if not actual_files: status_label.config(text="Could not identify valid file(s) from drop."); return
-    for filepath in actual_files: process_file(filepath)
+    process_files(iter_dropped_files(actual_files))
 
 def process_file_list():
     global status_label
@@ -1090,8 +754,6 @@ def process_file_list():
     if not file_path:
         status_label.config(text="File selection canceled.")
         return
-        
-    reset_consolidated_file()
 
     status_label.config(text=f"Reading file list from {os.path.basename(file_path)}...")
     root.update_idletasks()
@@ -1104,20 +766,27 @@ def process_file_list():
     if not file_paths:
         status_label.config(text="File list is empty or invalid.")
         return
-    status_label.config(text=f"Processing {len(file_paths)} files from list...")
+    status_label.config(text=f"Processing {len(file_paths)} entries from list...")
     root.update_idletasks()
-    for path in file_paths:
-        process_file(path)
+    process_files(iter_dropped_files(file_paths))
     
-    status_label.config(text=f"Finished processing all files from list.")
+    status_label.config(text="Finished processing all files from list.")
 
 # --- Main Application Setup ---
 if __name__ == "__main__":
-    if DND_AVAILABLE: multiprocessing.freeze_support(); root = TkinterDnD.Tk()
-    else: root = tk.Tk()
+    if len(sys.argv) > 1 and sys.argv[1] in ('batch', 'bench'): # Headless modes, e.g. `text_stripper.py batch --jobs 16 docs/`
+        import text_stripper_cli
+        multiprocessing.freeze_support()
+        sys.exit(text_stripper_cli.main())
+    multiprocessing.freeze_support()
+    load_gui_libraries()
+    root = TkinterDnD.Tk() if DND_AVAILABLE else tk.Tk()
     root.title(f"File Text Extractor v{APP_VERSION}"); root.geometry("950x800")
     setup_variables(); load_app_settings()
-    def on_main_window_close(): save_app_settings(); root.destroy()
+    def on_main_window_close():
+        save_app_settings()
+        if g_worker_pool is not None: g_worker_pool.shutdown()
+        root.destroy()
     root.protocol("WM_DELETE_WINDOW", on_main_window_close)
     settings_container_frame = Frame(root, relief=SUNKEN, borderwidth=1); settings_container_frame.pack(side=TOP, fill=X, padx=7, pady=(7,0))
     Label(settings_container_frame, text="Filter Settings", font=('Helvetica', 12, 'bold')).pack(anchor=W, padx=5, pady=(5,2))
@@ -1134,9 +803,7 @@ if __name__ == "__main__":
     populate_settings_content(scrollable_settings_content_frame)
     test_pad_container_frame = Frame(root, relief=SUNKEN, borderwidth=1); test_pad_container_frame.pack(side=TOP, fill=BOTH, expand=True, padx=7, pady=7)
     populate_test_pad_ui(test_pad_container_frame)
-    file_processing_container_frame = Frame(root, relief=SUNKEN, borderwidth=1); file_processing_container_frame.pack(side=TOP, fill=X, padx=7, pady=
-
-(0,7))
+    file_processing_container_frame = Frame(root, relief=SUNKEN, borderwidth=1); file_processing_container_frame.pack(side=TOP, fill=X, padx=7, pady=(0,7))
     Label(file_processing_container_frame, text="Process Files", font=('Helvetica', 12, 'bold')).pack(anchor=W, padx=5, pady=(5,2))
     drop_target_label = Label(file_processing_container_frame,text="Supports any file - Drop here to process",bg="lightgrey",relief=SUNKEN,height=4)
     drop_target_label.pack(padx=10, pady=(0,10), fill=X, expand=False)
@@ -1152,4 +819,5 @@ if __name__ == "__main__":
     if not DND_AVAILABLE: initial_status_text += " (DND Disabled)"
     status_label = Label(root, text=initial_status_text, relief=SUNKEN, anchor=W)
     status_label.pack(side=BOTTOM, fill=X)
+    root.after_idle(report_startup_time)
     root.mainloop()
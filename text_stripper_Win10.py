@@ -1,76 +1,67 @@
-import tkinter as tk
-import customtkinter as ctk
-from tkinter import (PanedWindow, SUNKEN, RAISED, VERTICAL, BOTH, X, Y, RIGHT, LEFT, TOP, BOTTOM, W, NW, END, DISABLED, NORMAL)
-import tkinter.filedialog as filedialog
+import time
+_STARTUP_T0 = time.perf_counter() # Start of module import, for the startup time report
+
 import os
 import re
 import json
-import traceback
-from docx import Document
-import PyPDF2
 import multiprocessing
 import queue
 import threading
 from queue import Queue
-
-# The tkinterdnd2 library is compatible with customtkinter
-try:
-    from tkinterdnd2 import TkinterDnD, DND_FILES
-    DND_AVAILABLE = True
-    # Define a custom CTk class that inherits from the DND root
-    class CTkinterDnD(ctk.CTk, TkinterDnD.Tk):
-        def __init__(self, *args, **kwargs):
-            super().__init__(*args, **kwargs)
-            self.TkdndVersion = TkinterDnD._require(self)
-except ImportError:
-    print("WARNING: tkinterdnd2 library not found. Drag and drop will be disabled.")
-    DND_AVAILABLE = False
-    class CTkinterDnD(ctk.CTk): pass # Fallback class
-    DND_FILES = None
+from text_stripper_engine import (SETTINGS_FILENAME, DEFAULT_SETTINGS, process_text, extract_file,
+                                  get_extension_router, skipped_unknown_result, output_path_for,
+                                  StreamPaths, salvage_stream_output, save_output) # Workers import the engine anyway
+
+# tkinter, customtkinter and the batch modules only the GUI uses are loaded by load_gui_libraries():
+# worker processes started with 'spawn' re-import this module, and shouldn't pay for (or print
+# about) libraries they never use
+ctk, CTkinterDnD, DND_AVAILABLE, DND_FILES = None, None, False, None
+_IMPORTS_DONE = time.perf_counter() # Moved on by load_gui_libraries(), so the budget covers the GUI imports too
+STARTUP_BUDGET_IMPORTS = 0.5 # Seconds
+STARTUP_BUDGET_FIRST_WINDOW = 2.0
+
+def load_gui_libraries():
+    global tk, filedialog, PanedWindow, SUNKEN, RAISED, VERTICAL, BOTH, X, Y, RIGHT, LEFT, TOP, BOTTOM, W, NW, END, DISABLED, NORMAL
+    global input_exists, input_stat, iter_input_files, MANIFEST_FILENAME, BatchManifest, settings_hash, \
+        WorkerPool, resolve_worker_count, run_sharded, NearDuplicateIndex, ConsolidatedWriter
+    global ctk, CTkinterDnD, DND_AVAILABLE, DND_FILES, _IMPORTS_DONE
+    import tkinter as tk
+    from tkinter import (PanedWindow, SUNKEN, RAISED, VERTICAL, BOTH, X, Y, RIGHT, LEFT, TOP, BOTTOM, W, NW, END, DISABLED, NORMAL)
+    import tkinter.filedialog as filedialog
+    import customtkinter as ctk
+    from text_stripper_archives import input_exists, input_stat
+    from text_stripper_inputs import iter_input_files
+    from text_stripper_manifest import MANIFEST_FILENAME, BatchManifest, settings_hash
+    from text_stripper_pool import WorkerPool, resolve_worker_count
+    from text_stripper_shards import run_sharded
+    from text_stripper_neardup import NearDuplicateIndex
+    from text_stripper_consolidated import ConsolidatedWriter
+    # The tkinterdnd2 library is compatible with customtkinter
+    try:
+        from tkinterdnd2 import TkinterDnD, DND_FILES
+        DND_AVAILABLE = True
+        # Define a custom CTk class that inherits from the DND root
+        class CTkinterDnD(ctk.CTk, TkinterDnD.Tk):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.TkdndVersion = TkinterDnD._require(self)
+    except ImportError:
+        print("WARNING: tkinterdnd2 library not found. Drag and drop will be disabled.")
+        DND_AVAILABLE = False
+        class CTkinterDnD(ctk.CTk): pass # Fallback class
+    _IMPORTS_DONE = time.perf_counter()
+
+def report_startup_time():
+    """Logs how long module imports and showing the first window took, warning if over budget."""
+    imports = _IMPORTS_DONE - _STARTUP_T0
+    first_window = time.perf_counter() - _STARTUP_T0
+    log_message(f"Startup: imports {imports:.2f}s, first window {first_window:.2f}s.")
+    if imports > STARTUP_BUDGET_IMPORTS or first_window > STARTUP_BUDGET_FIRST_WINDOW:
+        log_message(f"Startup is over budget ({STARTUP_BUDGET_IMPORTS}s imports, {STARTUP_BUDGET_FIRST_WINDOW}s first window).", level='error')
 
 
 APP_VERSION = "1.8.0" # Added Stop Button
 
-# --- Default values ---
-DEFAULT_PRE_FILTER_ENABLED = 1
-DEFAULT_FILE_PROCESSING_TIMEOUT = 60
-DEFAULT_MIN_WORDS_GENERAL = 11; DEFAULT_MIN_WORDS_SENTENCE = 5
-DEFAULT_ALPHANUM_ENABLED = 1; DEFAULT_ALPHANUM_THRESHOLD = 0.75
-DEFAULT_ALPHANUM_MIN_LEN_FOR_RATIO = 5; DEFAULT_ALPHANUM_ABS_COUNT_FALLBACK = 15
-DEFAULT_MAX_SEGMENT_LEN_BEFORE_NEWLINE_SPLIT = 350
-DEFAULT_PARA_FILTER_ENABLED = 0; DEFAULT_PARA_MIN_SENTENCES = 2; DEFAULT_PARA_MIN_WORDS = 20; DEFAULT_PARA_MIN_AVG_LEN = 5; DEFAULT_PARA_MAX_AVG_LEN = 40
-DEFAULT_REMOVE_CODE_BLOCKS = 1; DEFAULT_MIN_CODE_KEYWORDS = 1; DEFAULT_MIN_CODE_SYMBOLS = 2; DEFAULT_MIN_WORDS_CODE_CHECK = 2; DEFAULT_CODE_SYMBOL_DENSITY = 0.20
-DEFAULT_REMOVE_CONCAT_ENTIRELY = 1; DEFAULT_MIN_LEN_CONCAT_CHECK = 18; DEFAULT_MIN_SUB_WORDS_REPLACE = 3
-DEFAULT_REMOVE_SYMBOL_ENCLOSED = 1; DEFAULT_MAX_SYMBOLS_AROUND = 3
-DEFAULT_CUSTOM_REGEX_ENABLED = 0; DEFAULT_CUSTOM_REGEX_PATTERN = ""; DEFAULT_CUSTOM_REGEX_MODE = "remove_matches"; DEFAULT_CUSTOM_REGEX_CASE_SENSITIVE = 0
-DEFAULT_CUSTOM_FILE_EXTENSIONS = ""
-DEFAULT_OUTPUT_FILE_SUFFIX = "_processed"
-DEFAULT_EXTRACT_URLS_ENABLED = 0
-DEFAULT_FILE_PROCESSING_MODE = "specified"
-DEFAULT_INCLUDE_EXTENSIONS = ""
-DEFAULT_IGNORE_EXTENSIONS = ".zip, .rar, .7z, .exe, .dll, .msi, .pkg, .dmg, .iso, .img, .jpg, .jpeg, .png, .gif, .bmp, .tiff, .webp, .mp3, .wav, .aac, .ogg, .mp4, .mov, .avi, .mkv, .webm"
-DEFAULT_REMOVE_NUMBER_HEAVY = 0; DEFAULT_NUMBER_RATIO_THRESHOLD = 0.5; DEFAULT_MIN_DIGITS_FOR_RATIO_CHECK = 5; DEFAULT_MAX_CONSECUTIVE_DIGITS = 8; DEFAULT_MIN_WORDS_TO_EXEMPT_DIGITS = 10
-DEFAULT_CODE_SYMBOL_MODE = "all"; DEFAULT_CODE_CUSTOM_SYMBOLS = ""
-DEFAULT_HTML_STRIPPING_MODE = "strip_tags"
-DEFAULT_CONSOLIDATE_OUTPUT = 0
-DEFAULT_CONSOLIDATED_OUTPUT_FILENAME = "consolidated_output.txt"
-DEFAULT_PAGES_TO_PROCESS = 0
-
-CODE_KEYWORDS_LIST = {
-    'var', 'let', 'const', 'function', 'return', 'this', 'class', 'constructor', 'new', 'Error', 'throw', 'if', 'else', 'for', 'while', 'switch', 'case',
-'break', 'continue', 'try', 'catch', 'finally', 'import', 'export', 'super', 'extends', 'async', 'await', 'yield', 'true', 'false', 'null', 'undefined',
-'typeof', 'instanceof', 'void', 'delete', 'prototype', 'static', 'get', 'set', 'document', 'window', 'JSON', 'Map', 'Promise', 'Object', 'Array',
-'String', 'Number', 'Boolean', 'Symbol', '=>', '...','require','module','exports','googletag','pubads','slot',
-'addEventListener','removeEventListener','querySelector','getElementById','getElementsByClassName',
-'createElement','appendChild','innerHTML','outerHTML','style','console','log','warn','info',
-'ajax','fetch','XMLHttpRequest','jQuery','angular','react','vue', 'webpack', 'chunk', 'props', 'state',
-    'div', 'span', 'p', 'a', 'img', 'ul', 'ol', 'li', 'table', 'tr', 'td', 'th', 'form', 'input', 'button', 'href', 'src', 'alt', 'class', 'id', 'rel',
-'target', 'type', 'value', 'placeholder', 'html', 'head', 'body', 'title', 'meta', 'link', 'script'
-}
-CODE_SYMBOLS_SET = {
-    '{', '}', '(', ')', '[', ']', ';', '=', '<', '>', '%', ':', '-', '+', '!', '#', '$', '&', '*', '|', '~', '`', '/', '\\', '@', '^', '_'
-}
-
 # --- Global Tkinter Variables ---
 pre_filter_enabled_var = None
 min_words_general_var, min_words_sentence_var = (None,) * 2
@@ -94,66 +85,32 @@ consolidate_output_enabled_var = None
 consolidated_output_filename_var = None
 pages_to_process_var = None
 file_processing_timeout_var = None
-
-SETTINGS_FILENAME = "text_extractor_settings.json"
-SETTINGS_CONFIG = {
-    'pre_filter_enabled_var': (tk.IntVar, DEFAULT_PRE_FILTER_ENABLED),
-    'html_stripping_mode_var': (tk.StringVar, DEFAULT_HTML_STRIPPING_MODE),
-    'min_words_general_var': (tk.IntVar, DEFAULT_MIN_WORDS_GENERAL),
-    'min_words_sentence_var': (tk.IntVar, DEFAULT_MIN_WORDS_SENTENCE),
-    'alphanum_filter_enabled_var': (tk.IntVar, DEFAULT_ALPHANUM_ENABLED),
-    'alphanum_threshold_var': (tk.DoubleVar, DEFAULT_ALPHANUM_THRESHOLD),
-    'alnum_min_len_for_ratio_var': (tk.IntVar, DEFAULT_ALPHANUM_MIN_LEN_FOR_RATIO),
-    'alnum_abs_count_fallback_var': (tk.IntVar, DEFAULT_ALPHANUM_ABS_COUNT_FALLBACK),
-    'max_segment_len_var': (tk.IntVar, DEFAULT_MAX_SEGMENT_LEN_BEFORE_NEWLINE_SPLIT),
-    'para_filter_enabled_var': (tk.IntVar, DEFAULT_PARA_FILTER_ENABLED),
-    'para_min_sentences_var': (tk.IntVar, DEFAULT_PARA_MIN_SENTENCES),
-    'para_min_words_var': (tk.IntVar, DEFAULT_PARA_MIN_WORDS),
-    'para_min_avg_len_var': (tk.IntVar, DEFAULT_PARA_MIN_AVG_LEN),
-    'para_max_avg_len_var': (tk.IntVar, DEFAULT_PARA_MAX_AVG_LEN),
-    'file_processing_mode_var': (tk.StringVar, DEFAULT_FILE_PROCESSING_MODE),
-    'custom_file_extensions_var': (tk.StringVar, DEFAULT_CUSTOM_FILE_EXTENSIONS),
-    'include_extensions_var': (tk.StringVar, DEFAULT_INCLUDE_EXTENSIONS),
-    'ignore_extensions_var': (tk.StringVar, DEFAULT_IGNORE_EXTENSIONS),
-    'custom_output_suffix_var': (tk.StringVar, DEFAULT_OUTPUT_FILE_SUFFIX),
-    'extract_urls_enabled_var': (tk.IntVar, DEFAULT_EXTRACT_URLS_ENABLED),
-    'remove_number_heavy_var': (tk.IntVar, DEFAULT_REMOVE_NUMBER_HEAVY),
-    'number_ratio_threshold_var': (tk.DoubleVar, DEFAULT_NUMBER_RATIO_THRESHOLD),
-    'min_digits_for_ratio_check_var': (tk.IntVar, DEFAULT_MIN_DIGITS_FOR_RATIO_CHECK),
-    'max_consecutive_digits_var': (tk.IntVar, DEFAULT_MAX_CONSECUTIVE_DIGITS),
-    'min_words_to_exempt_digits_var': (tk.IntVar, DEFAULT_MIN_WORDS_TO_EXEMPT_DIGITS),
-    'remove_code_blocks_var': (tk.IntVar, DEFAULT_REMOVE_CODE_BLOCKS),
-    'min_code_keywords_var': (tk.IntVar, DEFAULT_MIN_CODE_KEYWORDS),
-    'min_code_symbols_var': (tk.IntVar, DEFAULT_MIN_CODE_SYMBOLS),
-    'min_words_code_check_var': (tk.IntVar, DEFAULT_MIN_WORDS_CODE_CHECK),
-    'code_symbol_density_var': (tk.DoubleVar, DEFAULT_CODE_SYMBOL_DENSITY),
-    'code_symbol_mode_var': (tk.StringVar, DEFAULT_CODE_SYMBOL_MODE),
-    'code_custom_symbols_var': (tk.StringVar, DEFAULT_CODE_CUSTOM_SYMBOLS),
-    'remove_concat_entirely_var': (tk.IntVar, DEFAULT_REMOVE_CONCAT_ENTIRELY),
-    'min_len_concat_check_var': (tk.IntVar, DEFAULT_MIN_LEN_CONCAT_CHECK),
-    'min_sub_words_replace_var': (tk.IntVar, DEFAULT_MIN_SUB_WORDS_REPLACE),
-    'remove_symbol_enclosed_var': (tk.IntVar, DEFAULT_REMOVE_SYMBOL_ENCLOSED),
-    'max_symbols_around_var': (tk.IntVar, DEFAULT_MAX_SYMBOLS_AROUND),
-    'custom_regex_enabled_var': (tk.IntVar, DEFAULT_CUSTOM_REGEX_ENABLED),
-    'custom_regex_pattern_var': (tk.StringVar, DEFAULT_CUSTOM_REGEX_PATTERN),
-    'custom_regex_mode_var': (tk.StringVar, DEFAULT_CUSTOM_REGEX_MODE),
-    'custom_regex_case_sensitive_var': (tk.IntVar, DEFAULT_CUSTOM_REGEX_CASE_SENSITIVE),
-    'consolidate_output_enabled_var': (tk.IntVar, DEFAULT_CONSOLIDATE_OUTPUT),
-    'consolidated_output_filename_var': (tk.StringVar, DEFAULT_CONSOLIDATED_OUTPUT_FILENAME),
-    'pages_to_process_var': (tk.IntVar, DEFAULT_PAGES_TO_PROCESS),
-    'file_processing_timeout_var': (tk.IntVar, DEFAULT_FILE_PROCESSING_TIMEOUT),
-}
+worker_count_var = None
+include_hidden_files_var, follow_symlinks_var, skip_unchanged_files_var = (None,) * 3
+read_archives_var = None
+raw_cache_enabled_var, raw_cache_dir_var, raw_cache_max_mb_var = (None,) * 3
+stream_threshold_mb_var, pdf_shard_pages_var, numpy_scoring_var, segment_locations_var = (None,) * 4
+segment_memo_var, collapse_duplicate_segments_var = None, None
+adaptive_filter_order_var = None
+near_duplicate_mode_var, near_duplicate_threshold_var = None, None
+consolidated_shard_mb_var, consolidated_shard_files_var, consolidated_compression_var = (None,) * 3
+output_format_var = None
+
+_TK_VAR_TYPES = {int: 'IntVar', float: 'DoubleVar', str: 'StringVar'} # tkinter class names, it isn't imported yet
+SETTINGS_CONFIG = {var_name: (_TK_VAR_TYPES[type(default_value)], default_value) for var_name, default_value in DEFAULT_SETTINGS.items()}
 g_test_pad_input_text = None; g_test_pad_output_text = None
 g_processed_files_list = []
 g_message_queue = Queue()
 g_stop_event = threading.Event() # <<< CHANGE 1: The global stop flag
 g_stop_button = None
+g_worker_pool = None # Long-lived worker processes, created on first use
 status_log = None
 root = None
 
 
 def setup_variables():
-    for var_name, (var_type, default_value) in SETTINGS_CONFIG.items():
+    for var_name, (var_type_name, default_value) in SETTINGS_CONFIG.items():
+        var_type = getattr(tk, var_type_name)
         if globals().get(var_name) is None or not isinstance(globals().get(var_name), var_type):
             globals()[var_name] = var_type(value=default_value)
 def load_app_settings():
@@ -243,356 +200,140 @@ def log_message(message, level='status'):
     if root:
         root.update_idletasks()
 
-def get_alphanumeric_ratio(text_segment):
-    if not text_segment: return 0.0
-    alphanumeric_chars = sum(1 for char in text_segment if char.isalnum())
-    return alphanumeric_chars / len(text_segment) if len(text_segment) > 0 else 0.0
-def is_sentence_or_long_sequence(text_segment, min_words_general_sequence=6, min_words_punctuated_sentence=2):
-    stripped_segment = text_segment.strip();
-    if not stripped_segment: return False
-    words = stripped_segment.split(); word_count = len(words)
-    if stripped_segment.endswith(('.', '!', '?')) and word_count >= min_words_punctuated_sentence: return True
-    if word_count >= min_words_general_sequence: return True
-    return False
-def split_concatenated_token(token):
-    if not token: return []
-    s1 = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", token)
-    s2 = re.sub(r"([A-Z]+)([A-Z][a-z])", r"\1 \2", s1)
-    s3 = re.sub(r"([a-zA-Z])(\d)", r"\1 \2", s2)
-    s4 = re.sub(r"(\d)([a-zA-Z])", r"\1 \2", s3)
-    return [word for word in s4.split(' ') if word]
-def is_code_like_segment(segment_text, words_in_segment,
-                         min_keywords, min_symbols, min_words_check, symbol_density_thresh,
-                         symbol_mode, custom_symbols):
-    if len(words_in_segment) < min_words_check: return False
-    active_symbol_set = CODE_SYMBOLS_SET
-    if symbol_mode == "only":
-        active_symbol_set = set(custom_symbols)
-    elif symbol_mode == "except":
-        active_symbol_set = CODE_SYMBOLS_SET - set(custom_symbols)
-    keyword_hits = sum(1 for word in words_in_segment if word in CODE_KEYWORDS_LIST or word.lower() in CODE_KEYWORDS_LIST)
-    segment_len = len(segment_text)
-    if segment_len == 0: return False
-    symbol_hits = sum(1 for char in segment_text if char in active_symbol_set)
-    current_symbol_density = symbol_hits / segment_len if segment_len > 0 else 0
-    cond1 = (keyword_hits >= min_keywords and symbol_hits >= min_symbols)
-    cond2 = (current_symbol_density > symbol_density_thresh)
-    cond3 = (symbol_hits > (min_symbols * 2.5) and keyword_hits >= max(0, min_keywords // 2) )
-    if cond1 or cond2 or cond3: return True
-    return False
-def is_number_heavy_segment(segment_text, words_in_segment,
-                            ratio_thresh, min_digits_for_ratio,
-                            max_consecutive, min_words_exempt):
-    if min_words_exempt > 0 and len(words_in_segment) >= min_words_exempt:
-        return False
-    segment_len = len(segment_text)
-    if segment_len == 0: return False
-    if max_consecutive > 0:
-        if re.search(r'\d{' + str(max_consecutive) + r',}', segment_text):
-            return True
-    if ratio_thresh > 0:
-        digit_count = sum(1 for char in segment_text if char.isdigit())
-        if digit_count >= min_digits_for_ratio:
-            digit_ratio = digit_count / segment_len
-            if digit_ratio > ratio_thresh:
-                return True
-    return False
-def is_valid_paragraph(para_text, min_sentences, min_words, min_avg_len, max_avg_len):
-    sentences = re.split(r'[.!?]+', para_text)
-    sentences = [s.strip() for s in sentences if s.strip()]
-    num_sentences = len(sentences)
-    if num_sentences < min_sentences:
-        return False
-    words_in_para = para_text.split()
-    num_words = len(words_in_para)
-    if num_words < min_words:
-        return False
-    if num_sentences > 0:
-        avg_sentence_len = num_words / num_sentences
-        if avg_sentence_len < min_avg_len or avg_sentence_len > max_avg_len:
-            return False
-    return True
-def process_text(full_text, params):
-    if params.get('pre_filter_enabled_var', 1) == 0:
-        return full_text
-    if not full_text or not full_text.strip(): return ""
-    html_mode = params['html_stripping_mode_var']
-    if html_mode == "strip_tags":
-        processed_full_text = re.sub(r'<.*?>', ' ', full_text)
-        processed_full_text = re.sub(r'\s+', ' ', processed_full_text).strip()
-    elif html_mode == "discard_segments":
-        lines = full_text.splitlines()
-        processed_full_text = "\n".join([line for line in lines if not re.search(r'<[^>]+>', line)])
-    else:
-        processed_full_text = full_text
-    paragraphs = re.split(r'\n\s*\n+', processed_full_text.strip())
-    segments_for_filtering = []
-    for para_text in paragraphs:
-        para_text_stripped = para_text.strip()
-        if not para_text_stripped: continue
-        if params['para_filter_enabled_var']:
-            if not is_valid_paragraph(para_text_stripped,
-                                      params['para_min_sentences_var'], params['para_min_words_var'],
-                                      params['para_min_avg_len_var'], params['para_max_avg_len_var']):
-                continue
-        sentence_candidates = re.split(r'(?<=[.!?])\s+(?=[A-Z"\'\(\[\d“‘\u2022\u2023\u25E6\u2043\u2219*+-])|(?<=[.!?])\s*$', para_text_stripped)
-        for s_candidate in sentence_candidates:
-            s_candidate_stripped = s_candidate.strip()
-            if not s_candidate_stripped: continue
-            split_by_newline_further = False
-            if len(sentence_candidates) == 1 and "\n" in s_candidate_stripped:
-                split_by_newline_further = True
-            elif len(s_candidate_stripped) > params['max_segment_len_var'] and "\n" in s_candidate_stripped:
-                split_by_newline_further = True
-            if split_by_newline_further:
-                for line in s_candidate_stripped.splitlines():
-                    if line.strip(): segments_for_filtering.append(line.strip())
-            else:
-                segments_for_filtering.append(s_candidate_stripped)
-    if not segments_for_filtering and processed_full_text.strip():
-        segments_for_filtering = [line.strip() for line in processed_full_text.splitlines() if line.strip()]
-    compiled_regex = None
-    if params['custom_regex_enabled_var'] and params['custom_regex_pattern_var']:
-        try:
-            flags = 0 if params['custom_regex_case_sensitive_var'] else re.IGNORECASE
-            compiled_regex = re.compile(params['custom_regex_pattern_var'], flags)
-        except re.error: pass
-    final_segments_before_regex = []
-    for segment_text in segments_for_filtering:
-        current_segment_to_check = segment_text
-        words_in_segment_original = current_segment_to_check.split(' ')
-        if params['remove_code_blocks_var']:
-            if is_code_like_segment(current_segment_to_check, words_in_segment_original,
-                                    params['min_code_keywords_var'], params['min_code_symbols_var'],
-                                    params['min_words_code_check_var'], params['code_symbol_density_var'],
-                                    params['code_symbol_mode_var'], params['code_custom_symbols_var']):
-                continue
-        if params['remove_number_heavy_var']:
-            if is_number_heavy_segment(current_segment_to_check, words_in_segment_original,
-                                       params['number_ratio_threshold_var'], params['min_digits_for_ratio_check_var'],
-                                       params['max_consecutive_digits_var'], params['min_words_to_exempt_digits_var']):
-                continue
-        if params['alphanum_filter_enabled_var']:
-            passes_alnum_filter = True
-            segment_len = len(current_segment_to_check)
-            if segment_len == 0: passes_alnum_filter = False
-            elif segment_len < params['alnum_min_len_for_ratio_var']:
-                num_alnum_chars_short_seg = sum(1 for char in current_segment_to_check if char.isalnum())
-                if num_alnum_chars_short_seg == 0: passes_alnum_filter = False
-            else:
-                num_alnum_chars_long_seg = sum(1 for char in current_segment_to_check if char.isalnum())
-                ratio = num_alnum_chars_long_seg / segment_len if segment_len > 0 else 0.0
-                if ratio < params['alphanum_threshold_var']:
-                    if num_alnum_chars_long_seg < params['alnum_abs_count_fallback_var']: passes_alnum_filter = False
-            if not passes_alnum_filter: continue
-        if not is_sentence_or_long_sequence(current_segment_to_check, params['min_words_general_var'], params['min_words_sentence_var']):
-            continue
-        processed_words_for_segment = []
-        for word_token in words_in_segment_original:
-            token_processed_by_concat = False
-            if len(word_token) >= params['min_len_concat_check_var']:
-                sub_words = split_concatenated_token(word_token)
-                if len(sub_words) >= params['min_sub_words_replace_var']:
-                    if params['remove_concat_entirely_var']: token_processed_by_concat = True
-                    else: processed_words_for_segment.append(f"{sub_words[0]}...{sub_words[-1]}"); token_processed_by_concat = True
-            if not token_processed_by_concat: processed_words_for_segment.append(word_token)
-        modified_segment = ' '.join(processed_words_for_segment)
-        if params['remove_symbol_enclosed_var']:
-            max_sym = max(1, params['max_symbols_around_var'])
-            symbol_pattern = r'(?<!\w)\W{1,' + str(max_sym) + r'}\w+\W{1,' + str(max_sym) + r'}(?!\w)'
-            modified_segment = re.sub(symbol_pattern, '', modified_segment)
-            modified_segment = ' '.join(modified_segment.split())
-        if modified_segment.strip(): final_segments_before_regex.append(modified_segment)
-    if params['custom_regex_enabled_var'] and compiled_regex:
-        output_after_regex = []
-        for segment in final_segments_before_regex:
-            if params['custom_regex_mode_var'] == "remove_matches":
-                processed_segment = compiled_regex.sub('', segment).strip()
-                if processed_segment: output_after_regex.append(processed_segment)
-            elif params['custom_regex_mode_var'] == "keep_matches":
-                if compiled_regex.search(segment): output_after_regex.append(segment)
-        extracted_content = output_after_regex
-    else:
-        extracted_content = final_segments_before_regex
-    return "\n\n".join(extracted_content)
-
-
-def reset_consolidated_file():
-    if consolidate_output_enabled_var.get() == 1:
-        consolidated_filename = consolidated_output_filename_var.get().strip()
-        if not consolidated_filename:
-            g_message_queue.put(('error', "Consolidated filename cannot be empty."))
-            return
-        consolidated_output_path = os.path.join(os.getcwd(), consolidated_filename)
-        try:
-            with open(consolidated_output_path, 'w', encoding='utf-8') as outfile:
-                outfile.write("")
-        except Exception as e:
-            g_message_queue.put(('error', f"Error resetting consolidated file: {e}"))
-def append_to_consolidated(filename, content):
-    if consolidate_output_enabled_var.get() == 1:
-        consolidated_filename = consolidated_output_filename_var.get().strip()
-        if not consolidated_filename:
-            print("WARNING: Consolidated filename is empty. Skipping append.")
-            return
-        consolidated_output_path = os.path.join(os.getcwd(), consolidated_filename)
-        try:
-            with open(consolidated_output_path, 'a', encoding='utf-8') as outfile:
-                outfile.write(f"--- Start of file: {os.path.basename(filename)} ---\n\n")
-                outfile.write(content)
-                outfile.write(f"\n\n--- End of file: {os.path.basename(filename)} ---\n\n")
-        except Exception as e:
-            print(f"ERROR: Failed to append to consolidated file: {e}")
-def _process_file_in_process(filepath, params, result_queue):
-    def extract_text_from_txt(filepath):
-        try:
-            with open(filepath, 'r', encoding='utf-8', errors='ignore') as f: return f.read()
-        except Exception: return ""
-    def extract_text_from_docx(filepath):
-        try:
-            doc = Document(filepath); return '\n'.join([para.text for para in doc.paragraphs])
-        except Exception: return ""
-    def extract_text_from_pdf(filepath, pages_to_process):
-        text = ""
-        try:
-            with open(filepath, 'rb') as f:
-                reader = PyPDF2.PdfReader(f)
-                if reader.is_encrypted:
-                    try: reader.decrypt('')
-                    except: return ""
-                num_pages = len(reader.pages)
-                page_limit = pages_to_process if pages_to_process > 0 and pages_to_process < num_pages else num_pages
-                for i in range(page_limit):
-                    page_text = reader.pages[i].extract_text()
-                    text += (page_text + "\n") if page_text else ""
-        except Exception as e:
-            print(f"ERROR: Exception in extract_text_from_pdf: {e}")
-            return ""
-        return text
-    def extract_and_format_urls(text_content):
-        if not text_content: return "", []
-        url_pattern = re.compile(r'(?:(?:https?|ftp):\/\/|www\.)(?:(?:[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?\.)+[a-zA-Z]{2,12}|localhost|\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})(?::\d+)?(?:[/?#][^\s"<>()\[\]]*|\b)', re.IGNORECASE)
-        found_urls_raw = []
-        for match in url_pattern.finditer(text_content):
-            url = match.group(0)
-            cleaned_url = re.sub(r'[.,;!?"\')\]>]$', '', url)
-            cleaned_url = re.sub(r'\(.*?\)', '', cleaned_url)
-            found_urls_raw.append(cleaned_url)
-        if not found_urls_raw: return "", []
-        normalized_for_dedupe = {}
-        for url in found_urls_raw:
-            u_stripped = url.strip().rstrip('/')
-            u_lower_key = u_stripped.lower()
-            if u_lower_key.startswith('www.') and not (u_lower_key.startswith('http://') or u_lower_key.startswith('https://')):
-                u_display = 'http://' + u_stripped
-                u_norm_key = 'http://' + u_lower_key
-            else:
-                u_display = u_stripped
-                u_norm_key = u_lower_key
-            if u_norm_key not in normalized_for_dedupe:
-                normalized_for_dedupe[u_norm_key] = u_display
-        unique_display_urls = sorted(list(normalized_for_dedupe.values()), key=lambda x: (x.lower(), x))
-        if unique_display_urls:
-            url_list_string = "\n\n--- Detected URLs ---\n" + "\n".join(unique_display_urls)
-            return url_list_string, unique_display_urls
-        return "", []
+def start_consolidated_writer(params):
+    """The writer that builds the consolidated file for a new batch, or None if it can't be started."""
+    consolidated_filename = params['consolidated_output_filename_var'].strip()
+    if not consolidated_filename:
+        g_message_queue.put(('error', "Consolidated filename cannot be empty."))
+        return None
+    near_duplicates = None
+    if params['near_duplicate_mode_var'] in ('drop', 'flag'):
+        near_duplicates = NearDuplicateIndex(params['near_duplicate_threshold_var'])
     try:
-        _, extension_raw = os.path.splitext(filepath)
-        extension = extension_raw.lower()
-        raw_full_text = ""
-        pages_to_process = params['pages_to_process_var']
-        if extension == '.docx':
-            raw_full_text = extract_text_from_docx(filepath)
-        elif extension == '.pdf':
-            raw_full_text = extract_text_from_pdf(filepath, pages_to_process)
-        elif extension == '.txt' or extension in {ext.strip().lower() for ext in params['custom_file_extensions_var'].split(',') if ext.strip().startswith('.')}:
-            raw_full_text = extract_text_from_txt(filepath)
-        elif {ext.strip().lower() for ext in params['include_extensions_var'].split(',')} and extension in {ext.strip().lower() for ext in params['include_extensions_var'].split(',')}:
-            raw_full_text = extract_text_from_txt(filepath)
-        elif params['file_processing_mode_var'] == "all_files":
-            raw_full_text = extract_text_from_txt(filepath)
-        else:
-            result_queue.put(('skipped_unknown', f"Skipped (unknown extension '{extension}'): {os.path.basename(filepath)}."))
-            return
-        if not raw_full_text and os.path.getsize(filepath) > 0:
-            result_queue.put(('error', f"No text could be extracted from {os.path.basename(filepath)}. Check file integrity or type."))
-            return
-        formatted_urls_from_raw = ""
-        if params['extract_urls_enabled_var'] == 1 and raw_full_text is not None :
-            formatted_urls_from_raw, _ = extract_and_format_urls(raw_full_text)
-        processed_text_content = process_text(raw_full_text if raw_full_text is not None else "", params)
-        final_output_data = processed_text_content
-        if not final_output_data.strip() and formatted_urls_from_raw:
-            final_output_data = "<No main content passed filters>" + formatted_urls_from_raw
-        elif final_output_data.strip() and formatted_urls_from_raw:
-            final_output_data += formatted_urls_from_raw
-        if not final_output_data.strip():
-            result_queue.put(('skipped_empty', f"No content passed filters or URLs found for {os.path.basename(filepath)}."))
-            return
-        result_queue.put(('success', final_output_data))
+        return ConsolidatedWriter(os.path.join(os.getcwd(), consolidated_filename), near_duplicates, params['near_duplicate_mode_var'],
+                                  params['consolidated_shard_mb_var'] * 1024 * 1024, params['consolidated_shard_files_var'],
+                                  params['consolidated_compression_var'], params['output_format_var'])
     except Exception as e:
-        result_queue.put(('error', f"An unexpected error occurred during processing: {e}"))
-        print(f"ERROR: Exception in worker process for {filepath}: {traceback.format_exc()}")
-def _process_file_inner(filepath):
-    if not os.path.exists(filepath):
-        g_message_queue.put(('error', f"Error: File not found {filepath}"))
+        g_message_queue.put(('error', f"Error creating consolidated file: {e}"))
+        return None
+def finish_consolidated_writer(consolidated):
+    """Writes out the rest of the batch and puts the consolidated file in place."""
+    try:
+        consolidated.close()
+    except Exception as e:
+        g_message_queue.put(('error', f"Error writing consolidated file: {e}"))
         return
-    filename_base, extension_raw = os.path.splitext(filepath)
-    extension = extension_raw.lower()
-    raw_ignore_ext_str = ignore_extensions_var.get()
-    parsed_ignore_extensions = {ext.strip().lower() for ext in raw_ignore_ext_str.split(',') if ext.strip().startswith('.')}
-    if extension in parsed_ignore_extensions:
+    finally: # Including the outputs a failed writer never wrote
+        for filename, _, message in consolidated.errors:
+            g_message_queue.put(('error', f"Failed to append {os.path.basename(filename)} to consolidated file: {message}"))
+    if consolidated.near_duplicates is not None: g_message_queue.put(('status', consolidated.near_duplicates.summary() + "."))
+    if consolidated.sharded: g_message_queue.put(('status', consolidated.summary() + "."))
+def _check_input_file(filepath, router):
+    if not input_exists(filepath):
+        g_message_queue.put(('error', f"Error: File not found {filepath}"))
+        return False
+    if router.is_ignored(filepath):
         g_message_queue.put(('status', f"Skipped (ignored ext): {os.path.basename(filepath)}"))
-        return
-    params = {var_name: globals()[var_name].get() for var_name in SETTINGS_CONFIG.keys()}
-    result_queue = multiprocessing.Queue()
-    worker_process = multiprocessing.Process(target=_process_file_in_process, args=(filepath, params, result_queue))
-    worker_process.start()
-    timeout_val = file_processing_timeout_var.get()
-    status, result = None, None
-    try:
-        status, result = result_queue.get(timeout=timeout_val)
-    except queue.Empty:
+        return False
+    if router.route(filepath) is None:
+        g_message_queue.put(('status', skipped_unknown_result(filepath)[1]))
+        return False
+    return True
+def _handle_worker_result(filepath, status, result, params, consolidated=None, seq=None):
+    """Reports one file's result and writes its output. Runs on the processing thread, so it reads `params`, never Tk variables."""
+    if consolidated is not None and status not in ('success', 'partial'):
+        consolidated.put(seq, filepath, None) # Nothing to write, but later files mustn't wait for it
+    if status == 'timeout':
         g_message_queue.put(('error', f"Processing timed out for {os.path.basename(filepath)} (worker unresponsive)."))
-        if worker_process.is_alive():
-            worker_process.terminate()
-    finally:
-        worker_process.join()
-    if status is None:
         return
     if status == 'error':
         g_message_queue.put(('error', f"Error processing {os.path.basename(filepath)}: {result}"))
         return
     elif status == 'skipped_unknown' or status == 'skipped_empty':
         g_message_queue.put(('status', result))
-        return
+        return status == 'skipped_empty'
     final_output_data = result
-    user_suffix = custom_output_suffix_var.get().strip()
-    actual_suffix = user_suffix if user_suffix else DEFAULT_OUTPUT_FILE_SUFFIX
-    output_filepath = filename_base + actual_suffix + ".txt"
+    output_filepath = output_path_for(filepath, params)
+    # 'partial' is the salvaged output of a file that timed out
     try:
-        if consolidate_output_enabled_var.get() == 0:
-            with open(output_filepath, 'w', encoding='utf-8') as f_out: f_out.write(final_output_data)
-            g_message_queue.put(('status', f"Successfully processed: {os.path.basename(filepath)}\nSaved to: {os.path.basename(output_filepath)}"))
+        if consolidated is None:
+            save_output(final_output_data, output_filepath)
+            if status == 'partial':
+                g_message_queue.put(('error', f"Processing timed out for {os.path.basename(filepath)}; partial output saved to: {os.path.basename(output_filepath)}"))
+            else:
+                g_message_queue.put(('status', f"Successfully processed: {os.path.basename(filepath)}\nSaved to: {os.path.basename(output_filepath)}"))
         else:
-            append_to_consolidated(filepath, final_output_data)
-            g_message_queue.put(('status', f"Appended output from: {os.path.basename(filepath)} to consolidated file."))
+            consolidated.put(seq, filepath, final_output_data, status) # Written in input order
+            g_message_queue.put(('status', f"Appended {'partial ' if status == 'partial' else ''}output from: {os.path.basename(filepath)} to consolidated file."))
     except Exception as e:
         g_message_queue.put(('error', f"Error writing output for {os.path.basename(filepath)}: {e}"))
-def process_files_in_thread(filepaths):
+        return False
+    return status == 'success' # The file is done; it only needs redoing if it or the settings change
+def get_worker_pool(params):
+    """Returns the warm worker pool, (re)creating it if the worker count setting changed."""
+    global g_worker_pool
+    num_workers = resolve_worker_count(params['worker_count_var'])
+    if g_worker_pool is None or g_worker_pool.num_workers != num_workers:
+        if g_worker_pool is not None: g_worker_pool.shutdown()
+        g_worker_pool = WorkerPool(extract_file, num_workers)
+    return g_worker_pool
+def process_files_in_thread(filepaths, params):
+    """The batch behind the GUI, on its own thread. `params` is the settings snapshot taken on the Tk thread."""
     global g_stop_event
-    total_files = len(filepaths)
-    for i, filepath in enumerate(filepaths):
-        # <<< CHANGE 4a: Check the stop flag before processing each file
-        if g_stop_event.is_set():
-            break
-        
-        file_number = i + 1
-        g_message_queue.put(('status', f"Processing file {file_number} of {total_files}: {os.path.basename(filepath)}..."))
-        try:
-            _process_file_inner(filepath)
-        except Exception as e:
-            g_message_queue.put(('error', f"Critical error processing {os.path.basename(filepath)}: {e}"))
+    timeout_val = params['file_processing_timeout_var']
+    router = get_extension_router(params)
+    on_walk_error = lambda path, e: g_message_queue.put(('error', f"Cannot read {path}: {e}"))
+    # Folders are walked lazily, so the total isn't known until the walk is done
+    input_files = iter_input_files(filepaths, params['include_hidden_files_var'] == 1, params['follow_symlinks_var'] == 1, on_walk_error,
+                                  params['read_archives_var'] == 1)
+    # Outputs of this batch, so the folder walk doesn't pick them up as inputs
+    # (the consolidated output, when there is one, is recognized by `consolidated.owns`)
+    produced = set()
+    consolidated = None
+    if params['consolidate_output_enabled_var'] == 1:
+        consolidated = start_consolidated_writer(params)
+        if consolidated is None: return
+    manifest = None
+    if params['skip_unchanged_files_var'] == 1 and params['consolidate_output_enabled_var'] == 0:
+        manifest, settings_key = BatchManifest(MANIFEST_FILENAME), settings_hash(params)
+    # Task id -> (filepath, .part path, place in the consolidated file, stat for the manifest); one per dispatch
+    in_flight, stream_paths = {}, StreamPaths(params)
+    total_files = 0
+    def tasks():
+        nonlocal total_files
+        for task_id, filepath in enumerate(input_files):
+            if consolidated is not None and consolidated.failure is not None: return # Nothing more can be written
+            if os.path.abspath(filepath) in produced or (consolidated is not None and consolidated.owns(filepath)): continue
+            total_files += 1
+            if not _check_input_file(filepath, router): continue
+            st = None
+            if manifest is not None:
+                st = input_stat(filepath)
+                if manifest.is_unchanged(filepath, st, settings_key):
+                    g_message_queue.put(('status', f"Skipped (unchanged): {os.path.basename(filepath)}")); continue
+            g_message_queue.put(('status', f"Processing file {total_files}: {os.path.basename(filepath)}..."))
+            stream_path = stream_paths.claim(filepath)
+            produced.add(os.path.abspath(stream_path))
+            in_flight[task_id] = (filepath, stream_path, consolidated.reserve() if consolidated is not None else None, st)
+            yield task_id, (filepath, params, stream_path, 'auto')
+    try:
+        # <<< CHANGE 4a: The pool stops handing out files once the stop flag is set
+        for task_id, status, result in run_sharded(get_worker_pool(params), tasks(), timeout=timeout_val, stop_event=g_stop_event):
+            filepath, stream_path, seq, st = in_flight.pop(task_id)
+            try:
+                if status == 'timeout':
+                    partial = salvage_stream_output(filepath, params, f"processing timed out after {timeout_val}s", stream_path)
+                    if partial is not None: status, result = 'partial', partial
+                finished = _handle_worker_result(filepath, status, result, params, consolidated, seq)
+                produced.add(os.path.abspath(output_path_for(filepath, params)))
+                if finished and st is not None:
+                    manifest.record(filepath, st, settings_key, output_path_for(filepath, params) if status == 'success' else None)
+            except Exception as e:
+                g_message_queue.put(('error', f"Critical error processing {os.path.basename(filepath)}: {e}"))
+    except Exception as e:
+        g_message_queue.put(('error', f"Critical error in worker pool: {e}"))
+    if manifest is not None: manifest.save()
+    if consolidated is not None: finish_consolidated_writer(consolidated)
 
     # <<< CHANGE 4b: Add a final message indicating if the process was stopped or finished
     if g_stop_event.is_set():
@@ -630,8 +371,8 @@ def process_file(filepaths):
         g_stop_button.configure(state=NORMAL)
         
     g_processed_files_list = filepaths
-    reset_consolidated_file()
-    globals()['processing_thread'] = threading.Thread(target=process_files_in_thread, args=(g_processed_files_list,))
+    params = {var_name: globals()[var_name].get() for var_name in SETTINGS_CONFIG.keys()} # Tk variables are only read on this thread
+    globals()['processing_thread'] = threading.Thread(target=process_files_in_thread, args=(g_processed_files_list, params))
     globals()['processing_thread'].daemon = True
     globals()['processing_thread'].start()
     root.after(100, check_for_updates)
@@ -639,7 +380,7 @@ def process_file(filepaths):
 def stop_processing():
     # <<< CHANGE 2: Function to be called by the stop button
     global g_stop_event, g_stop_button
-    log_message("Stop request received. Finishing current file...")
+    log_message("Stop request received. Finishing files already in progress...")
     g_stop_event.set()
     if g_stop_button:
         g_stop_button.configure(state=DISABLED) # Prevent multiple clicks
@@ -654,7 +395,7 @@ def drop_handler(event):
     elif '\n' in filepaths_str: paths = filepaths_str.splitlines()
     elif ' ' in filepaths_str and not os.path.exists(filepaths_str): paths = filepaths_str.split(' ')
     else: paths = [filepaths_str]
-    actual_files = [p.strip() for p in paths if os.path.isfile(p.strip())]
+    actual_files = [p.strip() for p in paths if os.path.exists(p.strip())]
     if not actual_files: log_message("Could not identify valid file(s) from drop.", level='error'); return
     process_file(actual_files)
 def process_file_list():
@@ -665,7 +406,6 @@ def process_file_list():
     if not file_path:
         log_message("File selection canceled.")
         return
-    reset_consolidated_file()
     log_message(f"Reading file list from {os.path.basename(file_path)}...")
     try:
         with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
@@ -676,7 +416,7 @@ def process_file_list():
     if not file_paths:
         log_message("File list is empty or invalid.", level='error')
         return
-    log_message(f"Processing {len(file_paths)} files from list...")
+    log_message(f"Processing {len(file_paths)} entries from list...")
     process_file(file_paths)
 
 
@@ -734,6 +474,7 @@ def populate_settings_content(parent_container):
     ctk.CTkRadioButton(col1_frame, text="Off", variable=html_stripping_mode_var, value="off", text_color="black", fg_color="black", border_color="black").pack(side=TOP, anchor=W, padx=15, pady=1)
     ctk.CTkRadioButton(col1_frame, text="Strip Tags & Keep Content", variable=html_stripping_mode_var, value="strip_tags", text_color="black", fg_color="black", border_color="black").pack(side=TOP, anchor=W, padx=15, pady=1)
     ctk.CTkRadioButton(col1_frame, text="Discard Segments w/ Tags", variable=html_stripping_mode_var, value="discard_segments", text_color="black", fg_color="black", border_color="black").pack(side=TOP, anchor=W, padx=15, pady=1)
+    ctk.CTkRadioButton(col1_frame, text="Parse HTML (Skip Scripts, Keep Blocks)", variable=html_stripping_mode_var, value="parse_html", text_color="black", fg_color="black", border_color="black").pack(side=TOP, anchor=W, padx=15, pady=1)
     create_synchronized_setting(col1_frame, "Min Words (General Seq):", min_words_general_var, 1, 100, is_int=True, label_width=24)
     create_synchronized_setting(col1_frame, "Min Words (Punctuated Sent.):", min_words_sentence_var, 1, 50, is_int=True, label_width=24)
     create_synchronized_setting(col1_frame, "Max Chars Seg (for NL split):", max_segment_len_var, 50, 2000, is_int=True, label_width=24)
@@ -757,11 +498,40 @@ def populate_settings_content(parent_container):
     create_entry_setting(col3_frame, "Always IGNORE these (,.ext):", ignore_extensions_var, label_width=22)
     create_entry_setting(col3_frame, "Additional Text Exts:", custom_file_extensions_var, label_width=22)
     create_entry_setting(col3_frame, "Output File Suffix:", custom_output_suffix_var, label_width=22)
+    output_format_frame = ctk.CTkFrame(col3_frame, fg_color="transparent"); output_format_frame.pack(side=TOP, anchor=W, padx=5)
+    ctk.CTkLabel(output_format_frame, text="Output Format:", text_color="black").pack(side=LEFT, padx=(0,5))
+    for text, value in (("Text", "text"), ("JSONL (record per segment)", "jsonl")):
+        ctk.CTkRadioButton(output_format_frame, text=text, variable=output_format_var, value=value, text_color="black", fg_color="black", border_color="black").pack(side=LEFT, pady=1)
     create_synchronized_setting(col3_frame, "Pages to Process (0=all):", pages_to_process_var, 0, 500, is_int=True, label_width=22)
     create_synchronized_setting(col3_frame, "File Processing Timeout (secs):", file_processing_timeout_var, 1, 300, is_int=True, label_width=22)
+    create_synchronized_setting(col3_frame, "Worker Processes (0=auto):", worker_count_var, 0, 64, is_int=True, label_width=22)
+    ctk.CTkCheckBox(col3_frame, text="Include hidden files in folders", variable=include_hidden_files_var, text_color="black", border_color="black", checkmark_color="black").pack(side=TOP, anchor=W, padx=5, pady=(5,0))
+    ctk.CTkCheckBox(col3_frame, text="Follow folder symlinks", variable=follow_symlinks_var, text_color="black", border_color="black", checkmark_color="black").pack(side=TOP, anchor=W, padx=5)
+    ctk.CTkCheckBox(col3_frame, text="Read inside zip/tar archives", variable=read_archives_var, text_color="black", border_color="black", checkmark_color="black").pack(side=TOP, anchor=W, padx=5)
+    ctk.CTkCheckBox(col3_frame, text="Skip unchanged files on re-runs", variable=skip_unchanged_files_var, text_color="black", border_color="black", checkmark_color="black").pack(side=TOP, anchor=W, padx=5)
+    ctk.CTkCheckBox(col3_frame, text="Cache extracted PDF/DOCX text", variable=raw_cache_enabled_var, text_color="black", border_color="black", checkmark_color="black").pack(side=TOP, anchor=W, padx=5)
+    create_synchronized_setting(col3_frame, "Text Cache Size (MB):", raw_cache_max_mb_var, 16, 8192, is_int=True, label_width=22)
+    create_synchronized_setting(col3_frame, "Stream Files Over (MB):", stream_threshold_mb_var, 1, 4096, is_int=True, label_width=22)
+    create_synchronized_setting(col3_frame, "Split PDFs Over (Pages):", pdf_shard_pages_var, 0, 5000, is_int=True, label_width=22)
+    ctk.CTkCheckBox(col3_frame, text="Tag segments with source location", variable=segment_locations_var, text_color="black", border_color="black", checkmark_color="black").pack(side=TOP, anchor=W, padx=5)
+    ctk.CTkCheckBox(col3_frame, text="Drop repeated segments (keep first)", variable=collapse_duplicate_segments_var, text_color="black", border_color="black", checkmark_color="black").pack(side=TOP, anchor=W, padx=5)
+    ctk.CTkCheckBox(col3_frame, text="Score segments in bulk (NumPy)", variable=numpy_scoring_var, text_color="black", border_color="black", checkmark_color="black").pack(side=TOP, anchor=W, padx=5)
+    ctk.CTkCheckBox(col3_frame, text="Decide repeated segments once", variable=segment_memo_var, text_color="black", border_color="black", checkmark_color="black").pack(side=TOP, anchor=W, padx=5)
+    ctk.CTkCheckBox(col3_frame, text="Order filter checks by measured cost", variable=adaptive_filter_order_var, text_color="black", border_color="black", checkmark_color="black").pack(side=TOP, anchor=W, padx=5)
     ctk.CTkCheckBox(col3_frame, text="Extract and list URLs (Appends to output)", variable=extract_urls_enabled_var, text_color="black", border_color="black", checkmark_color="black").pack(side=TOP, anchor=W, padx=5, pady=(5,2))
     ctk.CTkCheckBox(col3_frame, text="Enable Consolidation", variable=consolidate_output_enabled_var, text_color="black", border_color="black", checkmark_color="black").pack(side=TOP, anchor=W, padx=5, pady=(10,0))
     create_entry_setting(col3_frame, "Consolidated Filename:", consolidated_output_filename_var, label_width=22, indent=10)
+    ctk.CTkLabel(col3_frame, text="Near-Duplicates Across Files:", text_color="black").pack(side=TOP, anchor=W, padx=15)
+    near_dup_frame = ctk.CTkFrame(col3_frame, fg_color="transparent"); near_dup_frame.pack(side=TOP, anchor=W, padx=15)
+    for text, value in (("Off", "off"), ("Drop", "drop"), ("Flag", "flag")):
+        ctk.CTkRadioButton(near_dup_frame, text=text, variable=near_duplicate_mode_var, value=value, width=60, text_color="black", fg_color="black", border_color="black").pack(side=LEFT, pady=1)
+    create_synchronized_setting(col3_frame, "Near-Dup Similarity:", near_duplicate_threshold_var, 0.5, 1.0, is_int=False, label_width=22, indent=10)
+    create_synchronized_setting(col3_frame, "Roll Shard Every (MB):", consolidated_shard_mb_var, 0, 20480, label_width=22, indent=10)
+    create_synchronized_setting(col3_frame, "Roll Shard Every (Files):", consolidated_shard_files_var, 0, 10000, label_width=22, indent=10)
+    ctk.CTkLabel(col3_frame, text="Compression:", text_color="black").pack(side=TOP, anchor=W, padx=15)
+    compression_frame = ctk.CTkFrame(col3_frame, fg_color="transparent"); compression_frame.pack(side=TOP, anchor=W, padx=15)
+    for text, value in (("None", "none"), ("gzip", "gzip"), ("xz", "xz"), ("bz2", "bz2")):
+        ctk.CTkRadioButton(compression_frame, text=text, variable=consolidated_compression_var, value=value, width=60, text_color="black", fg_color="black", border_color="black").pack(side=LEFT, pady=1)
 
     create_header(col4_frame, "Advanced Toggles & Params:")
     ctk.CTkCheckBox(col4_frame, text="Enable Code Block Filter", variable=remove_code_blocks_var, text_color="black", border_color="black", checkmark_color="black").pack(side=TOP, anchor=W, padx=5)
@@ -821,6 +591,7 @@ def populate_test_pad_ui(parent):
 def run_test_pad_processing():
     input_text = g_test_pad_input_text.get("1.0", "end-1c")
     params = {var_name: globals()[var_name].get() for var_name in SETTINGS_CONFIG.keys()}
+    params['output_format_var'] = "text" # The pad previews the filters as text, whatever the files get
     output_text = process_text(input_text, params)
     g_test_pad_output_text.configure(state=NORMAL)
     g_test_pad_output_text.delete("1.0", END)
@@ -830,7 +601,8 @@ def run_test_pad_processing():
 # --- MAIN APPLICATION STARTUP ---
 if __name__ == "__main__":
     multiprocessing.freeze_support()
-    
+    load_gui_libraries()
+
     ctk.set_appearance_mode("light")
     ctk.set_default_color_theme("blue")
     
@@ -840,7 +612,10 @@ if __name__ == "__main__":
     root.title(f"File Text Extractor v{APP_VERSION}"); root.geometry("1200x800")
     root.minsize(800, 600)
     setup_variables(); load_app_settings()
-    def on_main_window_close(): save_app_settings(); root.destroy()
+    def on_main_window_close():
+        save_app_settings()
+        if g_worker_pool is not None: g_worker_pool.shutdown()
+        root.destroy()
     root.protocol("WM_DELETE_WINDOW", on_main_window_close)
     
     main_pane = PanedWindow(root, orient=VERTICAL, sashrelief=RAISED, bg="white", sashwidth=6)
@@ -898,5 +673,6 @@ if __name__ == "__main__":
     initial_status_text = f"Settings loaded. Ready. (v{APP_VERSION})"
     if not DND_AVAILABLE: initial_status_text += " (DND Disabled)"
     log_message(initial_status_text)
-    
+    root.after_idle(report_startup_time)
+
     root.mainloop()
@@ -0,0 +1,204 @@
+"""
+GC Text Extractor - reading inputs straight out of zip and tar archives.
+
+With "Read inside zip/tar archives" on, the input walker lists an archive's
+members instead of the archive itself, so archived corpora don't have to be
+unpacked to disk first. A member goes by `<archive path>!/<member path>`, e.g.
+`corpus.zip!/docs/a.pdf`, and is routed by its own extension like any file.
+
+Members are opened and read by the worker that processes them; the walker only
+passes on where they are. A zip has an index, so any member can be read on its
+own. For a tar member the walker notes where its data starts in the (unpacked)
+tar stream: the worker seeks there in a plain .tar, and decompresses up to there
+in a compressed one, then reads just the member, a chunk at a time. Small members
+of compressed tars (up to TAR_INLINE_BYTES) are the exception: their bytes travel
+with the path, as each worker decompressing the archive from the start again
+would make thousands of small files cost quadratic time. Text members are decoded
+a chunk at a time, and .docx/.pdf members are parsed from bytes in memory.
+
+A member's output is named after the archive and the member path, with `!` for
+the folder separators: `corpus.zip!docs!a_processed.txt`, next to the archive.
+Archives inside archives are not opened.
+"""
+
+import io
+import os
+import posixpath
+import re
+import stat
+import tarfile
+import types
+import zipfile
+
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+MEMBER_SEPARATOR = "!/"
+TAR_INLINE_BYTES = 1024 * 1024 # Members of compressed tars up to this size are sent to the worker with their bytes
+READ_CHUNK_SIZE = 1024 * 1024
+_MEMBER_PATH = re.compile(r'(.*?(?:' + '|'.join(re.escape(extension) for extension in ARCHIVE_EXTENSIONS) + r'))!/(.+)',
+                          re.IGNORECASE | re.DOTALL)
+
+
+class ArchiveMemberPath(str):
+    """
+    The path of an archive member, as yielded by iter_archive_members: a plain string
+    to everything else, carrying the member's size, the archive's mtime and, for tar
+    members, where the member's data starts in the tar stream or (small members of
+    compressed tars) the data itself, which pickles along with it to the worker.
+    """
+    def __new__(cls, path, size, mtime_ns, data=None, offset=None):
+        self = super().__new__(cls, path)
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.data = data
+        self.offset = offset
+        return self
+
+    def __reduce__(self):
+        return (ArchiveMemberPath, (str(self), self.size, self.mtime_ns, self.data, self.offset))
+
+
+class _MemberReader(io.RawIOBase):
+    """The `size` bytes of a tar member, read from a stream already positioned at its start."""
+    def __init__(self, stream, size):
+        self._stream = stream
+        self._left = size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._left <= 0: return 0
+        view = memoryview(buffer)[:self._left]
+        data = self._stream.read(len(view))
+        view[:len(data)] = data
+        self._left -= len(data)
+        return len(data)
+
+    def close(self):
+        if not self.closed: self._stream.close()
+        super().close()
+
+
+def is_archive(path):
+    return path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+def split_member_path(path):
+    """(archive path, member path) for a member path, else None."""
+    match = _MEMBER_PATH.fullmatch(path)
+    return (match.group(1), match.group(2)) if match else None
+
+def _is_hidden_member(name):
+    return any(part.startswith('.') and part not in ('.', '..') for part in name.split('/'))
+
+def iter_archive_members(archive, include_hidden=False):
+    """Yields an ArchiveMemberPath for every regular file in a zip or tar archive, in archive order."""
+    mtime_ns = os.stat(archive).st_mtime_ns
+    if archive.lower().endswith('.zip'):
+        with zipfile.ZipFile(archive) as zf:
+            infos = zf.infolist()
+        for info in infos:
+            if info.is_dir() or (not include_hidden and _is_hidden_member(info.filename)): continue
+            yield ArchiveMemberPath(archive + MEMBER_SEPARATOR + info.filename, info.file_size, mtime_ns)
+        return
+    compressed = _tar_opener(archive) is not open
+    with tarfile.open(archive, 'r|*') as tf: # Stream mode: one pass, and members that aren't read are skipped
+        for member in tf:
+            if not member.isreg() or (not include_hidden and _is_hidden_member(member.name)): continue
+            path = archive + MEMBER_SEPARATOR + member.name
+            if member.issparse() or (compressed and member.size <= TAR_INLINE_BYTES): # Sparse ones only tarfile can put together
+                with tf.extractfile(member) as f:
+                    yield ArchiveMemberPath(path, member.size, mtime_ns, data=f.read())
+            else:
+                yield ArchiveMemberPath(path, member.size, mtime_ns, offset=member.offset_data)
+
+def _tar_opener(archive):
+    """open, or the decompressing open of gzip, bz2 or lzma, going by the tar's magic number."""
+    with open(archive, 'rb') as f:
+        magic = f.read(6)
+    if magic.startswith(b'\x1f\x8b'):
+        import gzip
+        return gzip.open
+    if magic.startswith(b'BZh'):
+        import bz2
+        return bz2.open
+    if magic.startswith(b'\xfd7zXZ\x00'):
+        import lzma
+        return lzma.open
+    return open
+
+def _open_tar_member(archive, name, offset=None, size=None):
+    """A buffered reader of one tar member, found by listing the archive if its offset isn't known."""
+    if offset is None:
+        with tarfile.open(archive, 'r|*') as tf:
+            member = next((m for m in tf if m.name == name and m.isreg()), None)
+            if member is None: raise KeyError(f"No member {name} in {archive}")
+            if member.issparse(): # Only tarfile knows how to put these together
+                with tf.extractfile(member) as f: return io.BytesIO(f.read())
+            offset, size = member.offset_data, member.size
+    stream = _tar_opener(archive)(archive, 'rb')
+    try:
+        stream.seek(offset) # In a compressed tar, decompresses everything before the member
+    except Exception:
+        stream.close()
+        raise
+    return io.BufferedReader(_MemberReader(stream, size), READ_CHUNK_SIZE)
+
+def open_input(filepath, in_memory=False):
+    """
+    A binary file object for a file or an archive member. With `in_memory`, a member is
+    read whole into a BytesIO (for parsers that seek around, like PyPDF2 and python-docx).
+    """
+    member = split_member_path(filepath)
+    if member is None:
+        return open(filepath, 'rb')
+    data = getattr(filepath, 'data', None)
+    if data is not None:
+        return io.BytesIO(data)
+    archive, name = member
+    if archive.lower().endswith('.zip'):
+        with zipfile.ZipFile(archive) as zf:
+            f = zf.open(name) # Keeps the archive file open until it is closed itself
+    else:
+        f = _open_tar_member(archive, name, getattr(filepath, 'offset', None), getattr(filepath, 'size', None))
+    if not in_memory: return f
+    with f: return io.BytesIO(f.read())
+
+def input_exists(filepath):
+    """os.path.exists for a file; for an archive member, whether its archive exists."""
+    member = split_member_path(filepath)
+    return os.path.exists(filepath if member is None else member[0])
+
+def input_size(filepath):
+    """Size in bytes of a file or an archive member."""
+    size = getattr(filepath, 'size', None)
+    if size is not None: return size
+    member = split_member_path(filepath)
+    if member is None: return os.path.getsize(filepath)
+    with open_input(filepath) as f:
+        return sum(len(chunk) for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b''))
+
+def input_stat(filepath):
+    """os.stat for a file; for an archive member, the st_mode, st_size and st_mtime_ns it would have (the archive's mtime)."""
+    member = split_member_path(filepath)
+    if member is None: return os.stat(filepath)
+    mtime_ns = getattr(filepath, 'mtime_ns', None)
+    if mtime_ns is None: mtime_ns = os.stat(member[0]).st_mtime_ns
+    try:
+        size = input_size(filepath)
+    except (KeyError, zipfile.BadZipFile, tarfile.TarError) as e: # No such member, or a damaged archive
+        raise FileNotFoundError(f"Cannot read {filepath}: {e}") from e
+    return types.SimpleNamespace(st_mode=stat.S_IFREG | 0o444, st_size=size, st_mtime_ns=mtime_ns)
+
+def output_stem(filepath):
+    """The output path of a file without suffix and extension: next to it, or next to the archive for a member."""
+    member = split_member_path(filepath)
+    if member is None: return os.path.splitext(filepath)[0]
+    archive, name = member
+    while name.startswith('./'): name = name[2:] # As stored by `tar -C folder .`
+    return archive + "!" + posixpath.splitext(name)[0].replace('/', '!')
+
+def display_name(filepath):
+    """The file name shown for a file, or `archive!/member path` for an archive member."""
+    member = split_member_path(filepath)
+    if member is None: return os.path.basename(filepath)
+    return os.path.basename(member[0]) + MEMBER_SEPARATOR + member[1]
@@ -0,0 +1,117 @@
+"""
+GC Text Extractor - on-disk cache of raw extracted text.
+
+Parsing a PDF or .docx is by far the slowest step, yet most re-runs only change
+filter thresholds. This cache stores the raw text an extractor produced, keyed
+by a hash of the file's content plus everything the extractor depends on (which
+extractor, pages to process, EXTRACTOR_VERSION). A cache hit skips straight to
+`process_text`.
+
+Entries live in `<cache dir>/<2 hex chars>/<key>.txt`. Reads touch an entry's
+mtime, and when the cache grows past its size limit the least recently used
+entries are deleted. Several worker processes may share one cache directory:
+writes go through a temp file and os.replace, and an entry that disappears
+under us is just a miss.
+"""
+
+import hashlib
+import os
+import tempfile
+
+from text_stripper_archives import open_input
+
+HASH_CHUNK_SIZE = 1024 * 1024
+EVICT_TO_FRACTION = 0.9 # Evict down to 90% of the limit so we don't evict on every write
+
+
+def file_digest(filepath):
+    """sha256 hex digest of a file's (or an archive member's) content, read in chunks."""
+    digest = hashlib.sha256()
+    with open_input(filepath) as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RawTextCache:
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._approx_size = None # Bytes on disk; scanned lazily, then kept up to date by this process
+
+    def key_for(self, filepath, *extractor_params):
+        """Content hash of `filepath` combined with the extractor's parameters."""
+        params = '|'.join(str(p) for p in extractor_params)
+        return hashlib.sha256(f"{file_digest(filepath)}|{params}".encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".txt")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            os.utime(path) # Mark as recently used
+        except OSError:
+            return None
+        return text
+
+    def put(self, key, text):
+        path = self._path(key)
+        data = text.encode('utf-8')
+        if len(data) > self.max_bytes: return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(temp_path, path)
+            except OSError:
+                os.remove(temp_path); raise
+        except OSError as e:
+            print(f"WARN: Could not write raw text cache entry {path}: {e}")
+            return
+        if self._approx_size is None: self._approx_size = self._scan()[1]
+        else: self._approx_size += len(data)
+        if self._approx_size > self.max_bytes: self.evict()
+
+    def _scan(self):
+        """Returns ([(mtime, size, path), ...], total size) for every entry on disk."""
+        entries, total = [], 0
+        try:
+            subdirs = [entry.path for entry in os.scandir(self.cache_dir) if entry.is_dir()]
+        except OSError:
+            return entries, total
+        for subdir in subdirs:
+            try:
+                for entry in os.scandir(subdir):
+                    if not entry.name.endswith(".txt"): continue
+                    st = entry.stat()
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+                    total += st.st_size
+            except OSError:
+                continue
+        return entries, total
+
+    def evict(self):
+        """Deletes least recently used entries until the cache is under EVICT_TO_FRACTION of its limit."""
+        entries, total = self._scan()
+        target = self.max_bytes * EVICT_TO_FRACTION
+        for _, size, path in sorted(entries):
+            if total <= target: break
+            try: os.remove(path)
+            except OSError: pass # Another worker got there first
+            total -= size
+        self._approx_size = total
+
+
+_caches = {}
+def get_raw_text_cache(cache_dir, max_megabytes):
+    """One RawTextCache per (directory, limit) per process, so its size estimate survives between files."""
+    key = (os.path.abspath(cache_dir), max_megabytes)
+    cache = _caches.get(key)
+    if cache is None:
+        cache = _caches[key] = RawTextCache(key[0], int(max_megabytes * 1024 * 1024))
+    return cache
@@ -0,0 +1,349 @@
+"""
+GC Text Extractor - command-line batch mode.
+
+Runs the same filter pipeline as the GUI over many files in parallel, without a
+display. Reads the same settings JSON the GUI saves.
+
+    python text_stripper.py batch --jobs 16 --settings text_extractor_settings.json docs/ "scans/**/*.pdf"
+    python text_stripper_cli.py batch --list files_to_process.txt
+    python text_stripper_cli.py bench --repeat 5 sample.pdf scraped/
+
+Inputs can be files, directories (walked lazily and recursively, so work starts
+before a large tree is fully listed), glob patterns, or list files (one path per
+line, like "Process Files from List" in the GUI). With --archives, the members of
+zip and tar archives are read in place of the archive. When the batch finishes,
+throughput (files/s, MB/s) and a failure summary are printed. The exit code is 1
+if any file failed or timed out.
+
+`bench` extracts the inputs once, then times segmentation and filtering alone
+(no I/O, no workers) and prints the cost per segment, for comparing engine
+changes or settings on the same sample.
+"""
+
+import argparse
+import multiprocessing
+import os
+import stat
+import sys
+import time
+
+from text_stripper_engine import (SETTINGS_FILENAME, load_settings, extract_file, output_path_for,
+                                  get_extension_router, skipped_unknown_result, StreamPaths,
+                                  salvage_stream_output, save_output,
+                                  extract_text_from_docx, extract_text_from_pdf, extract_text_from_txt,
+                                  strip_html, split_segments, filter_segments, SegmentMemo, segment_memo_for,
+                                  get_filter_plan)
+from text_stripper_archives import input_stat
+from text_stripper_inputs import iter_input_files
+from text_stripper_manifest import MANIFEST_FILENAME, BatchManifest, settings_hash
+from text_stripper_neardup import NearDuplicateIndex
+from text_stripper_consolidated import ConsolidatedWriter
+from text_stripper_pool import WorkerPool, resolve_worker_count
+from text_stripper_shards import run_sharded
+from text_stripper_sniff import sniff_text_file
+
+MAX_FAILURES_LISTED = 20
+
+
+def read_list_file(list_path):
+    with open(list_path, 'r', encoding='utf-8', errors='ignore') as f:
+        return [line.strip() for line in f if line.strip()]
+
+def _write_output(filepath, data, settings, consolidated, seq=None, status=None):
+    if consolidated is not None:
+        consolidated.put(seq, filepath, data, status) # Written in input order by the writer thread
+        return None
+    output_filepath = output_path_for(filepath, settings)
+    save_output(data, output_filepath)
+    return output_filepath
+
+
+class BatchStats:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.counts = {}
+        self.bytes_in = 0
+        self.failures = [] # (filepath, status, message)
+        self.near_duplicates = None # The consolidated batch's NearDuplicateIndex, if any
+        self.consolidated = None # Its ConsolidatedWriter, if sharded
+
+    def record(self, filepath, status, message=None):
+        self.counts[status] = self.counts.get(status, 0) + 1
+        if status in ('error', 'timeout', 'missing'):
+            self.failures.append((filepath, status, message))
+
+    def summary_lines(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        total = sum(self.counts.values())
+        megabytes = self.bytes_in / (1024 * 1024)
+        lines = [f"Processed {total} files ({megabytes:.1f} MB) in {elapsed:.2f}s: "
+                 f"{total / elapsed:.1f} files/s, {megabytes / elapsed:.2f} MB/s"]
+        lines.append("  " + ", ".join(f"{status}: {count}" for status, count in sorted(self.counts.items())))
+        if self.near_duplicates is not None:
+            lines.append("  " + self.near_duplicates.summary())
+        if self.consolidated is not None:
+            lines.append("  " + self.consolidated.summary())
+        if self.failures:
+            lines.append(f"Failures ({len(self.failures)}):")
+            for filepath, status, message in self.failures[:MAX_FAILURES_LISTED]:
+                lines.append(f"  [{status}] {filepath}: {message}")
+            if len(self.failures) > MAX_FAILURES_LISTED:
+                lines.append(f"  ... and {len(self.failures) - MAX_FAILURES_LISTED} more")
+        return lines
+
+
+def run_batch(filepaths, settings, jobs=None, timeout=None, verbose=False, manifest=None):
+    """
+    Processes `filepaths` through a worker pool and writes outputs. Returns a BatchStats.
+    With a BatchManifest, files unchanged since the last run with the same settings are skipped.
+    """
+    stats = BatchStats()
+    jobs = resolve_worker_count(settings['worker_count_var'] if jobs is None else jobs)
+    timeout = settings['file_processing_timeout_var'] if timeout is None else timeout
+    router = get_extension_router(settings)
+
+    consolidated = None
+    if settings['consolidate_output_enabled_var'] == 1:
+        consolidated_filename = settings['consolidated_output_filename_var'].strip()
+        if not consolidated_filename:
+            raise ValueError("Consolidated filename cannot be empty.")
+        if settings['near_duplicate_mode_var'] in ('drop', 'flag'):
+            stats.near_duplicates = NearDuplicateIndex(settings['near_duplicate_threshold_var'])
+        consolidated = ConsolidatedWriter(os.path.join(os.getcwd(), consolidated_filename), stats.near_duplicates,
+                                          settings['near_duplicate_mode_var'],
+                                          settings['consolidated_shard_mb_var'] * 1024 * 1024,
+                                          settings['consolidated_shard_files_var'], settings['consolidated_compression_var'],
+                                          settings['output_format_var'])
+    # Outputs written during this batch, so a folder walk that is still running doesn't pick them up as inputs
+    produced = set()
+    if manifest is not None and consolidated is not None:
+        print("WARN: Skipping unchanged files is not possible with consolidated output; processing everything.")
+        manifest = None
+    settings_key = settings_hash(settings) if manifest is not None else None
+    # Task id -> (filepath, .part path, its place in the consolidated output, stat taken before processing for
+    # the manifest). Ids are per dispatch, so a path given twice is processed (and consolidated) twice.
+    in_flight = {}
+    stream_paths = StreamPaths(settings)
+
+    def tasks():
+        for task_id, filepath in enumerate(filepaths):
+            if consolidated is not None and consolidated.failure is not None:
+                return # Nothing more can be written
+            if os.path.abspath(filepath) in produced or (consolidated is not None and consolidated.owns(filepath)):
+                continue
+            try:
+                st = input_stat(filepath)
+            except OSError:
+                st = None
+            if st is None or not stat.S_ISREG(st.st_mode):
+                stats.record(filepath, 'missing', "File not found")
+                continue
+            if router.is_ignored(filepath):
+                stats.record(filepath, 'skipped_ignored')
+                if verbose: print(f"Skipped (ignored ext): {filepath}")
+                continue
+            if router.route(filepath) is None:
+                stats.record(filepath, 'skipped_unknown')
+                if verbose: print(skipped_unknown_result(filepath)[1])
+                continue
+            if manifest is not None and manifest.is_unchanged(filepath, st, settings_key):
+                stats.record(filepath, 'skipped_unchanged')
+                if verbose: print(f"Unchanged: {filepath}")
+                continue
+            stats.bytes_in += st.st_size
+            stream_path = stream_paths.claim(filepath)
+            produced.add(os.path.abspath(stream_path))
+            seq = consolidated.reserve() if consolidated is not None else None
+            in_flight[task_id] = (filepath, stream_path, seq, st if manifest is not None else None)
+            yield task_id, (filepath, settings, stream_path, 'auto')
+
+    try:
+        with WorkerPool(extract_file, jobs) as pool:
+            for task_id, status, data in run_sharded(pool, tasks(), timeout=timeout):
+                filepath, stream_path, seq, st = in_flight.pop(task_id)
+                output = None # What goes into the consolidated output for this file
+                if status == 'success':
+                    try:
+                        output_filepath = _write_output(filepath, data, settings, consolidated, seq, status)
+                        output = data
+                        if output_filepath: produced.add(os.path.abspath(output_filepath))
+                    except Exception as e:
+                        status, data = 'error', f"Error writing output: {e}"
+                    else:
+                        if verbose: print(f"OK: {filepath}" + (f" -> {output_filepath}" if output_filepath else ""))
+                        if st is not None: manifest.record(filepath, st, settings_key, output_filepath)
+                elif status == 'timeout':
+                    data = f"Processing timed out after {timeout}s"
+                    partial = salvage_stream_output(filepath, settings, f"processing timed out after {timeout}s", stream_path)
+                    if partial is not None:
+                        try:
+                            output_filepath = _write_output(filepath, partial, settings, consolidated, seq, status)
+                            output = partial
+                            if output_filepath: produced.add(os.path.abspath(output_filepath))
+                            data += "; partial output saved" + (f" to {output_filepath}" if output_filepath else "")
+                        except Exception as e:
+                            data += f"; error writing partial output: {e}"
+                elif verbose:
+                    print(data)
+                if status == 'skipped_empty' and st is not None:
+                    manifest.record(filepath, st, settings_key)
+                if consolidated is not None and output is None:
+                    consolidated.put(seq, filepath, None) # Nothing to write, but later files mustn't wait for it
+                if status in ('error', 'timeout'):
+                    print(f"ERROR: {filepath}: {data}", file=sys.stderr)
+                stats.record(filepath, status, data)
+    finally:
+        if consolidated is not None:
+            try:
+                consolidated.close()
+            except Exception as e:
+                stats.failures.append((consolidated.path, 'error', str(e)))
+                print(f"ERROR: {consolidated.path}: {e}", file=sys.stderr)
+            if consolidated.sharded: stats.consolidated = consolidated
+            for filepath, status, message in consolidated.errors:
+                stats.counts[status] -= 1
+                stats.record(filepath, 'error', f"Error writing output: {message}")
+                print(f"ERROR: {filepath}: Error writing output: {message}", file=sys.stderr)
+        if manifest is not None: manifest.save()
+    return stats
+
+
+def _read_raw_text(filepath, settings, router):
+    kind = router.route(filepath)
+    if kind == 'docx': return extract_text_from_docx(filepath)
+    if kind == 'pdf': return extract_text_from_pdf(filepath, settings['pages_to_process_var'])
+    if kind == 'text':
+        encoding = sniff_text_file(filepath)[0]
+        return extract_text_from_txt(filepath, encoding) if encoding else None
+    return None
+
+def run_bench(filepaths, settings, repeat=3):
+    """
+    Times segmentation (HTML stripping + split_segments) and filtering (filter_segments)
+    over the text of `filepaths`, best of `repeat` runs. Returns the report lines, with
+    the segment memo's hit rate if the settings use one.
+    """
+    router = get_extension_router(settings)
+    texts = []
+    for filepath in filepaths:
+        if router.is_ignored(filepath): continue
+        text = _read_raw_text(filepath, settings, router)
+        if text: texts.append(text)
+    if not texts:
+        raise ValueError("No readable input text to benchmark.")
+    html_mode = settings['html_stripping_mode_var']
+    best_segment = best_filter = float('inf')
+    for _ in range(max(1, repeat)):
+        segment_time = filter_time = 0.0
+        num_segments = num_kept = 0
+        memo_totals = SegmentMemo(collapse_duplicates=bool(settings['collapse_duplicate_segments_var'])) # Counts only
+        for text in texts:
+            started = time.perf_counter()
+            segments = split_segments(strip_html(text, html_mode), settings)
+            segmented = time.perf_counter()
+            memo = segment_memo_for(settings) # One per file, as in a batch
+            check_order = get_filter_plan(settings).new_check_order() # Likewise
+            kept = filter_segments(segments, settings, memo, check_order)
+            filter_time += time.perf_counter() - segmented
+            segment_time += segmented - started
+            num_segments += len(segments); num_kept += len(kept)
+            if memo is not None:
+                memo_totals.lookups += memo.lookups; memo_totals.hits += memo.hits; memo_totals.collapsed += memo.collapsed
+        best_segment = min(best_segment, segment_time)
+        best_filter = min(best_filter, filter_time)
+    per_segment = lambda seconds: seconds * 1e6 / max(num_segments, 1)
+    # `check_order` is the last file's, shown as a sample (unused if every segment list was scored with NumPy)
+    megabytes = sum(map(len, texts)) / (1024 * 1024)
+    return [f"{len(texts)} files, {megabytes:.1f} M characters, {num_segments} segments, {num_kept} kept "
+            f"(best of {max(1, repeat)} runs)",
+            f"  segmentation: {best_segment:.3f}s, {per_segment(best_segment):.2f} us/segment",
+            f"  filtering:    {best_filter:.3f}s, {per_segment(best_filter):.2f} us/segment",
+            f"  total:        {best_segment + best_filter:.3f}s, {per_segment(best_segment + best_filter):.2f} us/segment"] + \
+           ([f"  check order:  {check_order.describe()}"] if check_order.adaptive and (check_order.sampled or not check_order.sampling) else []) + \
+           ([f"  segment memo: {memo_totals.summary()}"] if memo_totals.lookups else [])
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="text_stripper", description="GC Text Extractor command-line interface.")
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+    batch = subparsers.add_parser('batch', help="Process files, directories or globs in parallel without the GUI.")
+    batch.add_argument('paths', nargs='*', help="Files, directories (recursive) or glob patterns.")
+    batch.add_argument('-l', '--list', dest='list_files', action='append', default=[], metavar='FILE',
+                       help="Text file with one input path per line (may be repeated).")
+    batch.add_argument('-s', '--settings', default=SETTINGS_FILENAME,
+                       help=f"Settings JSON saved by the GUI (default: {SETTINGS_FILENAME}; defaults are used if missing).")
+    batch.add_argument('-j', '--jobs', type=int, default=None,
+                       help="Number of worker processes (default: the settings file, 0 = one per CPU core).")
+    batch.add_argument('--timeout', type=int, default=None, help="Per-file timeout in seconds (default: the settings file).")
+    batch.add_argument('--hidden', action='store_true', default=None,
+                       help="Include hidden files and folders when walking directories (default: the settings file).")
+    batch.add_argument('--follow-symlinks', action='store_true', default=None,
+                       help="Follow symlinked folders when walking directories; loops are detected (default: the settings file).")
+    batch.add_argument('--archives', action='store_true', default=None,
+                       help="Read the members of zip and tar(.gz/.bz2/.xz) archives instead of skipping them (default: the settings file).")
+    batch.add_argument('-i', '--incremental', action='store_true', default=None,
+                       help="Skip files unchanged (size, mtime, settings) since the last run whose output still exists "
+                            "(default: the settings file).")
+    batch.add_argument('--manifest', default=MANIFEST_FILENAME,
+                       help=f"Manifest used by --incremental (default: {MANIFEST_FILENAME}).")
+    batch.add_argument('--cache-dir', default=None,
+                       help="Cache raw PDF/DOCX text in this folder, so re-runs with new filter settings skip parsing "
+                            "(default: the settings file).")
+    batch.add_argument('-v', '--verbose', action='store_true', help="Print a line for every file.")
+    bench = subparsers.add_parser('bench', help="Time segmentation and filtering per segment on sample inputs.")
+    bench.add_argument('paths', nargs='+', help="Files, directories (recursive) or glob patterns.")
+    bench.add_argument('-s', '--settings', default=SETTINGS_FILENAME,
+                       help=f"Settings JSON saved by the GUI (default: {SETTINGS_FILENAME}; defaults are used if missing).")
+    bench.add_argument('-r', '--repeat', type=int, default=3, help="Timed runs; the best is reported (default: 3).")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        settings = load_settings(args.settings)
+    except Exception as e:
+        print(f"ERROR: Failed to load settings from {args.settings}: {e}", file=sys.stderr)
+        return 2
+    if args.command == 'bench':
+        try:
+            inputs = iter_input_files(args.paths, settings['include_hidden_files_var'] == 1, settings['follow_symlinks_var'] == 1,
+                                      read_archives=settings['read_archives_var'] == 1)
+            for line in run_bench(inputs, settings, args.repeat):
+                print(line)
+        except ValueError as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            return 2
+        return 0
+    paths = list(args.paths)
+    for list_file in args.list_files:
+        try:
+            paths.extend(read_list_file(list_file))
+        except OSError as e:
+            print(f"ERROR: Error reading list file {list_file}: {e}", file=sys.stderr)
+            return 2
+    if not paths:
+        print("ERROR: No input paths given.", file=sys.stderr)
+        return 2
+    try:
+        include_hidden = settings['include_hidden_files_var'] == 1 if args.hidden is None else args.hidden
+        follow_symlinks = settings['follow_symlinks_var'] == 1 if args.follow_symlinks is None else args.follow_symlinks
+        read_archives = settings['read_archives_var'] == 1 if args.archives is None else args.archives
+        on_walk_error = lambda path, e: print(f"WARNING: Cannot read {path}: {e}", file=sys.stderr)
+        inputs = iter_input_files(paths, include_hidden, follow_symlinks, on_walk_error, read_archives)
+        if args.cache_dir:
+            settings['raw_cache_enabled_var'], settings['raw_cache_dir_var'] = 1, args.cache_dir
+        incremental = settings['skip_unchanged_files_var'] == 1 if args.incremental is None else args.incremental
+        manifest = BatchManifest(args.manifest) if incremental else None
+        stats = run_batch(inputs, settings, jobs=args.jobs, timeout=args.timeout, verbose=args.verbose, manifest=manifest)
+    except ValueError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 2
+    for line in stats.summary_lines():
+        print(line)
+    return 1 if stats.failures else 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,317 @@
+"""
+GC Text Extractor - the ordered writer behind the consolidated output file.
+
+Workers finish files in whatever order their sizes dictate, but the consolidated
+file should list them in input order, the same on every run. Each file gets a
+sequence number when it is dispatched (`reserve`), and its output is handed to
+the ConsolidatedWriter tagged with it (`put`). A background thread writes the
+outputs in sequence order; one that arrives before an earlier file is done waits
+in a reorder buffer. Past REORDER_BUFFER_CHARS of waiting text, early outputs are
+moved to temp files, so one slow file can hold the rest up without filling memory.
+
+Everything goes through a large buffer into a temp file next to the destination,
+which is renamed over it once complete: the previous consolidated file stays
+intact until the batch is done, and nobody ever sees a half-written one. If the
+writer thread itself fails (a shard that can't be finished or opened, say), it
+stops: later outputs are reported as not written, and `close` raises.
+
+The output can also be rolled into shards, a new one every so many characters or
+files (never in the middle of a file), and compressed with gzip, xz or bz2 as it
+is written. Sharded output comes with an index, `<name>.index.json`, listing the
+inputs that landed in each shard, so later jobs can pick shards up in parallel.
+Shards of the previous index that a batch doesn't write again are removed.
+
+JSONL output (one record per line, each naming its file) is written as is, without
+the start and end markers of text output.
+"""
+
+import io
+import json
+import os
+import queue
+import re
+import tempfile
+import threading
+
+from text_stripper_archives import display_name
+from text_stripper_engine import StreamedOutput, append_output
+from text_stripper_neardup import append_deduplicated, append_deduplicated_records
+
+REORDER_BUFFER_CHARS = 32 * 1024 * 1024 # Output text held in memory while waiting for an earlier file
+WRITE_BUFFER_SIZE = 1024 * 1024
+HANDOFF_QUEUE_SIZE = 64 # Outputs put but not yet taken by the writer thread; `put` waits beyond this
+HANDOFF_POLL_SECONDS = 0.5 # How often a waiting `put` checks that the writer thread is still alive
+COMPRESSION_SUFFIXES = {'none': '', 'gzip': '.gz', 'xz': '.xz', 'bz2': '.bz2'}
+INDEX_FORMAT = 1
+
+
+def write_consolidated_entry(f_out, filename, data, near_duplicates=None, near_duplicate_mode='off', output_format='text'):
+    """One file's part of the consolidated output, between its start and end markers (for text output)."""
+    name = display_name(filename)
+    if output_format == 'jsonl':
+        if near_duplicates is None: append_output(data, f_out)
+        else: append_deduplicated_records(data, f_out, near_duplicates, name, near_duplicate_mode)
+        return
+    f_out.write(f"--- Start of file: {name} ---\n\n")
+    if near_duplicates is None: append_output(data, f_out)
+    else: append_deduplicated(data, f_out, near_duplicates, name, near_duplicate_mode)
+    f_out.write(f"\n\n--- End of file: {name} ---\n\n")
+
+
+def index_path_for(path):
+    """Where the shard index of the consolidated output `path` goes."""
+    return os.path.splitext(path)[0] + ".index.json"
+
+
+def _compressor(raw, compression):
+    """A binary file object compressing into `raw`. The stdlib modules are imported on first use."""
+    if compression == 'gzip':
+        import gzip
+        return gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6)
+    if compression == 'xz':
+        import lzma
+        return lzma.LZMAFile(raw, 'wb')
+    import bz2
+    return bz2.BZ2File(raw, 'wb')
+
+
+class _Shard:
+    """One output file being written: text, through the compressor if any, into a buffered temp file."""
+    def __init__(self, path, temp_path, fd, compression):
+        self.path = path
+        self.temp_path = temp_path
+        self.inputs = [] # Input files written to this shard, in order
+        self.characters = 0 # Before compression
+        self.raw = os.fdopen(fd, 'wb', buffering=WRITE_BUFFER_SIZE)
+        self.compressed = None if compression == 'none' else _compressor(self.raw, compression)
+        self.text = io.TextIOWrapper(self.compressed or self.raw, encoding='utf-8')
+
+    def write(self, text):
+        self.characters += len(text)
+        return self.text.write(text)
+
+    def close(self):
+        self.text.close() # Also finishes the compressor, which leaves `raw` open
+        self.raw.close()
+
+
+class ConsolidatedWriter:
+    """
+    Writes the outputs of a batch to `path`, in the order their sequence numbers were
+    reserved. With a NearDuplicateIndex, each output is checked against the ones written
+    before it. A new shard is started once the current one holds `shard_chars` characters
+    or `shard_files` files (0 = no limit, for both), and the output is compressed with
+    `compression` ('none', 'gzip', 'xz' or 'bz2'). `output_format` is that of the outputs put,
+    'text' or 'jsonl'. `close` must be called once the batch is done (or abandoned).
+    """
+    def __init__(self, path, near_duplicates=None, near_duplicate_mode='off', shard_chars=0, shard_files=0, compression='none',
+                 output_format='text'):
+        if compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"Unknown compression '{compression}'")
+        self.path = path
+        self.near_duplicates = near_duplicates
+        self.near_duplicate_mode = near_duplicate_mode
+        self.shard_chars = shard_chars
+        self.shard_files = shard_files
+        self.sharded = shard_chars > 0 or shard_files > 0
+        self.compression = compression
+        self.output_format = output_format
+        self.errors = [] # (filename, tag, message) of outputs that could not be written; read it after `close`
+        self._errors_lock = threading.Lock() # Both the writer thread and the caller's add to `errors`
+        self.failure = None # The exception that stopped the writer thread, if one did
+        self.shards = [] # Finished shards, in order
+        self.directory = os.path.dirname(os.path.abspath(path))
+        self.index_path = index_path_for(path)
+        self._created = {os.path.abspath(self.index_path), os.path.abspath(self.index_path + ".tmp")} # Paths of everything this writer writes, see `owns`
+        self._previous_shards = self._read_previous_shards() # Replaced or removed by this batch
+        self._created.update(os.path.join(self.directory, name) for name in self._previous_shards)
+        # os.umask can only be read by setting it, which races with other threads creating files,
+        # so it is read once here, before the writer thread starts, instead of for every shard
+        self._umask = os.umask(0); os.umask(self._umask)
+        self._reserved = 0
+        self._next = 0 # Sequence number to write next
+        self._waiting = {} # Sequence number -> (filename, data, tag), for outputs that came in early
+        self._waiting_chars = 0
+        self._file = self._open_shard()
+        self._handoff = queue.Queue(HANDOFF_QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._run, name="consolidated-writer", daemon=True)
+        self._thread.start()
+
+    def owns(self, path):
+        """True if `path` is an output, shard, temp file or index of this writer (so it isn't taken as input)."""
+        return os.path.abspath(path) in self._created
+
+    def reserve(self):
+        """The sequence number of the next file dispatched. Call it in input order."""
+        seq = self._reserved
+        self._reserved += 1
+        return seq
+
+    def put(self, seq, filename, data, tag=None):
+        """
+        Hands over the output (a string or a StreamedOutput) of file `seq`, or None if it has
+        none, so later files don't wait for it. `tag` is returned in `errors` if writing fails.
+        """
+        if seq is None:
+            raise ValueError(f"No sequence number reserved for {filename}")
+        if not self._hand_off((seq, filename, data, tag)):
+            self._discard(filename, data, tag)
+
+    def close(self):
+        """
+        Writes what is still waiting (skipping files that never reported) and renames the output
+        into place. If the writer thread failed, the unwritten outputs go to `errors`, the
+        unfinished output is removed and RuntimeError is raised.
+        """
+        self._hand_off(None)
+        self._thread.join()
+        if self.failure is not None:
+            self._abandon()
+            raise RuntimeError(f"Consolidated output stopped: {self.failure}") from self.failure
+        self._finish_shard(self._file)
+        if self.sharded: self._write_index()
+        elif os.path.exists(self.index_path): os.remove(self.index_path)
+        written = {os.path.basename(shard.path) for shard in self.shards}
+        for name in self._previous_shards - written:
+            try: os.remove(os.path.join(self.directory, name))
+            except OSError: pass
+
+    def summary(self):
+        return f"Consolidated output in {len(self.shards)} shards, listed in {os.path.basename(self.index_path)}"
+
+    def _shard_path(self, number):
+        suffix = COMPRESSION_SUFFIXES[self.compression]
+        if not self.sharded: return self.path + suffix
+        stem, extension = os.path.splitext(self.path)
+        return f"{stem}.{number:05d}{extension}{suffix}"
+
+    def _open_shard(self):
+        path = self._shard_path(len(self.shards) + 1)
+        fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=self.directory)
+        os.chmod(temp_path, 0o666 & ~self._umask) # mkstemp makes it private; give it the mode a plain open() would
+        self._created.update((os.path.abspath(path), temp_path))
+        return _Shard(path, temp_path, fd, self.compression)
+
+    def _hand_off(self, item):
+        """Queues `item` for the writer thread. False if the thread has stopped (so nobody would take it)."""
+        while self._thread.is_alive():
+            try:
+                self._handoff.put(item, timeout=HANDOFF_POLL_SECONDS)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _discard(self, filename, data, tag):
+        """Drops an output the stopped writer will never write, reporting it in `errors`."""
+        if data is None: return
+        self._report_error(filename, tag, f"Not written, the consolidated output stopped: {self.failure}")
+        if isinstance(data, StreamedOutput):
+            try: os.remove(data.path)
+            except OSError: pass
+
+    def _report_error(self, filename, tag, message):
+        with self._errors_lock:
+            self.errors.append((filename, tag, message))
+
+    def _abandon(self):
+        """After a failure of the writer thread: reports everything unwritten and removes the unfinished shard."""
+        while True:
+            try: item = self._handoff.get_nowait()
+            except queue.Empty: break
+            if item is not None: self._waiting[item[0]] = item[1:]
+        for seq in sorted(self._waiting):
+            self._discard(*self._waiting.pop(seq))
+        if self._file is not None:
+            shard, self._file = self._file, None
+            try: shard.close()
+            except Exception: pass
+            try: os.remove(shard.temp_path)
+            except OSError: pass
+
+    def _finish_shard(self, shard):
+        try:
+            shard.close()
+            os.replace(shard.temp_path, shard.path)
+        except OSError:
+            try: os.remove(shard.temp_path)
+            except OSError: pass
+            raise
+        self.shards.append(shard)
+
+    def _read_previous_shards(self):
+        """Names of the shards in the index of an earlier batch, if there is one."""
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                names = [entry['file'] for entry in json.load(f)['shards']]
+        except FileNotFoundError:
+            return set()
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"WARN: Ignoring unreadable shard index {self.index_path}: {e}")
+            return set()
+        # Only names this writer could have made, so an edited index can't point anywhere else
+        stem, extension = os.path.splitext(os.path.basename(self.path))
+        shard_name = re.compile(re.escape(stem) + r'\.\d{5}' + re.escape(extension) + r'(\.gz|\.xz|\.bz2)?')
+        return {name for name in names if isinstance(name, str) and shard_name.fullmatch(name)}
+
+    def _write_index(self):
+        shards = [{'file': os.path.basename(shard.path), 'characters': shard.characters, 'inputs': shard.inputs}
+                  for shard in self.shards]
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'format': INDEX_FORMAT, 'compression': self.compression, 'shards': shards}, f, indent=1)
+        os.replace(temp_path, self.index_path)
+
+    def _run(self):
+        try:
+            while True:
+                item = self._handoff.get()
+                if item is None: break
+                seq, filename, data, tag = item
+                self._waiting[seq] = (filename, data, tag)
+                if isinstance(data, str): self._waiting_chars += len(data)
+                while self._next in self._waiting:
+                    self._write_next()
+                if self._waiting_chars > REORDER_BUFFER_CHARS: self._spill()
+            for seq in sorted(self._waiting):
+                self._next = seq
+                self._write_next()
+        except Exception as e: # Stops the writer; `put` and `close` see it through `failure`
+            self.failure = e
+
+    def _shard_is_full(self):
+        shard = self._file
+        if not shard.inputs: return False # Even a file bigger than the limit gets written somewhere
+        return ((self.shard_files > 0 and len(shard.inputs) >= self.shard_files) or
+                (self.shard_chars > 0 and shard.characters >= self.shard_chars))
+
+    def _roll_shard(self):
+        shard, self._file = self._file, None # Closed from here on, whether or not the next one opens
+        self._finish_shard(shard)
+        self._file = self._open_shard()
+
+    def _write_next(self):
+        filename, data, tag = self._waiting[self._next]
+        if data is not None and self._shard_is_full():
+            self._roll_shard() # Raises to `_run` on failure, leaving this output waiting
+        del self._waiting[self._next]
+        self._next += 1
+        if data is None: return
+        if isinstance(data, str): self._waiting_chars -= len(data)
+        try:
+            self._file.inputs.append(filename)
+            write_consolidated_entry(self._file, filename, data, self.near_duplicates, self.near_duplicate_mode, self.output_format)
+        except Exception as e:
+            self._report_error(filename, tag, str(e))
+
+    def _spill(self):
+        """Moves the text of the outputs waiting in memory to temp files."""
+        for seq, (filename, data, tag) in list(self._waiting.items()):
+            if not isinstance(data, str): continue
+            try:
+                fd, spill_path = tempfile.mkstemp(prefix=".text_extractor_reorder_", suffix=".txt", dir=self.directory)
+                with os.fdopen(fd, 'w', encoding='utf-8') as f_spill: f_spill.write(data)
+            except OSError:
+                break # The disk is full or the like; what hasn't been moved stays in memory
+            self._waiting[seq] = (filename, StreamedOutput(spill_path), tag)
+            self._waiting_chars -= len(data)
@@ -0,0 +1,1668 @@
+"""
+GC Text Extractor - headless extraction engine.
+
+Everything needed to extract and filter text without a GUI: default settings,
+the file extractors, the segmentation/filtering pipeline (`process_text`) and
+URL extraction. This module deliberately imports nothing but the standard
+library at import time (python-docx and PyPDF2 are loaded on first use), so it
+can be embedded in ingestion workers without tkinter or a display.
+
+Settings are a plain dict keyed by the same names used in
+`text_extractor_settings.json` (e.g. 'min_words_general_var').
+
+    from text_stripper_engine import load_settings, extract_file, filter_text
+    settings = load_settings("text_extractor_settings.json")
+    status, data = extract_file("report.pdf", settings)
+    cleaned = filter_text(some_text, {"min_words_general_var": 5})
+"""
+
+import bisect
+import functools
+import hashlib
+import html
+import io
+import itertools
+import os
+import re
+import json
+import shutil
+import time
+import traceback
+
+from text_stripper_archives import input_size, open_input, output_stem
+from text_stripper_cache import get_raw_text_cache
+from text_stripper_sniff import sniff_text_file
+
+# --- Default values ---
+DEFAULT_PRE_FILTER_ENABLED = 1
+DEFAULT_FILE_PROCESSING_TIMEOUT = 60
+DEFAULT_MIN_WORDS_GENERAL = 11; DEFAULT_MIN_WORDS_SENTENCE = 5
+DEFAULT_ALPHANUM_ENABLED = 1; DEFAULT_ALPHANUM_THRESHOLD = 0.75
+DEFAULT_ALPHANUM_MIN_LEN_FOR_RATIO = 5; DEFAULT_ALPHANUM_ABS_COUNT_FALLBACK = 15
+DEFAULT_MAX_SEGMENT_LEN_BEFORE_NEWLINE_SPLIT = 350
+DEFAULT_PARA_FILTER_ENABLED = 0; DEFAULT_PARA_MIN_SENTENCES = 2; DEFAULT_PARA_MIN_WORDS = 20; DEFAULT_PARA_MIN_AVG_LEN = 5; DEFAULT_PARA_MAX_AVG_LEN = 40
+DEFAULT_REMOVE_CODE_BLOCKS = 1; DEFAULT_MIN_CODE_KEYWORDS = 1; DEFAULT_MIN_CODE_SYMBOLS = 2; DEFAULT_MIN_WORDS_CODE_CHECK = 2; DEFAULT_CODE_SYMBOL_DENSITY = 0.20
+DEFAULT_REMOVE_CONCAT_ENTIRELY = 1; DEFAULT_MIN_LEN_CONCAT_CHECK = 18; DEFAULT_MIN_SUB_WORDS_REPLACE = 3
+DEFAULT_REMOVE_SYMBOL_ENCLOSED = 1; DEFAULT_MAX_SYMBOLS_AROUND = 3
+DEFAULT_CUSTOM_REGEX_ENABLED = 0; DEFAULT_CUSTOM_REGEX_PATTERN = ""; DEFAULT_CUSTOM_REGEX_MODE = "remove_matches"; DEFAULT_CUSTOM_REGEX_CASE_SENSITIVE = 0
+DEFAULT_CUSTOM_FILE_EXTENSIONS = ""
+DEFAULT_OUTPUT_FILE_SUFFIX = "_processed"
+DEFAULT_EXTRACT_URLS_ENABLED = 0
+DEFAULT_FILE_PROCESSING_MODE = "specified"
+DEFAULT_INCLUDE_EXTENSIONS = ""
+DEFAULT_IGNORE_EXTENSIONS = ".zip, .rar, .7z, .exe, .dll, .msi, .pkg, .dmg, .iso, .img, .jpg, .jpeg, .png, .gif, .bmp, .tiff, .webp, .mp3, .wav, .aac, .ogg, .mp4, .mov, .avi, .mkv, .webm"
+DEFAULT_REMOVE_NUMBER_HEAVY = 0; DEFAULT_NUMBER_RATIO_THRESHOLD = 0.5; DEFAULT_MIN_DIGITS_FOR_RATIO_CHECK = 5; DEFAULT_MAX_CONSECUTIVE_DIGITS = 8; DEFAULT_MIN_WORDS_TO_EXEMPT_DIGITS = 10
+DEFAULT_CODE_SYMBOL_MODE = "all"; DEFAULT_CODE_CUSTOM_SYMBOLS = ""
+DEFAULT_HTML_STRIPPING_MODE = "strip_tags"
+DEFAULT_CONSOLIDATE_OUTPUT = 0
+DEFAULT_CONSOLIDATED_OUTPUT_FILENAME = "consolidated_output.txt"
+DEFAULT_PAGES_TO_PROCESS = 0
+DEFAULT_WORKER_COUNT = 0 # 0 = one worker process per CPU core
+DEFAULT_INCLUDE_HIDDEN_FILES = 0; DEFAULT_FOLLOW_SYMLINKS = 0
+DEFAULT_READ_ARCHIVES = 0 # 1 = process the members of zip/tar archives instead of skipping the archive
+DEFAULT_SKIP_UNCHANGED_FILES = 0
+DEFAULT_STREAM_THRESHOLD_MB = 64
+DEFAULT_PDF_SHARD_PAGES = 200 # PDFs with more pages are split across workers (0 = never)
+DEFAULT_SEGMENT_LOCATIONS = 0 # Start each kept segment with its character offsets (and page, for PDFs) in the extracted text
+DEFAULT_NUMPY_SCORING = 1 # Score large segment lists in bulk with NumPy, if it is installed
+DEFAULT_SEGMENT_MEMO = 1 # Decide each distinct segment text once per file
+DEFAULT_ADAPTIVE_FILTER_ORDER = 1 # Run the reject checks cheapest-per-rejection first, as measured on the first segments
+DEFAULT_COLLAPSE_DUPLICATE_SEGMENTS = 0 # Keep only the first copy of a segment that repeats within a file
+DEFAULT_NEAR_DUPLICATE_MODE = "off" # Consolidated output: "drop" or "flag" segments near-duplicating an earlier file's
+DEFAULT_NEAR_DUPLICATE_THRESHOLD = 0.8 # Word 3-gram similarity at which a segment is a near-duplicate
+DEFAULT_CONSOLIDATED_SHARD_MB = 0 # Consolidated output: start a new shard after this many MB of text (0 = never)
+DEFAULT_CONSOLIDATED_SHARD_FILES = 0 # ... or after this many files (0 = never)
+DEFAULT_CONSOLIDATED_COMPRESSION = "none" # Or "gzip", "xz", "bz2"
+DEFAULT_OUTPUT_FORMAT = "text" # Or "jsonl": one JSON record per kept segment and per URL
+DEFAULT_RAW_CACHE_ENABLED = 0; DEFAULT_RAW_CACHE_DIR = "text_extractor_cache"; DEFAULT_RAW_CACHE_MAX_MB = 1024
+
+CODE_KEYWORDS_LIST = {
+    'var', 'let', 'const', 'function', 'return', 'this', 'class', 'constructor', 'new', 'Error', 'throw', 'if', 'else', 'for', 'while', 'switch', 'case',
+'break', 'continue', 'try', 'catch', 'finally', 'import', 'export', 'super', 'extends', 'async', 'await', 'yield', 'true', 'false', 'null', 'undefined',
+'typeof', 'instanceof', 'void', 'delete', 'prototype', 'static', 'get', 'set', 'document', 'window', 'JSON', 'Map', 'Promise', 'Object', 'Array',
+'String', 'Number', 'Boolean', 'Symbol', '=>', '...','require','module','exports','googletag','pubads','slot',
+'addEventListener','removeEventListener','querySelector','getElementById','getElementsByClassName',
+'createElement','appendChild','innerHTML','outerHTML','style','console','log','warn','info',
+'ajax','fetch','XMLHttpRequest','jQuery','angular','react','vue', 'webpack', 'chunk', 'props', 'state',
+    'div', 'span', 'p', 'a', 'img', 'ul', 'ol', 'li', 'table', 'tr', 'td', 'th', 'form', 'input', 'button', 'href', 'src', 'alt', 'class', 'id', 'rel',
+'target', 'type', 'value', 'placeholder', 'html', 'head', 'body', 'title', 'meta', 'link', 'script'
+}
+CODE_SYMBOLS_SET = {
+    '{', '}', '(', ')', '[', ']', ';', '=', '<', '>', '%', ':', '-', '+', '!', '#', '$', '&', '*', '|', '~', '`', '/', '\\', '@', '^', '_'
+}
+
+SETTINGS_FILENAME = "text_extractor_settings.json"
+# Bump whenever a change to this module can alter the output for the same input and settings
+ENGINE_VERSION = 2
+# Bump whenever an extractor can return different raw text for the same file (invalidates the raw text cache)
+EXTRACTOR_VERSION = 1
+# Every persistent setting and its default. The GUIs build their Tk variables from this.
+DEFAULT_SETTINGS = {
+    'pre_filter_enabled_var': DEFAULT_PRE_FILTER_ENABLED,
+    'html_stripping_mode_var': DEFAULT_HTML_STRIPPING_MODE,
+    'min_words_general_var': DEFAULT_MIN_WORDS_GENERAL,
+    'min_words_sentence_var': DEFAULT_MIN_WORDS_SENTENCE,
+    'alphanum_filter_enabled_var': DEFAULT_ALPHANUM_ENABLED,
+    'alphanum_threshold_var': DEFAULT_ALPHANUM_THRESHOLD,
+    'alnum_min_len_for_ratio_var': DEFAULT_ALPHANUM_MIN_LEN_FOR_RATIO,
+    'alnum_abs_count_fallback_var': DEFAULT_ALPHANUM_ABS_COUNT_FALLBACK,
+    'max_segment_len_var': DEFAULT_MAX_SEGMENT_LEN_BEFORE_NEWLINE_SPLIT,
+    'para_filter_enabled_var': DEFAULT_PARA_FILTER_ENABLED,
+    'para_min_sentences_var': DEFAULT_PARA_MIN_SENTENCES,
+    'para_min_words_var': DEFAULT_PARA_MIN_WORDS,
+    'para_min_avg_len_var': DEFAULT_PARA_MIN_AVG_LEN,
+    'para_max_avg_len_var': DEFAULT_PARA_MAX_AVG_LEN,
+    'file_processing_mode_var': DEFAULT_FILE_PROCESSING_MODE,
+    'custom_file_extensions_var': DEFAULT_CUSTOM_FILE_EXTENSIONS,
+    'include_extensions_var': DEFAULT_INCLUDE_EXTENSIONS,
+    'ignore_extensions_var': DEFAULT_IGNORE_EXTENSIONS,
+    'custom_output_suffix_var': DEFAULT_OUTPUT_FILE_SUFFIX,
+    'extract_urls_enabled_var': DEFAULT_EXTRACT_URLS_ENABLED,
+    'remove_number_heavy_var': DEFAULT_REMOVE_NUMBER_HEAVY,
+    'number_ratio_threshold_var': DEFAULT_NUMBER_RATIO_THRESHOLD,
+    'min_digits_for_ratio_check_var': DEFAULT_MIN_DIGITS_FOR_RATIO_CHECK,
+    'max_consecutive_digits_var': DEFAULT_MAX_CONSECUTIVE_DIGITS,
+    'min_words_to_exempt_digits_var': DEFAULT_MIN_WORDS_TO_EXEMPT_DIGITS,
+    'remove_code_blocks_var': DEFAULT_REMOVE_CODE_BLOCKS,
+    'min_code_keywords_var': DEFAULT_MIN_CODE_KEYWORDS,
+    'min_code_symbols_var': DEFAULT_MIN_CODE_SYMBOLS,
+    'min_words_code_check_var': DEFAULT_MIN_WORDS_CODE_CHECK,
+    'code_symbol_density_var': DEFAULT_CODE_SYMBOL_DENSITY,
+    'code_symbol_mode_var': DEFAULT_CODE_SYMBOL_MODE,
+    'code_custom_symbols_var': DEFAULT_CODE_CUSTOM_SYMBOLS,
+    'remove_concat_entirely_var': DEFAULT_REMOVE_CONCAT_ENTIRELY,
+    'min_len_concat_check_var': DEFAULT_MIN_LEN_CONCAT_CHECK,
+    'min_sub_words_replace_var': DEFAULT_MIN_SUB_WORDS_REPLACE,
+    'remove_symbol_enclosed_var': DEFAULT_REMOVE_SYMBOL_ENCLOSED,
+    'max_symbols_around_var': DEFAULT_MAX_SYMBOLS_AROUND,
+    'custom_regex_enabled_var': DEFAULT_CUSTOM_REGEX_ENABLED,
+    'custom_regex_pattern_var': DEFAULT_CUSTOM_REGEX_PATTERN,
+    'custom_regex_mode_var': DEFAULT_CUSTOM_REGEX_MODE,
+    'custom_regex_case_sensitive_var': DEFAULT_CUSTOM_REGEX_CASE_SENSITIVE,
+    'consolidate_output_enabled_var': DEFAULT_CONSOLIDATE_OUTPUT,
+    'consolidated_output_filename_var': DEFAULT_CONSOLIDATED_OUTPUT_FILENAME,
+    'pages_to_process_var': DEFAULT_PAGES_TO_PROCESS,
+    'file_processing_timeout_var': DEFAULT_FILE_PROCESSING_TIMEOUT,
+    'worker_count_var': DEFAULT_WORKER_COUNT,
+    'include_hidden_files_var': DEFAULT_INCLUDE_HIDDEN_FILES,
+    'follow_symlinks_var': DEFAULT_FOLLOW_SYMLINKS,
+    'read_archives_var': DEFAULT_READ_ARCHIVES,
+    'skip_unchanged_files_var': DEFAULT_SKIP_UNCHANGED_FILES,
+    'stream_threshold_mb_var': DEFAULT_STREAM_THRESHOLD_MB,
+    'pdf_shard_pages_var': DEFAULT_PDF_SHARD_PAGES,
+    'numpy_scoring_var': DEFAULT_NUMPY_SCORING,
+    'segment_locations_var': DEFAULT_SEGMENT_LOCATIONS,
+    'segment_memo_var': DEFAULT_SEGMENT_MEMO,
+    'adaptive_filter_order_var': DEFAULT_ADAPTIVE_FILTER_ORDER,
+    'collapse_duplicate_segments_var': DEFAULT_COLLAPSE_DUPLICATE_SEGMENTS,
+    'near_duplicate_mode_var': DEFAULT_NEAR_DUPLICATE_MODE,
+    'near_duplicate_threshold_var': DEFAULT_NEAR_DUPLICATE_THRESHOLD,
+    'consolidated_shard_mb_var': DEFAULT_CONSOLIDATED_SHARD_MB,
+    'consolidated_shard_files_var': DEFAULT_CONSOLIDATED_SHARD_FILES,
+    'consolidated_compression_var': DEFAULT_CONSOLIDATED_COMPRESSION,
+    'output_format_var': DEFAULT_OUTPUT_FORMAT,
+    'raw_cache_enabled_var': DEFAULT_RAW_CACHE_ENABLED,
+    'raw_cache_dir_var': DEFAULT_RAW_CACHE_DIR,
+    'raw_cache_max_mb_var': DEFAULT_RAW_CACHE_MAX_MB,
+}
+
+URL_PATTERN = re.compile(r'(?:(?:https?|ftp):\/\/|www\.)(?:(?:[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?\.)+[a-zA-Z]{2,12}|localhost|\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})(?::\d+)?(?:[/?#][^\s"<>()\[\]]*|\b)', re.IGNORECASE)
+
+
+# --- Settings ---
+def make_settings(overrides=None):
+    """Returns a complete settings dict: the defaults, updated with any known keys from `overrides`."""
+    settings = dict(DEFAULT_SETTINGS)
+    if overrides:
+        for name, value in overrides.items():
+            if name in DEFAULT_SETTINGS:
+                # Keep the default's type so a JSON 1.0 doesn't turn an int setting into a float
+                try: settings[name] = type(DEFAULT_SETTINGS[name])(value)
+                except (TypeError, ValueError): print(f"WARN: Could not use {name} value '{value}'. Using its default.")
+    return settings
+
+def load_settings(path=SETTINGS_FILENAME):
+    """Loads a settings JSON file (as saved by the GUI) on top of the defaults."""
+    if not path or not os.path.exists(path):
+        return make_settings()
+    with open(path, 'r', encoding='utf-8') as f:
+        return make_settings(json.load(f))
+
+
+# --- Extension routing ---
+def parse_extension_list(raw_extensions):
+    """'.log, .MD, txt' -> {'.log', '.md'} (entries must start with a dot)."""
+    return frozenset(ext.strip().lower() for ext in raw_extensions.split(',') if ext.strip().startswith('.'))
+
+class ExtensionRouter:
+    """
+    The include/ignore/custom extension settings, parsed once. `route` tells which
+    extractor handles a file: 'docx', 'pdf', 'text', or None for an unknown type.
+    """
+    def __init__(self, settings):
+        self.ignore_extensions = parse_extension_list(settings['ignore_extensions_var'])
+        self.text_extensions = parse_extension_list(settings['custom_file_extensions_var']) | {'.txt'}
+        # Not filtered by a leading dot, so an empty list still matches files without an extension
+        self.include_extensions = frozenset(ext.strip().lower() for ext in settings['include_extensions_var'].split(','))
+        self.all_files = settings['file_processing_mode_var'] == "all_files"
+
+    def is_ignored(self, filepath):
+        return os.path.splitext(filepath)[1].lower() in self.ignore_extensions
+
+    def route(self, filepath):
+        extension = os.path.splitext(filepath)[1].lower()
+        if extension == '.docx': return 'docx'
+        if extension == '.pdf': return 'pdf'
+        if extension in self.text_extensions or extension in self.include_extensions or self.all_files: return 'text'
+        return None
+
+_ROUTER_SETTINGS = ('ignore_extensions_var', 'custom_file_extensions_var', 'include_extensions_var', 'file_processing_mode_var')
+_router_cache = {}
+def get_extension_router(settings):
+    """Returns the ExtensionRouter for these settings, built only once per distinct set of extension settings."""
+    key = tuple(settings[name] for name in _ROUTER_SETTINGS)
+    router = _router_cache.get(key)
+    if router is None:
+        if len(_router_cache) > 32: _router_cache.clear()
+        router = _router_cache[key] = ExtensionRouter(settings)
+    return router
+
+
+# --- Extractors ---
+def extract_text_from_txt(filepath, encoding='utf-8'):
+    try:
+        with io.TextIOWrapper(open_input(filepath), encoding=encoding, errors='ignore') as f: return f.read()
+    except Exception: return ""
+def extract_text_from_docx(filepath):
+    try:
+        from docx import Document
+        with open_input(filepath, in_memory=True) as f: doc = Document(f)
+        return '\n'.join([para.text for para in doc.paragraphs])
+    except Exception: return ""
+def _open_pdf(f, pages_to_process):
+    """Returns (reader, number of pages to process), or (None, 0) for a PDF we can't decrypt."""
+    import PyPDF2
+    reader = PyPDF2.PdfReader(f)
+    if reader.is_encrypted:
+        try: reader.decrypt('')
+        except Exception: return None, 0
+    num_pages = len(reader.pages)
+    page_limit = pages_to_process if pages_to_process > 0 and pages_to_process < num_pages else num_pages
+    return reader, page_limit
+
+def pdf_page_count(filepath, pages_to_process=0):
+    """Number of pages extract_text_from_pdf would read."""
+    with open_input(filepath, in_memory=True) as f:
+        return _open_pdf(f, pages_to_process)[1]
+
+def iter_pdf_pages(filepath, pages_to_process=0, first_page=0, stop_page=None, page_index=None):
+    """
+    Yields each page's text (plus a newline) as soon as it is extracted, optionally
+    only for pages first_page to stop_page - 1, recording the pages in `page_index`
+    if given. Raises on unreadable PDFs.
+    """
+    with open_input(filepath, in_memory=True) as f:
+        reader, page_limit = _open_pdf(f, pages_to_process)
+        for i in range(first_page, page_limit if stop_page is None else min(stop_page, page_limit)):
+            page_text = reader.pages[i].extract_text()
+            if page_text:
+                if page_index is not None: page_index.add_page(i + 1, len(page_text) + 1)
+                yield page_text + "\n"
+
+def extract_text_from_pdf(filepath, pages_to_process=0, page_index=None):
+    try:
+        return "".join(iter_pdf_pages(filepath, pages_to_process, page_index=page_index))
+    except Exception as e:
+        print(f"ERROR: Exception in extract_text_from_pdf: {e}")
+        return ""
+
+
+# --- Filters ---
+class SegmentStats:
+    """What the per-segment filters need to know about a segment, gathered by segment_stats."""
+    __slots__ = ('length', 'alnum', 'digits', 'symbols', 'words', 'word_count', 'max_digit_run', 'ends_sentence')
+
+class _CharClassTable(dict):
+    """
+    str.translate table mapping each character to one class letter: E (decimal digit,
+    what the regex \\d matches), D (other digit), L (other alphanumeric), S (non-alphanumeric
+    symbol from `symbol_set`) or O (anything else). Filled in as new characters turn up.
+    """
+    def __init__(self, symbol_set):
+        super().__init__()
+        self.symbol_set = symbol_set
+        self.alnum_symbols = {char for char in symbol_set if char.isalnum()} # Only possible with custom symbols
+        # bytes.translate table for pure-ASCII segments, which is much faster than str.translate
+        self.ascii_table = ''.join(self[code] for code in range(128)).encode('ascii') + b'O' * 128
+    def __missing__(self, code):
+        char = chr(code)
+        if char.isdecimal(): char_class = 'E'
+        elif char.isdigit(): char_class = 'D'
+        elif char.isalnum(): char_class = 'L'
+        elif char in self.symbol_set: char_class = 'S'
+        else: char_class = 'O'
+        self[code] = char_class
+        return char_class
+
+_char_class_tables = {}
+def _char_class_table(symbol_set):
+    key = frozenset(symbol_set)
+    table = _char_class_tables.get(key)
+    if table is None:
+        if len(_char_class_tables) > 32: _char_class_tables.clear()
+        table = _char_class_tables[key] = _CharClassTable(key)
+    return table
+
+_DECIMAL_RUN = re.compile(r'E+')
+
+def segment_stats(segment_text, symbol_set, digit_runs=True):
+    """
+    Gathers everything the per-segment filters look at. The segment is translated to
+    class letters in one C-level pass, and each count is then a str.count on that.
+    The longest digit run costs a regex scan, so it is left at 0 unless `digit_runs`.
+    """
+    return add_char_class_stats(segment_word_stats(segment_text), segment_text, symbol_set, digit_runs)
+
+def segment_word_stats(segment_text):
+    """The part of segment_stats that only splits the text: words, word count and terminal punctuation."""
+    stats = SegmentStats()
+    stats.words = segment_text.split(' ') # Words as the code, number and concatenation filters see them
+    stats.word_count = len(segment_text.split()) # Words as the sentence/length filter sees them
+    stats.ends_sentence = segment_text.rstrip().endswith(('.', '!', '?'))
+    return stats
+
+def add_char_class_stats(stats, segment_text, symbol_set, digit_runs=True):
+    """Completes segment_word_stats `stats` with the character class counts (the translate pass)."""
+    table = _char_class_table(symbol_set)
+    if segment_text.isascii():
+        classes = segment_text.encode('ascii').translate(table.ascii_table).decode('ascii')
+    else:
+        classes = segment_text.translate(table)
+    non_alnum_symbols = classes.count('S')
+    decimals = classes.count('E')
+    stats.length = len(segment_text)
+    stats.alnum = stats.length - non_alnum_symbols - classes.count('O')
+    stats.digits = decimals + classes.count('D')
+    stats.symbols = non_alnum_symbols
+    if table.alnum_symbols: stats.symbols += sum(map(table.alnum_symbols.__contains__, segment_text))
+    stats.max_digit_run = max(map(len, _DECIMAL_RUN.findall(classes))) if decimals and digit_runs else 0
+    return stats
+
+def get_alphanumeric_ratio(text_segment):
+    if not text_segment: return 0.0
+    return sum(map(str.isalnum, text_segment)) / len(text_segment)
+def is_sentence_or_long_sequence(stats, min_words_general_sequence=6, min_words_punctuated_sentence=2):
+    if stats.word_count == 0: return False
+    if stats.ends_sentence and stats.word_count >= min_words_punctuated_sentence: return True
+    if stats.word_count >= min_words_general_sequence: return True
+    return False
+_LOWER_UPPER = re.compile(r"([a-z0-9])([A-Z])")
+_ACRONYM_WORD = re.compile(r"([A-Z]+)([A-Z][a-z])")
+_LETTER_DIGIT = re.compile(r"([a-zA-Z])(\d)")
+_DIGIT_LETTER = re.compile(r"(\d)([a-zA-Z])")
+def split_concatenated_token(token):
+    if not token: return []
+    s1 = _LOWER_UPPER.sub(r"\1 \2", token)
+    s2 = _ACRONYM_WORD.sub(r"\1 \2", s1)
+    s3 = _LETTER_DIGIT.sub(r"\1 \2", s2)
+    s4 = _DIGIT_LETTER.sub(r"\1 \2", s3)
+    return [word for word in s4.split(' ') if word]
+
+# The positions where split_concatenated_token's four substitutions put a space, as one pattern:
+# lower/digit -> upper, the last upper of a run before a lower, letter -> digit, digit -> letter
+_SUB_WORD_BOUNDARY = r"(?<=[a-z0-9])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])|(?<=[a-zA-Z])(?=\d)|(?<=\d)(?=[a-zA-Z])"
+_SUB_WORD_BOUNDARIES = re.compile(_SUB_WORD_BOUNDARY)
+_LAST_SUB_WORD_BOUNDARY = re.compile(r"(?s:.*)(?:" + _SUB_WORD_BOUNDARY + ")") # Greedy, so it backs off from the end
+CONCAT_TOKEN_MEMO_SIZE = 4096 # Distinct tokens whose concat_token_ends result is remembered
+CONCAT_TOKEN_MEMO_MAX_LEN = 256 # Longer tokens (base64 blobs and the like) rarely repeat and are not remembered
+
+def _concat_token_ends(token, min_sub_words):
+    if not token: return None
+    first_end, sub_words = len(token), 1
+    for match in _SUB_WORD_BOUNDARIES.finditer(token):
+        if sub_words == 1: first_end = match.start()
+        sub_words += 1
+        if sub_words >= min_sub_words: break
+    if sub_words < min_sub_words: return None
+    if sub_words == 1: return token, token
+    return token[:first_end], token[_LAST_SUB_WORD_BOUNDARY.match(token).end():]
+
+_concat_token_ends_memo = functools.lru_cache(maxsize=CONCAT_TOKEN_MEMO_SIZE)(_concat_token_ends)
+
+def concat_token_ends(token, min_sub_words):
+    """
+    (first, last) of split_concatenated_token(token) if it has at least `min_sub_words`
+    sub-words, else None. The case and digit boundaries are found in one regex scan that
+    stops at the `min_sub_words`th sub-word, and the last one is found from the end.
+    Results for tokens up to CONCAT_TOKEN_MEMO_MAX_LEN characters are kept in an LRU memo.
+    """
+    if len(token) > CONCAT_TOKEN_MEMO_MAX_LEN: return _concat_token_ends(token, min_sub_words)
+    return _concat_token_ends_memo(token, min_sub_words)
+def code_symbol_set(symbol_mode, custom_symbols):
+    """The characters the code filter counts as symbols for this symbol mode."""
+    if symbol_mode == "only":
+        return set(custom_symbols)
+    elif symbol_mode == "except":
+        return CODE_SYMBOLS_SET - set(custom_symbols)
+    return CODE_SYMBOLS_SET
+def is_code_like_segment(stats, min_keywords, min_symbols, min_words_check, symbol_density_thresh):
+    """`stats` must come from segment_stats with the code_symbol_set for the current symbol mode."""
+    words_in_segment = stats.words
+    if len(words_in_segment) < min_words_check: return False
+    keyword_hits = sum(1 for word in words_in_segment if word in CODE_KEYWORDS_LIST or word.lower() in CODE_KEYWORDS_LIST)
+    segment_len = stats.length
+    if segment_len == 0: return False
+    symbol_hits = stats.symbols
+    current_symbol_density = symbol_hits / segment_len
+    cond1 = (keyword_hits >= min_keywords and symbol_hits >= min_symbols)
+    cond2 = (current_symbol_density > symbol_density_thresh)
+    cond3 = (symbol_hits > (min_symbols * 2.5) and keyword_hits >= max(0, min_keywords // 2) )
+    if cond1 or cond2 or cond3: return True
+    return False
+def is_number_heavy_segment(stats, ratio_thresh, min_digits_for_ratio, max_consecutive, min_words_exempt):
+    if min_words_exempt > 0 and len(stats.words) >= min_words_exempt:
+        return False
+    segment_len = stats.length
+    if segment_len == 0: return False
+    if max_consecutive > 0:
+        if stats.max_digit_run >= max_consecutive:
+            return True
+    if ratio_thresh > 0:
+        digit_count = stats.digits
+        if digit_count >= min_digits_for_ratio:
+            digit_ratio = digit_count / segment_len
+            if digit_ratio > ratio_thresh:
+                return True
+    return False
+def fails_alphanumeric_check(stats, min_len_for_ratio, threshold, abs_count_fallback):
+    segment_len = stats.length
+    if segment_len == 0: return True
+    if segment_len < min_len_for_ratio:
+        return stats.alnum == 0
+    ratio = stats.alnum / segment_len
+    return ratio < threshold and stats.alnum < abs_count_fallback
+def fails_sentence_check(stats, min_words_general_sequence, min_words_punctuated_sentence):
+    return not is_sentence_or_long_sequence(stats, min_words_general_sequence, min_words_punctuated_sentence)
+_SENTENCE_TERMINATORS = re.compile(r'[.!?]+')
+def paragraph_counts(para_text):
+    """(sentences, words) as counted by is_valid_paragraph."""
+    # A simple way to count sentences is by splitting by standard terminators
+    sentences = _SENTENCE_TERMINATORS.split(para_text)
+    sentences = [s.strip() for s in sentences if s.strip()]
+    return len(sentences), len(para_text.split())
+def paragraph_counts_valid(num_sentences, num_words, min_sentences, min_words, min_avg_len, max_avg_len):
+    if num_sentences < min_sentences:
+        return False
+    if num_words < min_words:
+        return False
+    if num_sentences > 0:
+        avg_sentence_len = num_words / num_sentences
+        if avg_sentence_len < min_avg_len or avg_sentence_len > max_avg_len:
+            return False
+    return True
+def is_valid_paragraph(para_text, min_sentences, min_words, min_avg_len, max_avg_len):
+    num_sentences, num_words = paragraph_counts(para_text)
+    return paragraph_counts_valid(num_sentences, num_words, min_sentences, min_words, min_avg_len, max_avg_len)
+
+# What may start a sentence after . ! or ? and whitespace; shared with the streaming pipeline
+_SENTENCE_START = r'[A-Z"\'\(\[\d“‘\u2022\u2023\u25E6\u2043\u2219*+-]'
+_TAG_PATTERN = re.compile(r'<[^>]+>')
+_WHITESPACE_RUN = re.compile(r'\s+')
+_TAGS_AND_WHITESPACE = re.compile(r'(?:<[^>]+>|\s)+')
+
+def strip_html(text, html_mode):
+    """
+    STAGE 0: HTML stripping. 'strip_tags' also collapses all whitespace, so the result is one line;
+    'parse_html' keeps block-level breaks as newlines (see HtmlTextParser).
+    """
+    if html_mode == "strip_tags":
+        # Surgically remove tags, keep content
+        processed_text = _TAG_PATTERN.sub(' ', text) # Replace tag with space
+        return _WHITESPACE_RUN.sub(' ', processed_text).strip() # Normalize spaces
+    elif html_mode == "parse_html":
+        return HtmlTextParser().close(text)[0]
+    elif html_mode == "discard_segments":
+        # Pre-split by newline, then filter
+        return "\n".join([line for line in text.splitlines() if not _TAG_PATTERN.search(line)])
+    return text # Mode is "off"
+
+class OffsetMap:
+    """
+    Maps offsets in the text stage 0 produced back to the text it was made from. Each run of
+    characters copied over unchanged starts at an anchor (processed start, source start), and
+    an offset maps through the last anchor at or before it.
+    """
+    def __init__(self, base=0):
+        self.processed_starts = [0]
+        self.source_starts = [base]
+
+    def add(self, processed_start, source_start):
+        self.processed_starts.append(processed_start)
+        self.source_starts.append(source_start)
+
+    def source_offset(self, offset):
+        i = bisect.bisect_right(self.processed_starts, offset) - 1
+        return self.source_starts[i] + offset - self.processed_starts[i]
+
+    def source_span(self, start, end):
+        """Source (start, end) of a non-empty span; the end is mapped through its last character."""
+        return self.source_offset(start), self.source_offset(end - 1) + 1
+
+    def add_slice(self, other, start, end, at):
+        """Adds the anchors of other[start:end], for that text copied to offset `at` of this map's text."""
+        self.add(at, other.source_offset(start))
+        i = bisect.bisect_right(other.processed_starts, start)
+        while i < len(other.processed_starts) and other.processed_starts[i] < end:
+            self.add(at + other.processed_starts[i] - start, other.source_starts[i])
+            i += 1
+
+class PageIndex:
+    """Where each PDF page starts in the extracted text, filled in as pages are read."""
+    def __init__(self):
+        self.starts, self.numbers = [], []
+        self.length = 0 # Characters recorded so far
+
+    def add_page(self, number, length):
+        if self.numbers and number <= self.numbers[-1]: return # Pages read a second time
+        self.starts.append(self.length)
+        self.numbers.append(number)
+        self.length += length
+
+    def page_at(self, offset):
+        i = bisect.bisect_right(self.starts, offset) - 1
+        return self.numbers[i] if i >= 0 else None
+
+    def pairs(self):
+        """[(page number, length), ...], e.g. for storing alongside the text."""
+        ends = self.starts[1:] + [self.length]
+        return [(number, end - start) for number, start, end in zip(self.numbers, self.starts, ends)]
+
+def strip_html_mapped(text, html_mode, base=0):
+    """strip_html, also returning an OffsetMap from the result to `text` (whose offset 0 is `base` in the source)."""
+    offset_map = OffsetMap(base)
+    if html_mode == "strip_tags":
+        # Every run of tags and whitespace becomes one space, which is what strip_html's two passes do
+        words, position, processed_len = [], 0, 0
+        for match in _TAGS_AND_WHITESPACE.finditer(text):
+            if match.start() > position:
+                if words: processed_len += 1
+                offset_map.add(processed_len, base + position)
+                words.append(text[position:match.start()])
+                processed_len += match.start() - position
+            position = match.end()
+        if position < len(text):
+            if words: processed_len += 1
+            offset_map.add(processed_len, base + position)
+            words.append(text[position:])
+        return ' '.join(words), offset_map
+    elif html_mode == "discard_segments":
+        kept_lines, position, processed_len = [], 0, 0
+        for line in text.splitlines(True):
+            content = line.splitlines()[0] if line else line
+            if not _TAG_PATTERN.search(content):
+                if kept_lines: processed_len += 1
+                offset_map.add(processed_len, base + position)
+                kept_lines.append(content)
+                processed_len += len(content)
+            position += len(line)
+        return "\n".join(kept_lines), offset_map
+    elif html_mode == "parse_html":
+        return HtmlTextParser(base, mapped=True).close(text)
+    return text, offset_map
+
+# "parse_html": one left-to-right pass over tags, comments and character references.
+# Text between them is copied with its whitespace collapsed, <script>/<style> bodies and
+# comments are skipped, and tags become breaks: block-level tags a paragraph break (so
+# stage 1 sees the page's paragraphs), <br> a line break, cell and form tags a space and
+# inline tags nothing at all, as in a browser ("<b>bold</b>ly" -> "boldly").
+_HTML_TOKEN = re.compile(r'<(?:(/?)([A-Za-z][^\s/>]*)[^>]*>|!--|[!?][^>]*>)|&(?:#\d+|#[xX][0-9a-fA-F]+|[A-Za-z][A-Za-z0-9]*);?')
+_HTML_TAG_START = re.compile(r'<(?:[A-Za-z/!?]|\Z)')
+_HTML_PARTIAL_ENTITY = re.compile(r'&#?[xX]?[0-9A-Za-z]*')
+_HTML_COMMENT_END = re.compile(r'--!?>')
+_HTML_SKIPPED_ELEMENTS = {'script': re.compile(r'</script\s*>', re.I), 'style': re.compile(r'</style\s*>', re.I)}
+_HTML_BLOCK_TAGS = frozenset((
+    'address', 'article', 'aside', 'blockquote', 'body', 'caption', 'center', 'dd', 'details', 'dialog',
+    'div', 'dl', 'dt', 'fieldset', 'figcaption', 'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5',
+    'h6', 'head', 'header', 'hr', 'html', 'legend', 'li', 'main', 'menu', 'nav', 'noscript', 'ol', 'p',
+    'pre', 'section', 'summary', 'table', 'tbody', 'tfoot', 'thead', 'title', 'tr', 'ul'))
+_HTML_SPACE_TAGS = frozenset(('td', 'th', 'img', 'input', 'button', 'select', 'option', 'textarea', 'label'))
+_NON_WHITESPACE = re.compile(r'\S+')
+_HTML_BREAKS = ('', ' ', '\n', '\n\n') # By break level: none, space, line, paragraph
+
+class HtmlTextParser:
+    """
+    Text of an HTML document for "parse_html", fed a chunk at a time. `feed` returns the text of
+    the complete paragraphs so far, as a (text, OffsetMap or None) pair, or None if there are
+    none yet; `close` returns the rest. The pieces, joined with blank lines, are the text of the
+    whole document, so each can be segmented on its own. Anything that may continue in the next
+    chunk (a tag, character reference or skipped element) is held back until it is complete.
+    """
+    def __init__(self, base=0, mapped=False):
+        self.raw, self.raw_start = '', base # Held-back text and its offset in the source
+        self.skip_until = None # Pattern ending the comment or <script>/<style> being skipped
+        self.out, self.out_len = [], 0 # Text not returned yet
+        self.offset_map = OffsetMap() if mapped else None
+        self.level = 0 # Strongest break since the last text
+        self.started = False # Breaks before the first text are dropped
+        self.cut = None # (index in self.out, offset) of the last paragraph break
+
+    def feed(self, text):
+        self._parse(self.raw + text, False)
+        if self.cut is None: return None
+        index, offset = self.cut
+        self.cut = None
+        piece = ''.join(self.out[:index])
+        del self.out[:index + 1]
+        self.out_len -= offset + 2
+        piece_map = None
+        if self.offset_map is not None:
+            piece_map, rest = OffsetMap(), OffsetMap()
+            i = bisect.bisect_left(self.offset_map.processed_starts, offset)
+            piece_map.processed_starts, piece_map.source_starts = self.offset_map.processed_starts[:i], self.offset_map.source_starts[:i]
+            rest.processed_starts = [start - offset - 2 for start in self.offset_map.processed_starts[i:]]
+            rest.source_starts = self.offset_map.source_starts[i:]
+            self.offset_map = rest
+        return piece, piece_map
+
+    def close(self, text=''):
+        """The text after the last piece `feed` returned, parsing `text` first (which makes a one-shot parse)."""
+        self._parse(self.raw + text, True)
+        return ''.join(self.out), self.offset_map
+
+    def _parse(self, raw, final):
+        end = len(raw)
+        if not final:
+            # A tag runs to the first '>' after its '<', so any '<' past the last '>' may still be one
+            unclosed = _HTML_TAG_START.search(raw, raw.rfind('>') + 1)
+            if unclosed is not None: end = unclosed.start()
+            last_amp = raw.rfind('&', 0, end)
+            if last_amp != -1 and _HTML_PARTIAL_ENTITY.match(raw, last_amp).end() == end: end = last_amp
+        pos = 0
+        while pos < end:
+            if self.skip_until is not None:
+                close = self.skip_until.search(raw, pos)
+                if close is not None:
+                    pos = close.end()
+                    self.skip_until = None
+                    continue
+                if final:
+                    pos = len(raw)
+                else: # Keep only what the end of the skipped part may start in
+                    last_open = raw.rfind('<', max(pos, len(raw) - 64))
+                    pos = max(pos, min(len(raw) - 2, last_open if last_open != -1 else len(raw)))
+                end = pos
+                break
+            token = _HTML_TOKEN.search(raw, pos, end)
+            if token is None:
+                self._add_text(raw[pos:end], self.raw_start + pos)
+                pos = end
+                break
+            if token.start() > pos: self._add_text(raw[pos:token.start()], self.raw_start + pos)
+            pos = token.end()
+            name = token.group(2)
+            if name is not None:
+                name = name.lower()
+                if name in _HTML_BLOCK_TAGS: self.level = 3
+                elif name == 'br': self.level = max(self.level, 2)
+                elif name in _HTML_SPACE_TAGS: self.level = max(self.level, 1)
+                elif name in _HTML_SKIPPED_ELEMENTS and not token.group(1) and not token.group().endswith('/>'):
+                    self.skip_until = _HTML_SKIPPED_ELEMENTS[name]
+            elif token.group() == '<!--':
+                self.skip_until = _HTML_COMMENT_END
+            elif token.group()[0] == '&':
+                entity = token.group()
+                decoded = html.unescape(entity)
+                literal = 0 # "&copyright" is "©right": the end of the name is copied over as it is
+                if not entity.endswith(';'):
+                    while literal < len(decoded) - 1 and decoded[-1 - literal] == entity[-1 - literal]: literal += 1
+                self._add_text(decoded[:len(decoded) - literal], self.raw_start + token.start())
+                if literal: self._add_text(decoded[-literal:], self.raw_start + pos - literal)
+        self.raw = raw[pos:]
+        self.raw_start += pos
+
+    def _add_text(self, run, source):
+        if not self.level and run[0].isspace(): self.level = 1
+        if self.offset_map is None:
+            text = ' '.join(run.split())
+            if text: self._emit(text, source)
+        else:
+            for word in _NON_WHITESPACE.finditer(run):
+                if word.start() and not self.level: self.level = 1
+                self._emit(word.group(), source + word.start())
+        if not self.level and run[-1].isspace(): self.level = 1
+
+    def _emit(self, text, source):
+        if self.level:
+            if self.started:
+                if self.level == 3: self.cut = (len(self.out), self.out_len)
+                self.out.append(_HTML_BREAKS[self.level])
+                self.out_len += len(_HTML_BREAKS[self.level])
+            self.level = 0
+        self.started = True
+        if self.offset_map is not None: self.offset_map.add(self.out_len, source)
+        self.out.append(text)
+        self.out_len += len(text)
+
+# Paragraphs are separated by whitespace runs holding two line feeds, and sentences by . ! or ?
+# followed by whitespace and a _SENTENCE_START character. One pass finds both kinds of break
+# (group 1 is a sentence break's whitespace, which makes it a paragraph break if it holds two line
+# feeds). Every branch starts with a literal character, which lets the regex engine skip ahead.
+_SEGMENT_BOUNDARY = re.compile(r'[.!?](\s+)(?=' + _SENTENCE_START + r')|\n\s*\n\s*')
+_LEADING_WHITESPACE = re.compile(r'\s*')
+# A line without its surrounding whitespace; every character splitlines() breaks at is whitespace
+_LINE_CONTENT = re.compile(r'\S(?:[^\n\r\v\f\x1c-\x1e\x85\u2028\u2029]*\S)?')
+
+def line_spans(text, start=0, end=None):
+    """(start, end) of each non-blank line of text[start:end], as `line.strip()` for `line` in splitlines()."""
+    return [match.span() for match in _LINE_CONTENT.finditer(text, start, len(text) if end is None else end)]
+
+def segment_spans(processed_text, params, check_paragraphs=True):
+    """
+    STAGE 1 as (start, end) offsets into `processed_text`: paragraph and sentence segmentation
+    in one regex pass, without copying any text (except paragraphs the paragraph filter reads).
+    A sentence candidate containing a line feed is split into its lines if it is longer than
+    the max segment length or is the only candidate of its paragraph.
+    """
+    max_segment_len = params['max_segment_len_var']
+    check_paragraphs = check_paragraphs and params['para_filter_enabled_var']
+    spans = []
+    text_end = len(processed_text)
+    while text_end and processed_text[text_end - 1].isspace(): text_end -= 1
+    position = _LEADING_WHITESPACE.match(processed_text).end()
+    if position >= text_end: return spans
+    sentences = [] # (start, end) of the current paragraph's sentence candidates
+
+    def end_paragraph(para_end):
+        para_start = sentences[0][0]
+        if check_paragraphs and not is_valid_paragraph(processed_text[para_start:para_end],
+                                                       params['para_min_sentences_var'], params['para_min_words_var'],
+                                                       params['para_min_avg_len_var'], params['para_max_avg_len_var']):
+            return # Discard this entire paragraph
+        # A paragraph ending in . ! or ? never counts as a single candidate, even with no break inside
+        single_candidate = len(sentences) == 1 and processed_text[para_end - 1] not in '.!?'
+        for start, end in sentences:
+            if (single_candidate or end - start > max_segment_len) and processed_text.find('\n', start, end) != -1:
+                spans.extend(line_spans(processed_text, start, end))
+            else:
+                spans.append((start, end))
+
+    for match in _SEGMENT_BOUNDARY.finditer(processed_text, position, text_end):
+        if match.lastindex: # Sentence break, after the terminator
+            whitespace_start = match.start() + 1
+            sentences.append((position, whitespace_start))
+            if processed_text.count('\n', whitespace_start, match.end()) >= 2:
+                end_paragraph(whitespace_start)
+                sentences.clear()
+        else: # Paragraph break; the whitespace before its first line feed belongs to the run too
+            candidate_end = match.start()
+            while processed_text[candidate_end - 1].isspace(): candidate_end -= 1
+            sentences.append((position, candidate_end))
+            end_paragraph(candidate_end)
+            sentences.clear()
+        position = match.end()
+    sentences.append((position, text_end))
+    end_paragraph(text_end)
+    return spans
+
+def split_segments(processed_text, params, check_paragraphs=True):
+    """STAGE 1: paragraph and sentence segmentation (without process_text's whole-text fallback)."""
+    return [processed_text[start:end] for start, end in segment_spans(processed_text, params, check_paragraphs)]
+
+ADAPTIVE_ORDER_SAMPLE = 2000 # Segments measured with every check before a plan's check order is fixed
+ADAPTIVE_ORDER_REMEASURE = 200000 # Segments after which the order is measured again, in case the input has changed
+_WORD_STATS_CHECKS = frozenset([fails_sentence_check]) # Checks that only read segment_word_stats fields
+
+class CheckOrder:
+    """
+    The order a FilterPlan runs its reject checks in. A segment is dropped if any check
+    rejects it, so the order never changes which segments are kept, only how soon a
+    dropped one stops costing time. While `sampling`, every check runs (timed) on every
+    segment and each segment's pattern of rejections is counted; after ADAPTIVE_ORDER_SAMPLE
+    segments the order that would have cost least on that sample is used for the next
+    ADAPTIVE_ORDER_REMEASURE segments. Checks that only need word counts may go before
+    the character class pass (`before_classes`), so the segments they drop never pay for it.
+    What it measures is mutable, so each file gets its own (FilterPlan.new_check_order) and
+    one is never shared between threads.
+    """
+    def __init__(self, checks, adaptive):
+        self.checks = checks
+        self.before_classes = () # Run on segment_word_stats alone
+        self.after_classes = checks # Run once add_char_class_stats has filled in the rest
+        self.adaptive = adaptive
+        self._start_sampling()
+
+    def _start_sampling(self):
+        self.sampling = self.adaptive
+        self.sampled = self.ordered = 0
+        self.class_stats_time = 0.0
+        self.check_times = [0.0] * len(self.checks)
+        self.masks = {} # Bit mask of the checks that rejected a segment -> number of such segments
+
+    def sample(self, segment_text, symbol_set, digit_runs):
+        """Runs every check on one segment, timing them; returns (stats, whether it is dropped)."""
+        clock = time.perf_counter
+        stats = segment_word_stats(segment_text)
+        started = clock()
+        add_char_class_stats(stats, segment_text, symbol_set, digit_runs)
+        previous = clock()
+        self.class_stats_time += previous - started
+        mask = 0
+        for position, (check, args) in enumerate(self.checks):
+            if check(stats, *args): mask |= 1 << position
+            now = clock()
+            self.check_times[position] += now - previous
+            previous = now
+        self.masks[mask] = self.masks.get(mask, 0) + 1
+        self.sampled += 1
+        if self.sampled >= ADAPTIVE_ORDER_SAMPLE: self._settle()
+        return stats, mask != 0
+
+    def _sample_cost(self, order, split):
+        """Time the sampled segments would have taken with checks `order`, the first `split` before the class pass."""
+        class_cost = self.class_stats_time / self.sampled
+        costs = [check_time / self.sampled for check_time in self.check_times]
+        total = 0.0
+        for mask, count in self.masks.items():
+            cost = 0.0
+            for position, index in enumerate(order):
+                if position == split: cost += class_cost
+                cost += costs[index]
+                if mask >> index & 1: break
+            total += cost * count
+        return total
+
+    def _settle(self):
+        best_cost, best = None, None
+        for order in itertools.permutations(range(len(self.checks))): # At most 4 checks, so 24 orders
+            word_only = 0
+            while word_only < len(order) and self.checks[order[word_only]][0] in _WORD_STATS_CHECKS: word_only += 1
+            for split in range(word_only + 1):
+                cost = self._sample_cost(order, split)
+                if best_cost is None or cost < best_cost: best_cost, best = cost, (order, split)
+        order, split = best
+        ordered = tuple(self.checks[index] for index in order)
+        self.before_classes, self.after_classes = ordered[:split], ordered[split:]
+        self.sampling = False
+
+    def count(self, num_segments):
+        """Records segments checked in the fixed order, measuring again once there have been enough."""
+        self.ordered += num_segments
+        if self.adaptive and self.ordered >= ADAPTIVE_ORDER_REMEASURE: self._start_sampling()
+
+    def describe(self):
+        """'fails_sentence_check, character counts, is_code_like_segment', or how far sampling has got."""
+        if self.sampling: return f"measuring ({self.sampled} of {ADAPTIVE_ORDER_SAMPLE} segments)"
+        names = [check.__name__ for check, _ in self.before_classes] + ["character counts"]
+        return ", ".join(names + [check.__name__ for check, _ in self.after_classes])
+
+class FilterPlan:
+    """
+    The per-segment filter settings of one settings snapshot, compiled: regexes built,
+    the code symbol set frozen, and disabled reject checks left out of `checks`.
+    Build it with get_filter_plan so every segment of every file in a batch shares one. A plan
+    is never changed once built; the measured check order lives in a CheckOrder per file.
+    """
+    def __init__(self, params):
+        self.symbol_set = frozenset(code_symbol_set(params['code_symbol_mode_var'], params['code_custom_symbols_var']))
+        self.digit_runs = bool(params['remove_number_heavy_var'] and params['max_consecutive_digits_var'] > 0)
+        # (check, args) pairs in filter order; check(stats, *args) is True if the segment is dropped
+        checks = []
+        if params['remove_code_blocks_var']:
+            checks.append((is_code_like_segment, (params['min_code_keywords_var'], params['min_code_symbols_var'],
+                                                  params['min_words_code_check_var'], params['code_symbol_density_var'])))
+        if params['remove_number_heavy_var']:
+            checks.append((is_number_heavy_segment, (params['number_ratio_threshold_var'], params['min_digits_for_ratio_check_var'],
+                                                     params['max_consecutive_digits_var'], params['min_words_to_exempt_digits_var'])))
+        if params['alphanum_filter_enabled_var']:
+            checks.append((fails_alphanumeric_check, (params['alnum_min_len_for_ratio_var'], params['alphanum_threshold_var'],
+                                                      params['alnum_abs_count_fallback_var'])))
+        checks.append((fails_sentence_check, (params['min_words_general_var'], params['min_words_sentence_var'])))
+        self.checks = tuple(checks)
+        self.adaptive_order = bool(params['adaptive_filter_order_var'])
+        self.numpy_scoring = bool(params['numpy_scoring_var'])
+        self.min_len_concat = params['min_len_concat_check_var']
+        self.min_sub_words = params['min_sub_words_replace_var']
+        self.remove_concat_entirely = bool(params['remove_concat_entirely_var'])
+        self.symbol_enclosed_pattern = None
+        if params['remove_symbol_enclosed_var']:
+            max_sym = max(1, params['max_symbols_around_var'])
+            self.symbol_enclosed_pattern = re.compile(r'(?<!\w)\W{1,' + str(max_sym) + r'}\w+\W{1,' + str(max_sym) + r'}(?!\w)')
+        self.custom_regex = None
+        self.custom_regex_mode = params['custom_regex_mode_var']
+        if params['custom_regex_enabled_var'] and params['custom_regex_pattern_var']:
+            try:
+                flags = 0 if params['custom_regex_case_sensitive_var'] else re.IGNORECASE
+                self.custom_regex = re.compile(params['custom_regex_pattern_var'], flags)
+            except re.error: pass
+
+    def new_check_order(self):
+        """A fresh CheckOrder for this plan's checks, for one file (or one call)."""
+        return CheckOrder(self.checks, self.adaptive_order)
+
+_FILTER_PLAN_SETTINGS = (
+    'code_symbol_mode_var', 'code_custom_symbols_var', 'remove_code_blocks_var', 'min_code_keywords_var',
+    'min_code_symbols_var', 'min_words_code_check_var', 'code_symbol_density_var', 'remove_number_heavy_var',
+    'number_ratio_threshold_var', 'min_digits_for_ratio_check_var', 'max_consecutive_digits_var',
+    'min_words_to_exempt_digits_var', 'alphanum_filter_enabled_var', 'alnum_min_len_for_ratio_var',
+    'alphanum_threshold_var', 'alnum_abs_count_fallback_var', 'min_words_general_var', 'min_words_sentence_var',
+    'min_len_concat_check_var', 'min_sub_words_replace_var', 'remove_concat_entirely_var',
+    'remove_symbol_enclosed_var', 'max_symbols_around_var', 'custom_regex_enabled_var', 'custom_regex_pattern_var',
+    'custom_regex_mode_var', 'custom_regex_case_sensitive_var', 'numpy_scoring_var', 'adaptive_filter_order_var')
+_plan_cache = {}
+def get_filter_plan(params):
+    """Returns the FilterPlan for these settings, compiled only once per distinct set of filter settings."""
+    key = tuple(params[name] for name in _FILTER_PLAN_SETTINGS)
+    plan = _plan_cache.get(key)
+    if plan is None:
+        if len(_plan_cache) > 32: _plan_cache.clear()
+        plan = _plan_cache[key] = FilterPlan(params)
+    return plan
+
+NUMPY_SCORING_MIN_SEGMENTS = 256 # Shorter lists are cheaper to check one segment at a time
+SEGMENT_MEMO_MAX_ENTRIES = 50000 # Decisions a SegmentMemo holds before it starts over
+SEGMENT_MEMO_MAX_LEN = 2000 # Longer segments rarely repeat and are not memoized
+def _rewrite_segment(segment_text, words, plan):
+    """Concatenated-token and symbol-enclosed rewrites of a segment that passed the checks ('' if nothing is left)."""
+    min_len_concat = plan.min_len_concat
+    if len(segment_text) >= min_len_concat:
+        if words is None: words = segment_text.split(' ')
+        if any(len(word_token) >= min_len_concat for word_token in words):
+            processed_words_for_segment = []
+            for word_token in words:
+                if len(word_token) >= min_len_concat:
+                    ends = concat_token_ends(word_token, plan.min_sub_words)
+                    if ends is not None:
+                        if not plan.remove_concat_entirely: processed_words_for_segment.append(f"{ends[0]}...{ends[1]}")
+                        continue
+                processed_words_for_segment.append(word_token)
+            segment_text = ' '.join(processed_words_for_segment)
+        # Otherwise there is nothing to rewrite, and joining the words would give the same text
+    if plan.symbol_enclosed_pattern is not None:
+        segment_text = ' '.join(plan.symbol_enclosed_pattern.sub('', segment_text).split())
+    return segment_text if segment_text.strip() else ''
+
+def _decide_segments(segments_for_filtering, plan, order):
+    """STAGES 2 and 3 for each segment: its output text, or None if it is dropped."""
+    # --- STAGE 2: Per-Segment Filtering ---
+    outputs = [None] * len(segments_for_filtering)
+    reject_flags = None
+    if plan.numpy_scoring and len(segments_for_filtering) >= NUMPY_SCORING_MIN_SEGMENTS:
+        import text_stripper_vector # Loaded (with NumPy) only once there is a list worth scoring in bulk
+        reject_flags = text_stripper_vector.reject_flags(segments_for_filtering, plan)
+    if reject_flags is not None:
+        for index, segment_text in enumerate(segments_for_filtering):
+            if reject_flags[index]: continue
+            modified_segment = _rewrite_segment(segment_text, None, plan)
+            if modified_segment: outputs[index] = modified_segment
+    else:
+        symbol_set, digit_runs = plan.symbol_set, plan.digit_runs
+        start = 0
+        while order.sampling and start < len(segments_for_filtering):
+            segment_text = segments_for_filtering[start]
+            stats, dropped = order.sample(segment_text, symbol_set, digit_runs)
+            if not dropped:
+                modified_segment = _rewrite_segment(segment_text, stats.words, plan)
+                if modified_segment: outputs[start] = modified_segment
+            start += 1
+        before_classes, after_classes = order.before_classes, order.after_classes
+        for index in range(start, len(segments_for_filtering)):
+            segment_text = segments_for_filtering[index]
+            stats = segment_word_stats(segment_text) # Every check below reads from this
+            for check, args in before_classes:
+                if check(stats, *args): break
+            else:
+                if after_classes: add_char_class_stats(stats, segment_text, symbol_set, digit_runs)
+                for check, args in after_classes:
+                    if check(stats, *args): break
+                else:
+                    modified_segment = _rewrite_segment(segment_text, stats.words, plan)
+                    if modified_segment: outputs[index] = modified_segment
+        order.count(len(segments_for_filtering) - start)
+
+    # --- STAGE 3: Custom Regex ---
+    compiled_regex = plan.custom_regex
+    if compiled_regex is None:
+        return outputs
+    if plan.custom_regex_mode == "remove_matches":
+        for index, segment in enumerate(outputs):
+            if segment is not None: outputs[index] = compiled_regex.sub('', segment).strip() or None
+    elif plan.custom_regex_mode == "keep_matches":
+        for index, segment in enumerate(outputs):
+            if segment is not None and not compiled_regex.search(segment): outputs[index] = None
+    return outputs
+
+class SegmentMemo:
+    """
+    Filter decisions by segment text, for the boilerplate (page headers and footers, menus,
+    repeated log lines) that makes the same segment come up again and again in one file.
+    Scope one to a file (process_text and stream_filter_text make their own) or pass one
+    in to share it across a batch. With `collapse_duplicates`, a kept segment whose output
+    text was already kept is dropped.
+    """
+    def __init__(self, max_entries=SEGMENT_MEMO_MAX_ENTRIES, collapse_duplicates=False):
+        self.max_entries = max_entries
+        self.decisions = {} # Segment text -> output text, or None if dropped
+        self.kept = set() if collapse_duplicates else None # Digests of the output texts kept so far
+        self.lookups = self.hits = self.collapsed = 0
+
+    def decide(self, segments_for_filtering, plan, check_order):
+        """_decide_segments, with each distinct segment text decided only once."""
+        outputs = [None] * len(segments_for_filtering)
+        pending = {} # Segment text not decided yet -> its indexes
+        decisions = self.decisions
+        for index, segment_text in enumerate(segments_for_filtering):
+            if segment_text in decisions:
+                outputs[index] = decisions[segment_text]
+                self.hits += 1
+            else:
+                indexes = pending.get(segment_text)
+                if indexes is None: pending[segment_text] = [index]
+                else:
+                    indexes.append(index)
+                    self.hits += 1
+        self.lookups += len(segments_for_filtering)
+        if pending:
+            for (segment_text, indexes), output in zip(pending.items(), _decide_segments(list(pending), plan, check_order)):
+                for index in indexes: outputs[index] = output
+                if len(segment_text) <= SEGMENT_MEMO_MAX_LEN and self.max_entries > 0:
+                    if len(decisions) >= self.max_entries: decisions.clear()
+                    decisions[segment_text] = output
+        return outputs
+
+    def is_repeat(self, output):
+        """True if `output` was kept before (and so is to be collapsed); records it otherwise."""
+        digest = hashlib.blake2b(output.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+        if digest in self.kept:
+            self.collapsed += 1
+            return True
+        self.kept.add(digest)
+        return False
+
+    def summary(self):
+        """'1200 of 5000 segments (24.0%) were repeats decided from the memo', plus what was collapsed."""
+        line = f"{self.hits} of {self.lookups} segments ({self.hits * 100 / max(self.lookups, 1):.1f}%) were repeats decided from the memo"
+        if self.kept is not None: line += f", {self.collapsed} duplicates collapsed"
+        return line
+
+def segment_memo_for(params):
+    """A new per-file SegmentMemo if the settings call for one, else None."""
+    collapse = bool(params['collapse_duplicate_segments_var'])
+    if not params['segment_memo_var'] and not collapse: return None
+    return SegmentMemo(SEGMENT_MEMO_MAX_ENTRIES if params['segment_memo_var'] else 0, collapse)
+
+def filter_segments_indexed(segments_for_filtering, params, memo=None, check_order=None):
+    """
+    STAGES 2 and 3: per-segment filters, then the custom regex. Returns (index, output text) for
+    each segment that survives. With a SegmentMemo, repeated segments are decided only once.
+    Pass the file's CheckOrder when a file's segments are filtered over several calls, so the
+    check order measured on the first ones carries over; otherwise each call measures its own.
+    """
+    plan = get_filter_plan(params)
+    if check_order is None: check_order = plan.new_check_order()
+    if memo is None:
+        outputs = _decide_segments(segments_for_filtering, plan, check_order)
+    else:
+        outputs = memo.decide(segments_for_filtering, plan, check_order)
+        if memo.kept is not None:
+            return [(index, output) for index, output in enumerate(outputs) if output is not None and not memo.is_repeat(output)]
+    return [(index, output) for index, output in enumerate(outputs) if output is not None]
+
+def filter_segments(segments_for_filtering, params, memo=None, check_order=None):
+    """STAGES 2 and 3: per-segment filters, then the custom regex. Returns the segments that survive."""
+    return [segment for _, segment in filter_segments_indexed(segments_for_filtering, params, memo, check_order)]
+
+def filter_spans(text, spans, params, memo=None, check_order=None):
+    """filter_segments for segments given as (start, end) spans of `text`: returns (start, end, output text) for each survivor."""
+    kept = filter_segments_indexed([text[start:end] for start, end in spans], params, memo, check_order)
+    return [spans[index] + (segment,) for index, segment in kept]
+
+LOCATION_PREFIX = re.compile(r'\[(?:page \d+, )?chars \d+-\d+\] ') # What format_location puts in front of a segment
+def format_location(start, end, page_index=None):
+    """'[page 3, chars 1200-1350]' (the page only when known) for a kept segment's source span."""
+    page = page_index.page_at(start) if page_index is not None else None
+    return f"[page {page}, chars {start}-{end}]" if page is not None else f"[chars {start}-{end}]"
+
+def _located_segments(processed_text, offset_map, kept, page_index):
+    """Output text of `kept` (filter_spans results) with each segment's location in the source text in front."""
+    return [format_location(*offset_map.source_span(start, end), page_index) + " " + segment for start, end, segment in kept]
+
+# --- JSONL output ---
+# With the output format set to "jsonl", an output holds one JSON object per line instead
+# of text: {"type": "segment", "file", "index", "page", "start", "end", "text", "stats"} for
+# every kept segment (start/end are offsets in the extracted text, page is None unless known),
+# then {"type": "url", "file", "url"} for every detected URL. "raw" records carry the text
+# when the pre-filter is off, and a salvaged output ends with a "partial" record.
+OUTPUT_EXTENSIONS = {'text': '.txt', 'jsonl': '.jsonl'}
+_encode_record = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+
+def record_line(record):
+    """One JSONL line (with its newline) for a record dict."""
+    return _encode_record(record) + "\n"
+
+def segment_record_stats(segment_text, plan):
+    """What the reject checks measured on a kept segment, for its JSONL record."""
+    stats = segment_stats(segment_text, plan.symbol_set, plan.digit_runs)
+    length = max(stats.length, 1)
+    record_stats = {'words': stats.word_count, 'chars': stats.length, 'ends_sentence': stats.ends_sentence,
+                    'alnum_ratio': round(stats.alnum / length, 4), 'digit_ratio': round(stats.digits / length, 4),
+                    'symbol_ratio': round(stats.symbols / length, 4)}
+    # The costlier counts only for the filters that use them
+    if plan.digit_runs: record_stats['max_digit_run'] = stats.max_digit_run
+    if plan.checks[0][0] is is_code_like_segment:
+        record_stats['code_keywords'] = sum(1 for word in stats.words if word in CODE_KEYWORDS_LIST or word.lower() in CODE_KEYWORDS_LIST)
+    return record_stats
+
+class SegmentRecords:
+    """Builds the JSONL records of one file's output, numbering its kept segments in order."""
+    def __init__(self, source, params, page_index=None):
+        self.source = source
+        self.plan = get_filter_plan(params)
+        self.page_index = page_index
+        self.count = 0
+
+    def segments(self, processed_text, offset_map, kept):
+        """Lines for `kept` (filter_spans results on `processed_text`), located through `offset_map`."""
+        lines = []
+        for start, end, segment in kept:
+            source_start, source_end = offset_map.source_span(start, end)
+            page = self.page_index.page_at(source_start) if self.page_index is not None else None
+            lines.append(record_line({'type': 'segment', 'file': self.source, 'index': self.count, 'page': page,
+                                      'start': source_start, 'end': source_end, 'text': segment,
+                                      'stats': segment_record_stats(processed_text[start:end], self.plan)}))
+            self.count += 1
+        return lines
+
+    def unfiltered(self, text, start):
+        """Line for text passed through as is (pre-filter off), found at `start` in the extracted text."""
+        if not text.strip(): return ""
+        return record_line({'type': 'raw', 'file': self.source, 'start': start, 'end': start + len(text), 'text': text})
+
+def url_records(source, normalized_for_dedupe):
+    """Lines for the URLs gathered by collect_urls, in format_urls order."""
+    _, unique_display_urls = format_urls(normalized_for_dedupe)
+    return "".join(record_line({'type': 'url', 'file': source, 'url': url}) for url in unique_display_urls)
+
+def process_text(full_text, params, page_index=None, memo=None, source=None):
+    """
+    The full segmentation and filtering pipeline. `params` must be a complete settings dict.
+    With the segment locations setting on, every kept segment starts with its location in
+    `full_text` (and its page, from `page_index`, for PDFs). Repeated segments are decided
+    through `memo`, or through a memo of this text's own if the settings ask for one.
+    With the JSONL output format, returns the segment records instead, naming `source` as the file.
+    """
+    records = SegmentRecords(source, params, page_index) if params['output_format_var'] == 'jsonl' else None
+    if params.get('pre_filter_enabled_var', 1) == 0:
+        return full_text if records is None else records.unfiltered(full_text, 0)
+    if not full_text or not full_text.strip(): return ""
+    if memo is None: memo = segment_memo_for(params)
+    if params['segment_locations_var'] or records is not None:
+        processed_full_text, offset_map = strip_html_mapped(full_text, params['html_stripping_mode_var'])
+        spans = segment_spans(processed_full_text, params) or line_spans(processed_full_text)
+        kept = filter_spans(processed_full_text, spans, params, memo)
+        if records is not None: return "".join(records.segments(processed_full_text, offset_map, kept))
+        return "\n\n".join(_located_segments(processed_full_text, offset_map, kept, page_index))
+    processed_full_text = strip_html(full_text, params['html_stripping_mode_var'])
+    segments_for_filtering = split_segments(processed_full_text, params)
+    if not segments_for_filtering:
+        segments_for_filtering = [processed_full_text[start:end] for start, end in line_spans(processed_full_text)]
+    return "\n\n".join(filter_segments(segments_for_filtering, params, memo))
+
+_URL_TRAILING_PUNCTUATION = re.compile(r'[.,;!?"\')\]>]$')
+_PARENTHESIZED = re.compile(r'\(.*?\)')
+def collect_urls(text_content, normalized_for_dedupe):
+    """Adds the URLs found in `text_content` to `normalized_for_dedupe` (normalized key -> display form, first seen wins)."""
+    for match in URL_PATTERN.finditer(text_content):
+        url = match.group(0)
+        # Remove trailing punctuation that might be part of the sentence, not the URL
+        cleaned_url = _URL_TRAILING_PUNCTUATION.sub('', url)
+        # Handle cases like 'word(url)'
+        cleaned_url = _PARENTHESIZED.sub('', cleaned_url)
+        u_stripped = cleaned_url.strip().rstrip('/')
+        u_lower_key = u_stripped.lower()
+        if u_lower_key.startswith('www.') and not (u_lower_key.startswith('http://') or u_lower_key.startswith('https://')):
+            u_display = 'http://' + u_stripped
+            u_norm_key = 'http://' + u_lower_key
+        else:
+            u_display = u_stripped
+            u_norm_key = u_lower_key
+        if u_norm_key not in normalized_for_dedupe:
+            normalized_for_dedupe[u_norm_key] = u_display
+
+def format_urls(normalized_for_dedupe):
+    unique_display_urls = sorted(list(normalized_for_dedupe.values()), key=lambda x: (x.lower(), x))
+    if unique_display_urls:
+        url_list_string = "\n\n--- Detected URLs ---\n" + "\n".join(unique_display_urls)
+        return url_list_string, unique_display_urls
+    return "", []
+
+def extract_and_format_urls(text_content):
+    if not text_content: return "", []
+    normalized_for_dedupe = {}
+    collect_urls(text_content, normalized_for_dedupe)
+    return format_urls(normalized_for_dedupe)
+
+
+# --- Streaming (bounded memory) ---
+# A file is streamed by cutting its text only where no stage of process_text looks
+# across the cut, then running the normal stages on each piece:
+#  * "off"/"discard_segments": cuts fall inside a blank-line run, which is always a
+#    paragraph break, and paragraphs are segmented independently.
+#  * "parse_html": pieces are cut at whitespace outside any tag and fed to one
+#    HtmlTextParser, which hands back its text a run of whole paragraphs at a time.
+#  * "strip_tags": the whole text becomes one line, so pieces are cut at whitespace
+#    outside any tag, normalized, and regrouped at sentence breaks.
+# Either way a cut is at whitespace, which no URL can span. The output is identical
+# to process_text on the whole text; memory is bounded by the chunk size (or by the
+# longest paragraph/sentence, if that is larger). PDFs are streamed a page at a time,
+# and output is flushed after every chunk, so a worker killed on timeout leaves the
+# output of the pages it finished.
+STREAM_CHUNK_SIZE = 4 * 1024 * 1024 # Characters read at a time
+PARTIAL_OUTPUT_NOTE = "\n\n--- Partial output: {reason}; the rest of the file is missing ---\n"
+_PARAGRAPH_CUT = re.compile(r'\n[ \t]*\n')
+_NORMALIZED_SENTENCE_BREAK = re.compile(r'(?<=[.!?]) (?=' + _SENTENCE_START + r')')
+
+def iter_text_file_chunks(filepath, chunk_size=STREAM_CHUNK_SIZE, encoding='utf-8'):
+    """Reads a text file like extract_text_from_txt, but a chunk at a time."""
+    with io.TextIOWrapper(open_input(filepath), encoding=encoding, errors='ignore') as f:
+        for chunk in iter(lambda: f.read(chunk_size), ''):
+            yield chunk
+
+def _cut_at_paragraph_breaks(chunks):
+    """Re-cuts chunks so that every cut falls right after a blank-line run's newline."""
+    pending, tail = [], '' # tail: end of the pending text that a break could start in
+    for chunk in chunks:
+        if not chunk: continue
+        region = tail + chunk
+        cut = -1
+        for match in _PARAGRAPH_CUT.finditer(region): cut = match.end()
+        if cut == -1:
+            pending.append(chunk)
+        else:
+            cut -= len(tail) # tail alone never holds a whole break, so the cut is inside chunk
+            pending.append(chunk[:cut])
+            yield ''.join(pending)
+            region = chunk[cut:]
+            pending = [region]
+        tail = region[max(0, len(region.rstrip(' \t')) - 1):]
+    rest = ''.join(pending)
+    if rest: yield rest
+
+def _cut_outside_tags(chunks):
+    """Re-cuts chunks so that every cut falls right after whitespace that isn't inside a <tag>."""
+    pending, open_tag = [], False # open_tag: the pending text has a '<' with no '>' after it
+    for chunk in chunks:
+        if not chunk: continue
+        cut, limit = -1, len(chunk)
+        while limit > 0:
+            space = max(chunk.rfind(' ', 0, limit), chunk.rfind('\n', 0, limit), chunk.rfind('\t', 0, limit))
+            if space == -1: break
+            last_open = chunk.rfind('<', 0, space)
+            if last_open != -1:
+                if chunk.find('>', last_open + 1, space) != -1: cut = space + 1; break
+                limit = last_open # Everything after this '<' may still be inside a tag
+            elif not open_tag or chunk.find('>', 0, space) != -1: cut = space + 1; break
+            else: break
+        if cut == -1:
+            pending.append(chunk)
+            rest = chunk
+        else:
+            pending.append(chunk[:cut])
+            yield ''.join(pending)
+            rest = chunk[cut:]
+            pending, open_tag = [rest], False
+        last_open, last_close = rest.rfind('<'), rest.rfind('>')
+        if last_open > last_close: open_tag = True
+        elif last_close > last_open: open_tag = False
+    rest = ''.join(pending)
+    if rest: yield rest
+
+def _group_sentences(normalized_pieces):
+    """
+    Joins normalized (single-spaced, stripped) pieces with a space and re-cuts them at sentence breaks.
+    Pieces are (text, OffsetMap or None) pairs, and so are the groups.
+    """
+    pending, last_char = [], '' # Slices of pieces: (text, offset map, start, end)
+
+    def group():
+        text = ' '.join([piece[start:end] for piece, _, start, end in pending])
+        if pending[0][1] is None: return text, None
+        offset_map, at = OffsetMap(), 0
+        for _, piece_map, start, end in pending:
+            offset_map.add_slice(piece_map, start, end, at)
+            at += end - start + 1
+        return text, offset_map
+
+    for piece, piece_map in normalized_pieces:
+        if not piece: continue
+        region = last_char + ' ' + piece if pending else piece
+        offset = len(region) - len(piece)
+        cut = -1
+        for match in _NORMALIZED_SENTENCE_BREAK.finditer(region): cut = match.start()
+        if cut == -1:
+            pending.append((piece, piece_map, 0, len(piece)))
+        elif cut < offset: # The break is the space joining the pieces
+            yield group()
+            pending = [(piece, piece_map, 0, len(piece))]
+        else:
+            cut -= offset
+            pending.append((piece, piece_map, 0, cut))
+            yield group()
+            pending = [(piece, piece_map, cut + 1, len(piece))]
+        last_char = piece[-1]
+    if pending: yield group()
+
+def stream_filter_text(chunk_source, params, write, collect_url_list=False, page_index=None, memo=None, source=None):
+    """
+    Runs the extract_file pipeline (process_text, plus the URL list if `collect_url_list`)
+    over text too large to hold in memory, passing the output to `write` piece by piece.
+    `chunk_source()` must return a fresh iterator of text chunks on every call: a
+    couple of rare cases need a second pass. Returns (wrote_content, saw_text).
+    """
+    html_mode = params['html_stripping_mode_var']
+    records = SegmentRecords(source, params, page_index) if params['output_format_var'] == 'jsonl' else None
+    locate = bool(params['segment_locations_var']) or records is not None
+    if memo is None: memo = segment_memo_for(params)
+    check_order = get_filter_plan(params).new_check_order() # One for the whole file, which is filtered piece by piece
+    urls = {}
+    saw_text = wrote_content = False
+
+    def raw_pieces(first_pass):
+        """(piece, offset of the piece in the whole text); the pieces are consecutive, so offsets just add up."""
+        nonlocal saw_text
+        cut = _cut_outside_tags if html_mode in ("strip_tags", "parse_html") else _cut_at_paragraph_breaks
+        base = 0
+        for piece in cut(chunk_source()):
+            if first_pass:
+                saw_text = True
+                if collect_url_list: collect_urls(piece, urls)
+            yield piece, base
+            base += len(piece)
+
+    def stage0(pieces, mapped):
+        if html_mode == "parse_html": # The parser carries tags and breaks over from piece to piece
+            parser = HtmlTextParser(mapped=mapped)
+            for piece, _ in pieces:
+                parsed = parser.feed(piece)
+                if parsed is not None: yield parsed
+            yield parser.close()
+            return
+        for piece, base in pieces:
+            yield strip_html_mapped(piece, html_mode, base) if mapped else (strip_html(piece, html_mode), None)
+
+    def filtered(text, offset_map, spans):
+        if offset_map is None: return filter_segments([text[start:end] for start, end in spans], params, memo, check_order)
+        kept = filter_spans(text, spans, params, memo, check_order)
+        if records is not None: return records.segments(text, offset_map, kept)
+        return _located_segments(text, offset_map, kept, page_index)
+
+    def emit(segments):
+        nonlocal wrote_content
+        if records is not None: # Record lines carry their own newlines; one write for the lot
+            if segments:
+                write("".join(segments))
+                wrote_content = True
+            return
+        for segment in segments:
+            if wrote_content: write("\n\n")
+            write(segment)
+            wrote_content = True
+
+    if params.get('pre_filter_enabled_var', 1) == 0:
+        for piece, base in raw_pieces(True):
+            write(piece if records is None else records.unfiltered(piece, base))
+            wrote_content = wrote_content or bool(piece.strip())
+    elif html_mode == "strip_tags":
+        paragraph_ok = True
+        if params['para_filter_enabled_var']:
+            # The whole text is one paragraph here, so its sentence/word counts are needed before any output
+            num_sentences = num_words = 0
+            for group, _ in _group_sentences(stage0(raw_pieces(True), False)):
+                group_sentences, group_words = paragraph_counts(group)
+                num_sentences += group_sentences; num_words += group_words
+            paragraph_ok = paragraph_counts_valid(num_sentences, num_words,
+                                                  params['para_min_sentences_var'], params['para_min_words_var'],
+                                                  params['para_min_avg_len_var'], params['para_max_avg_len_var'])
+            groups = _group_sentences(stage0(raw_pieces(False), locate))
+        else:
+            groups = _group_sentences(stage0(raw_pieces(True), locate))
+        if paragraph_ok:
+            for group, offset_map in groups:
+                emit(filtered(group, offset_map, segment_spans(group, params, check_paragraphs=False)))
+        else:
+            # process_text's fallback: the rejected paragraph's lines, and here that is one line
+            parts, whole_map, at = [], OffsetMap() if locate else None, 0
+            for group, group_map in groups:
+                if locate: whole_map.add_slice(group_map, 0, len(group), at)
+                parts.append(group)
+                at += len(group) + 1
+            whole_text = ' '.join(parts)
+            if whole_text: emit(filtered(whole_text, whole_map, [(0, len(whole_text))]))
+    else:
+        any_segments = any_processed_text = False
+        for processed_piece, offset_map in stage0(raw_pieces(True), locate):
+            any_processed_text = any_processed_text or bool(processed_piece.strip())
+            spans = segment_spans(processed_piece, params)
+            if spans:
+                any_segments = True
+                emit(filtered(processed_piece, offset_map, spans))
+        if not any_segments and any_processed_text:
+            # process_text's fallback when every paragraph was rejected: filter line by line instead
+            for processed_piece, offset_map in stage0(raw_pieces(False), locate):
+                emit(filtered(processed_piece, offset_map, line_spans(processed_piece)))
+
+    if urls and records is not None:
+        write(url_records(source, urls))
+        wrote_content = True
+    elif urls:
+        formatted_urls, _ = format_urls(urls)
+        if not wrote_content: write("<No main content passed filters>")
+        write(formatted_urls)
+        wrote_content = True
+    return wrote_content, saw_text
+
+
+# --- Public entry points ---
+def output_path_for(filepath, settings):
+    """Per-file output path: next to the input (or its archive), with the user's suffix (or the default), .txt or .jsonl."""
+    user_suffix = settings['custom_output_suffix_var'].strip()
+    actual_suffix = user_suffix if user_suffix else DEFAULT_OUTPUT_FILE_SUFFIX
+    return output_stem(filepath) + actual_suffix + OUTPUT_EXTENSIONS[settings['output_format_var']]
+
+def stream_path_for(filepath, settings, occurrence=0):
+    """
+    Where a worker streams a large file's output before the parent moves it into place.
+    `occurrence` tells apart the tasks of a batch that share an output path (see StreamPaths).
+    """
+    return output_path_for(filepath, settings) + (f".{occurrence}.part" if occurrence else ".part")
+
+class StreamPaths:
+    """
+    Hands out the stream paths of a batch's tasks: a file given twice, or two files with
+    the same output path (a.txt and a.pdf), still stream to different .part files.
+    """
+    def __init__(self, settings):
+        self.settings = settings
+        self._claimed = {} # Output path -> how many tasks got a stream path for it
+
+    def claim(self, filepath):
+        output_path = output_path_for(filepath, self.settings)
+        occurrence = self._claimed.get(output_path, 0)
+        self._claimed[output_path] = occurrence + 1
+        return stream_path_for(filepath, self.settings, occurrence)
+
+class StreamedOutput:
+    """'success' data for output a worker already wrote to the file at `path`, instead of returning it as a string."""
+    def __init__(self, path):
+        self.path = path
+
+def salvage_stream_output(filepath, settings, reason, stream_path=None):
+    """
+    For a worker that was killed mid-file: returns what it had streamed so far (to
+    `stream_path`, by default stream_path_for's), with a note saying the output is
+    partial, as a StreamedOutput. None if it wrote nothing.
+    """
+    if stream_path is None: stream_path = stream_path_for(filepath, settings)
+    jsonl = settings['output_format_var'] == 'jsonl'
+    try:
+        if jsonl: _drop_incomplete_line(stream_path)
+        if os.path.getsize(stream_path) == 0:
+            os.remove(stream_path)
+            return None
+        with open(stream_path, 'a', encoding='utf-8') as f_out:
+            if jsonl: f_out.write(record_line({'type': 'partial', 'file': filepath, 'reason': reason}))
+            else: f_out.write(PARTIAL_OUTPUT_NOTE.format(reason=reason))
+    except FileNotFoundError:
+        return None
+    return StreamedOutput(stream_path)
+
+def _drop_incomplete_line(path):
+    """Cuts a file back to just after its last newline, dropping a JSONL record the worker was killed in the middle of."""
+    with open(path, 'rb+') as f:
+        position = f.seek(0, os.SEEK_END)
+        while position > 0:
+            step = min(STREAM_CHUNK_SIZE, position)
+            f.seek(position - step)
+            newline = f.read(step).rfind(b"\n")
+            if newline >= 0:
+                f.truncate(position - step + newline + 1)
+                return
+            position -= step
+        f.truncate(0)
+
+def save_output(data, output_path):
+    """Writes worker output (a string or a StreamedOutput) to `output_path`."""
+    if isinstance(data, StreamedOutput):
+        os.replace(data.path, output_path)
+        return
+    with open(output_path, 'w', encoding='utf-8') as f_out: f_out.write(data)
+
+def append_output(data, f_out):
+    """Appends worker output (a string or a StreamedOutput) to an open text file."""
+    if isinstance(data, StreamedOutput):
+        with open(data.path, 'r', encoding='utf-8') as f_in: shutil.copyfileobj(f_in, f_out, STREAM_CHUNK_SIZE)
+        os.remove(data.path)
+        return
+    f_out.write(data)
+
+def filter_text(text, settings=None):
+    """Runs `process_text` on any text. `settings` may be partial; missing keys use the defaults."""
+    return process_text(text, make_settings(settings))
+
+def skipped_unknown_result(filepath):
+    extension = os.path.splitext(filepath)[1].lower()
+    return ('skipped_unknown', f"Skipped (unknown extension '{extension}'): {os.path.basename(filepath)}.")
+
+def _stream_file(filepath, params, stream_path, chunk_source, page_index=None):
+    try:
+        with open(stream_path, 'w', encoding='utf-8') as f_out:
+            def flushed_chunks():
+                # Everything filtered so far reaches the disk before the next chunk (or page) is read,
+                # so a worker killed on timeout leaves usable partial output
+                for chunk in chunk_source():
+                    yield chunk
+                    f_out.flush()
+            wrote_content, saw_text = stream_filter_text(flushed_chunks, params, f_out.write, params['extract_urls_enabled_var'] == 1, page_index,
+                                                         source=filepath)
+    except Exception:
+        if os.path.exists(stream_path): os.remove(stream_path)
+        raise
+    if not saw_text and input_size(filepath) > 0:
+        os.remove(stream_path)
+        return ('error', f"No text could be extracted from {os.path.basename(filepath)}. Check file integrity or type.")
+    if not wrote_content:
+        os.remove(stream_path)
+        return ('skipped_empty', f"No content passed filters or URLs found for {os.path.basename(filepath)}.")
+    return ('success', StreamedOutput(stream_path))
+
+def _extract_pdf_shard(filepath, pages_to_process, first_page, stop_page, shard_path):
+    """
+    Writes the raw text of pages first_page to stop_page - 1 to `shard_path`, exactly as
+    extracted, and the page numbers and lengths to `shard_path` + '.pages'.
+    """
+    page_index = PageIndex()
+    with open(shard_path, 'w', encoding='utf-8', errors='surrogatepass', newline='') as f_out:
+        for page in iter_pdf_pages(filepath, pages_to_process, first_page, stop_page, page_index):
+            f_out.write(page)
+    with open(shard_path + '.pages', 'w', encoding='utf-8') as f_out:
+        json.dump(page_index.pairs(), f_out)
+    return ('success', shard_path)
+
+def _iter_shard_chunks(shard_paths, page_index=None):
+    """Reads back the shards written by _extract_pdf_shard, in order, a chunk at a time."""
+    for shard_path in shard_paths:
+        if page_index is not None:
+            with open(shard_path + '.pages', 'r', encoding='utf-8') as f:
+                for number, length in json.load(f): page_index.add_page(number, length)
+        with open(shard_path, 'r', encoding='utf-8', errors='surrogatepass', newline='') as f:
+            for chunk in iter(lambda: f.read(STREAM_CHUNK_SIZE), ''):
+                yield chunk
+
+def _cached_pages(pages, cache, cache_key, page_index=None):
+    """
+    Passes pages through, storing their joined text in the raw text cache once the last one is read
+    (and the pages recorded in `page_index`, under the key + '-pages').
+    """
+    collected = []
+    for page in pages:
+        collected.append(page)
+        yield page
+    if collected:
+        cache.put(cache_key, "".join(collected))
+        if page_index is not None: cache.put(cache_key + '-pages', json.dumps(page_index.pairs()))
+
+def _cached_page_index(cache, cache_key):
+    """The PageIndex stored by _cached_pages, or None if it isn't in the cache."""
+    pairs = cache.get(cache_key + '-pages')
+    if pairs is None: return None
+    page_index = PageIndex()
+    for number, length in json.loads(pairs): page_index.add_page(number, length)
+    return page_index
+
+def extract_file(filepath, settings=None, stream_path=None, pdf_shard=None):
+    """
+    Extracts and filters a single file. Returns a (status, data) tuple where status is
+    'success' (data = output text, URLs appended if enabled; JSONL records with that output format), 'skipped_unknown',
+    'skipped_empty' or 'error' (data = message). Text-routed files whose content is binary
+    are 'skipped_unknown' too.
+    If `stream_path` is given, text files above the streaming threshold and PDFs are
+    filtered a chunk (or page) at a time and written to `stream_path` as they go;
+    data is then a StreamedOutput. If the worker is killed, salvage_stream_output
+    recovers what was written.
+    `pdf_shard` is for text_stripper_shards.run_sharded: with 'auto', a PDF with more
+    pages than the split setting returns ('split', page count) instead of being
+    extracted; ('pages', first, stop, shard_path) writes that page range's raw text to
+    shard_path; ('merge', shard_paths) filters the shards' text into `stream_path`.
+    """
+    params = make_settings(settings)
+    try:
+        raw_full_text = ""
+        pages_to_process = params['pages_to_process_var']
+        # Determine which extractor to use
+        kind = get_extension_router(params).route(filepath)
+        if kind is None:
+            return skipped_unknown_result(filepath)
+        if kind == 'text':
+            # Samples the file first: binaries are rejected before being read, text gets its real encoding
+            encoding, description = sniff_text_file(filepath)
+            if encoding is None:
+                return ('skipped_unknown', f"Skipped (binary content, looks like {description}): {os.path.basename(filepath)}.")
+        if stream_path and kind == 'text' and input_size(filepath) > params['stream_threshold_mb_var'] * 1024 * 1024:
+            return _stream_file(filepath, params, stream_path, lambda: iter_text_file_chunks(filepath, encoding=encoding))
+        if kind == 'pdf' and isinstance(pdf_shard, tuple) and pdf_shard[0] == 'pages':
+            return _extract_pdf_shard(filepath, pages_to_process, *pdf_shard[1:])
+        # Plain text is as cheap to re-read as a cache entry, so only the parsed formats are cached
+        cache = cache_key = None
+        # Where each page starts, for segment locations and JSONL records; stays None for other files
+        page_index = PageIndex() if kind == 'pdf' and (params['segment_locations_var'] or params['output_format_var'] == 'jsonl') else None
+        if kind in ('docx', 'pdf') and params['raw_cache_enabled_var'] == 1:
+            cache = get_raw_text_cache(params['raw_cache_dir_var'], params['raw_cache_max_mb_var'])
+            cache_key = cache.key_for(filepath, kind, EXTRACTOR_VERSION, pages_to_process if kind == 'pdf' else 0)
+            raw_full_text = cache.get(cache_key) or ""
+            if raw_full_text and page_index is not None: page_index = _cached_page_index(cache, cache_key)
+        if stream_path and kind == 'pdf' and not raw_full_text:
+            if pdf_shard == 'auto' and params['pdf_shard_pages_var'] > 0:
+                page_count = pdf_page_count(filepath, pages_to_process)
+                if page_count > params['pdf_shard_pages_var']: return ('split', page_count)
+            if isinstance(pdf_shard, tuple) and pdf_shard[0] == 'merge':
+                pages = lambda: _iter_shard_chunks(pdf_shard[1], page_index)
+            else:
+                pages = lambda: iter_pdf_pages(filepath, pages_to_process, page_index=page_index)
+            if cache is None: return _stream_file(filepath, params, stream_path, pages, page_index)
+            return _stream_file(filepath, params, stream_path, lambda: _cached_pages(pages(), cache, cache_key, page_index), page_index)
+        if stream_path and os.path.exists(stream_path):
+            os.remove(stream_path) # Left by a crashed run; it must not be salvaged as this file's output
+        if not raw_full_text:
+            if kind == 'docx':
+                raw_full_text = extract_text_from_docx(filepath)
+            elif kind == 'pdf':
+                raw_full_text = extract_text_from_pdf(filepath, pages_to_process, page_index)
+            else:
+                raw_full_text = extract_text_from_txt(filepath, encoding)
+            if cache is not None and raw_full_text:
+                cache.put(cache_key, raw_full_text)
+                if page_index is not None: cache.put(cache_key + '-pages', json.dumps(page_index.pairs()))
+        if not raw_full_text and input_size(filepath) > 0:
+            return ('error', f"No text could be extracted from {os.path.basename(filepath)}. Check file integrity or type.")
+        jsonl = params['output_format_var'] == 'jsonl'
+        formatted_urls_from_raw = ""
+        if params['extract_urls_enabled_var'] == 1 and raw_full_text is not None:
+            if jsonl:
+                urls = {}
+                collect_urls(raw_full_text, urls)
+                formatted_urls_from_raw = url_records(filepath, urls)
+            else:
+                formatted_urls_from_raw, _ = extract_and_format_urls(raw_full_text)
+        processed_text_content = process_text(raw_full_text if raw_full_text is not None else "", params, page_index, source=filepath)
+        final_output_data = processed_text_content
+        if jsonl:
+            final_output_data += formatted_urls_from_raw # Records are whole lines, so they just follow each other
+        elif not final_output_data.strip() and formatted_urls_from_raw:
+            final_output_data = "<No main content passed filters>" + formatted_urls_from_raw
+        elif final_output_data.strip() and formatted_urls_from_raw:
+            final_output_data += formatted_urls_from_raw
+        if not final_output_data.strip():
+            return ('skipped_empty', f"No content passed filters or URLs found for {os.path.basename(filepath)}.")
+        return ('success', final_output_data)
+    except Exception as e:
+        print(f"ERROR: Exception while processing {filepath}: {traceback.format_exc()}")
+        return ('error', f"An unexpected error occurred during processing: {e}")
@@ -0,0 +1,134 @@
+"""
+GC Text Extractor - input enumeration.
+
+Turns what the user gave us (files, folders, glob patterns) into a lazy stream of
+file paths. Folders are walked with os.scandir one directory at a time, so the
+worker pool can start on the first files while the rest of a huge tree is still
+being enumerated. Files come sorted by name within each folder, except in folders
+of more than SORTED_FOLDER_LIMIT entries: those are listed in os.scandir order as
+they are read, so a huge flat folder neither sits in memory whole nor holds up
+the first file. Symlink loops are detected by (device, inode), and hidden files
+and folders are skipped unless asked for. Zip and tar archives can be opened and
+their members listed in place of the archive (see text_stripper_archives).
+"""
+
+import fnmatch
+import glob
+import itertools
+import os
+import re
+import stat
+
+from text_stripper_archives import is_archive, iter_archive_members
+
+SORTED_FOLDER_LIMIT = 10000 # Folders with more entries are listed unsorted
+_HIDDEN_ATTRIBUTE = getattr(stat, 'FILE_ATTRIBUTE_HIDDEN', 0) if os.name == 'nt' else 0
+
+
+def is_hidden(entry):
+    """True for dot-files, and on Windows for entries with the hidden attribute."""
+    if entry.name.startswith('.'):
+        return True
+    if not _HIDDEN_ATTRIBUTE: return False # No attributes to check, and no stat() call per entry
+    # On Windows, DirEntry.stat() comes from the directory listing without another system call
+    return bool(entry.stat(follow_symlinks=False).st_file_attributes & _HIDDEN_ATTRIBUTE)
+
+def _dir_key(path):
+    st = os.stat(path)
+    return (st.st_dev, st.st_ino)
+
+def walk_directory(root, include_hidden=False, follow_symlinks=False, on_error=None):
+    """
+    Yields every file under `root`, depth first, sorted by name within each folder
+    (up to SORTED_FOLDER_LIMIT entries). Symlinked folders are only entered when
+    `follow_symlinks` is set, and a folder already visited (a symlink loop) is never
+    entered twice.
+    """
+    try:
+        visited = {_dir_key(root)}
+    except OSError as e:
+        if on_error: on_error(root, e)
+        return
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        subdirs = []
+        try:
+            with os.scandir(current) as it:
+                first = list(itertools.islice(it, SORTED_FOLDER_LIMIT + 1))
+                if len(first) <= SORTED_FOLDER_LIMIT:
+                    entries = sorted(first, key=lambda entry: entry.name)
+                else: # A huge folder: the rest is listed as it is read
+                    entries = itertools.chain(first, it)
+                for entry in entries:
+                    try:
+                        if not include_hidden and is_hidden(entry):
+                            continue
+                        if entry.is_dir(follow_symlinks=follow_symlinks):
+                            key = _dir_key(entry.path)
+                            if key in visited: continue # Symlink loop or a folder reached twice
+                            visited.add(key)
+                            subdirs.append(entry.path)
+                        elif entry.is_file():
+                            yield entry.path
+                    except OSError as e:
+                        if on_error: on_error(entry.path, e)
+        except OSError as e: # The folder can't be listed (or stopped listing midway)
+            if on_error: on_error(current, e)
+        stack.extend(reversed(subdirs))
+
+_SEPARATORS = re.compile('[\\\\/]' if os.altsep else '/')
+
+def _match_parts(parts, pattern_parts):
+    """Matches path components against glob components, where '**' spans any number of folders."""
+    if not pattern_parts:
+        return not parts
+    head, rest = pattern_parts[0], pattern_parts[1:]
+    if head == '**':
+        return any(_match_parts(parts[i:], rest) for i in range(len(parts) + 1))
+    return bool(parts) and fnmatch.fnmatch(parts[0], head) and _match_parts(parts[1:], rest)
+
+def iter_recursive_glob(pattern, include_hidden=False, follow_symlinks=False, on_error=None):
+    """
+    Expands a pattern containing '**' with walk_directory instead of glob's own
+    recursion, so the hidden/symlink options apply and symlink loops can't run away.
+    """
+    components = _SEPARATORS.split(pattern)
+    first = next(i for i, component in enumerate(components) if '**' in component)
+    prefix = os.sep.join(components[:first]) or (os.sep if _SEPARATORS.match(pattern) else '')
+    pattern_parts = ['**' if '**' in component else component for component in components[first:]]
+    bases = glob.iglob(prefix) if glob.has_magic(prefix) else [prefix or os.curdir]
+    for base in bases:
+        if not os.path.isdir(base): continue
+        for path in walk_directory(base, include_hidden, follow_symlinks, on_error):
+            relative = os.path.relpath(path, base)
+            if _match_parts(_SEPARATORS.split(relative), pattern_parts):
+                yield path if prefix else relative
+
+def _iter_paths(paths, include_hidden, follow_symlinks, on_error):
+    for path in paths:
+        if os.path.isdir(path):
+            yield from walk_directory(path, include_hidden, follow_symlinks, on_error)
+        elif not os.path.exists(path) and '**' in path:
+            yield from iter_recursive_glob(path, include_hidden, follow_symlinks, on_error)
+        elif not os.path.exists(path) and glob.has_magic(path):
+            for match in glob.iglob(path):
+                if os.path.isfile(match): yield match
+        else:
+            yield path
+
+def iter_input_files(paths, include_hidden=False, follow_symlinks=False, on_error=None, read_archives=False):
+    """
+    Lazily expands files, folders (recursive) and glob patterns into file paths,
+    in argument order. Glob patterns only contribute the files they match. Paths
+    that don't exist are passed through so the caller can report them. With
+    `read_archives`, a zip or tar archive is replaced by its members' paths.
+    """
+    for path in _iter_paths(paths, include_hidden, follow_symlinks, on_error):
+        if not (read_archives and is_archive(path) and os.path.isfile(path)):
+            yield path
+            continue
+        try:
+            yield from iter_archive_members(path, include_hidden)
+        except Exception as e: # Damaged archives raise zipfile, tarfile, zlib, lzma or OS errors
+            if on_error: on_error(path, e)
@@ -0,0 +1,80 @@
+"""
+GC Text Extractor - incremental re-run manifest.
+
+Remembers, for every input processed, its size, modification time and a hash of
+the settings it was processed with. On the next run an input whose size, mtime
+and settings hash all match, and whose output file still exists, is skipped
+with one dict lookup and no extraction at all. Tweaking any filter setting
+changes the settings hash, so every file is redone.
+
+The manifest is a JSON file (by default next to the settings file) and is
+rewritten atomically, so an interrupted batch never leaves a corrupt manifest.
+"""
+
+import hashlib
+import json
+import os
+
+from text_stripper_engine import ENGINE_VERSION
+
+MANIFEST_FILENAME = "text_extractor_manifest.json"
+MANIFEST_FORMAT = 1
+SAVE_EVERY = 200 # Records between saves, so a crash mid-batch loses little
+
+# Settings that change how a batch runs but not what gets written for a file
+_NON_OUTPUT_SETTINGS = {
+    'file_processing_timeout_var', 'worker_count_var', 'include_hidden_files_var', 'follow_symlinks_var',
+    'consolidate_output_enabled_var', 'consolidated_output_filename_var', 'skip_unchanged_files_var',
+    'raw_cache_enabled_var', 'raw_cache_dir_var', 'raw_cache_max_mb_var', 'stream_threshold_mb_var', 'pdf_shard_pages_var',
+    'numpy_scoring_var', 'segment_memo_var', 'adaptive_filter_order_var', 'near_duplicate_mode_var', 'near_duplicate_threshold_var',
+    'consolidated_shard_mb_var', 'consolidated_shard_files_var', 'consolidated_compression_var', 'read_archives_var',
+}
+
+
+def settings_hash(settings):
+    """Stable hash of every setting that can change a file's output (plus the engine version)."""
+    relevant = {name: value for name, value in settings.items() if name not in _NON_OUTPUT_SETTINGS}
+    payload = json.dumps([ENGINE_VERSION, sorted(relevant.items())], separators=(',', ':'))
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class BatchManifest:
+    def __init__(self, path=MANIFEST_FILENAME):
+        self.path = path
+        self.entries = {} # abspath -> [size, mtime_ns, settings hash, output path or None]
+        self._unsaved = 0
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('format') == MANIFEST_FORMAT:
+                self.entries = data.get('files', {})
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"WARN: Ignoring unreadable manifest {path}: {e}")
+
+    def is_unchanged(self, filepath, st, settings_key):
+        """True if `filepath` (with os.stat result `st`) was already processed with these settings."""
+        entry = self.entries.get(os.path.abspath(filepath))
+        if entry is None: return False
+        size, mtime_ns, entry_settings_key, output_path = entry
+        if size != st.st_size or mtime_ns != st.st_mtime_ns or entry_settings_key != settings_key:
+            return False
+        return output_path is None or os.path.exists(output_path)
+
+    def record(self, filepath, st, settings_key, output_path=None):
+        """Remembers a finished file. `st` should be the stat taken before it was processed."""
+        self.entries[os.path.abspath(filepath)] = [st.st_size, st.st_mtime_ns, settings_key,
+                                                   os.path.abspath(output_path) if output_path else None]
+        self._unsaved += 1
+        if self._unsaved >= SAVE_EVERY: self.save()
+
+    def save(self):
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'format': MANIFEST_FORMAT, 'files': self.entries}, f, separators=(',', ':'))
+            os.replace(temp_path, self.path)
+            self._unsaved = 0
+        except OSError as e:
+            print(f"ERROR: Failed to save manifest {self.path}: {e}")
@@ -0,0 +1,175 @@
+"""
+GC Text Extractor - near-duplicate segments across the files of a consolidated batch.
+
+Disclaimers, footers and cookie notices pass the filters in every document that
+carries them, so a consolidated file can hold hundreds of copies of the same
+paragraphs, each a little different (a date, a page number). NearDuplicateIndex
+remembers the kept segments of the files written so far as MinHash signatures
+of their word 3-grams, and a segment whose shingle set is at least `threshold`
+similar (Jaccard) to one of an earlier file is a near-duplicate. Repeats within
+one file are left to the engine's "Drop repeated segments" setting.
+
+Signatures use one-permutation hashing: every shingle is hashed once (crc32,
+so runs are reproducible) and goes to one of SIGNATURE_BINS bins, keeping the
+smallest value per bin; empty bins borrow from the next filled one. Candidates
+come from LSH buckets (NUM_BANDS bands of ROWS_PER_BAND bins), and a candidate
+is a duplicate only if enough bins match. The index stops growing at
+MAX_SEGMENTS segments (about 1 KB each); from then on it only checks.
+"""
+
+import array
+import json
+import os
+import re
+import zlib
+
+from text_stripper_engine import StreamedOutput, LOCATION_PREFIX, STREAM_CHUNK_SIZE, record_line
+
+NUM_BANDS = 12
+ROWS_PER_BAND = 4
+SIGNATURE_BINS = NUM_BANDS * ROWS_PER_BAND
+MAX_SEGMENTS = 100000
+SHINGLE_WORDS = 3
+_EMPTY_BIN = 0xFFFFFFFF
+_MIX = 0x9E3779B97F4A7C15 # Spreads crc32's bits over 64 before they are split into bin and value
+_MASK64 = (1 << 64) - 1
+_WORD = re.compile(r'\w+')
+# Lines the engine adds to an output that are not segments: the URL list, partial output note, empty result
+_NOT_SEGMENTS = ('--- ', '<No main content passed filters>')
+_SEGMENT_RECORD = '{"type":"segment",' # How a JSONL segment record line starts; URL and other records are passed through
+
+
+def signature(text):
+    """MinHash signature of `text`'s word 3-grams (an array of SIGNATURE_BINS values), or None if it has no words."""
+    words = _WORD.findall(text.lower())
+    if not words: return None
+    if len(words) < SHINGLE_WORDS: shingles = [' '.join(words)]
+    else: shingles = [' '.join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)]
+    bins = [_EMPTY_BIN] * SIGNATURE_BINS
+    for shingle in shingles:
+        h = (zlib.crc32(shingle.encode('utf-8', 'surrogatepass')) * _MIX) & _MASK64
+        index, value = h % SIGNATURE_BINS, h >> 32
+        if value < bins[index]: bins[index] = value
+    # Densify: an empty bin takes the next filled bin's value, shifted by the distance so it can't collide
+    filled = [i for i, value in enumerate(bins) if value != _EMPTY_BIN]
+    if len(filled) < SIGNATURE_BINS:
+        dense, next_filled = list(bins), filled[0] + SIGNATURE_BINS
+        for i in range(SIGNATURE_BINS - 1, -1, -1):
+            if bins[i] != _EMPTY_BIN: next_filled = i
+            else: dense[i] = (bins[next_filled % SIGNATURE_BINS] + (next_filled - i) * 0x9E3779B1) & 0xFFFFFFFF
+        bins = dense
+    return array.array('I', bins)
+
+
+class NearDuplicateIndex:
+    """Kept segments of the files written so far in a batch."""
+    def __init__(self, threshold=0.8, max_segments=MAX_SEGMENTS):
+        self.min_matching_bins = max(1, round(threshold * SIGNATURE_BINS))
+        self.max_segments = max_segments
+        self.buckets = {} # hash of (band, band values) -> id of the first segment in it
+        self.signatures = [] # By segment id
+        self.sources = [] # Name of the file each segment came from, by id
+        self.checked = self.duplicates = 0
+
+    def lookup(self, segment):
+        """
+        (name of the file an earlier near-duplicate of `segment` came from, None) if there is
+        one, else (None, entry), where the entry can be passed to `add` once the file is done.
+        Segments without words are neither duplicates nor indexed: (None, None).
+        """
+        sig = signature(LOCATION_PREFIX.sub('', segment, count=1))
+        if sig is None: return None, None
+        self.checked += 1
+        raw = sig.tobytes()
+        band_size = ROWS_PER_BAND * sig.itemsize
+        keys = [hash((band, raw[band * band_size:(band + 1) * band_size])) for band in range(NUM_BANDS)]
+        tried = set()
+        for key in keys:
+            candidate = self.buckets.get(key)
+            if candidate is None or candidate in tried: continue
+            tried.add(candidate)
+            if sum(1 for a, b in zip(sig, self.signatures[candidate]) if a == b) >= self.min_matching_bins:
+                self.duplicates += 1
+                return self.sources[candidate], None
+        return None, (sig, keys)
+
+    def add(self, entries, source):
+        """Indexes the `lookup` entries of a file's new segments (while there is room)."""
+        for sig, keys in entries:
+            if len(self.signatures) >= self.max_segments: return
+            segment_id = len(self.signatures)
+            self.signatures.append(sig)
+            self.sources.append(source)
+            for key in keys: self.buckets.setdefault(key, segment_id)
+
+    def summary(self):
+        return f"{self.duplicates} of {self.checked} segments were near-duplicates of earlier files"
+
+
+def _iter_output_segments(data):
+    """The blank-line separated parts of worker output (a string or a StreamedOutput)."""
+    if not isinstance(data, StreamedOutput):
+        yield from data.split("\n\n")
+        return
+    rest = ''
+    with open(data.path, 'r', encoding='utf-8') as f_in:
+        for chunk in iter(lambda: f_in.read(STREAM_CHUNK_SIZE), ''):
+            parts = (rest + chunk).split("\n\n")
+            rest = parts.pop()
+            yield from parts
+    yield rest
+    os.remove(data.path)
+
+
+def _iter_output_lines(data):
+    """The lines of JSONL worker output (a string or a StreamedOutput), with their newlines."""
+    if not isinstance(data, StreamedOutput):
+        # Not splitlines: records may hold characters like U+2028 that it takes for line breaks
+        lines = data.split("\n")
+        last = lines.pop()
+        for line in lines: yield line + "\n"
+        if last: yield last
+        return
+    with open(data.path, 'r', encoding='utf-8', newline='\n') as f_in:
+        yield from f_in
+    os.remove(data.path)
+
+
+def append_deduplicated(data, f_out, index, source, mode):
+    """
+    append_output for a consolidated file, checking each segment against `index`: with
+    mode 'drop' near-duplicates of earlier files are left out, with 'flag' they are kept
+    with "[near-duplicate of <file>] " in front. The file's other segments are indexed
+    afterwards, as coming from `source`.
+    """
+    wrote, new_entries = False, []
+    for segment in _iter_output_segments(data):
+        if segment.strip() and not segment.startswith(_NOT_SEGMENTS):
+            seen_in, entry = index.lookup(segment)
+            if entry is not None: new_entries.append(entry)
+            if seen_in is not None:
+                if mode == 'drop': continue
+                segment = f"[near-duplicate of {seen_in}] {segment}"
+        if wrote: f_out.write("\n\n")
+        f_out.write(segment)
+        wrote = True
+    index.add(new_entries, source)
+
+
+def append_deduplicated_records(data, f_out, index, source, mode):
+    """
+    append_deduplicated for JSONL output: a segment record that near-duplicates an earlier
+    file's is left out with mode 'drop', and gets a "near_duplicate_of" field with 'flag'.
+    """
+    new_entries = []
+    for line in _iter_output_lines(data):
+        if line.startswith(_SEGMENT_RECORD):
+            record = json.loads(line)
+            seen_in, entry = index.lookup(record['text'])
+            if entry is not None: new_entries.append(entry)
+            if seen_in is not None:
+                if mode == 'drop': continue
+                record['near_duplicate_of'] = seen_in
+                line = record_line(record)
+        f_out.write(line)
+    index.add(new_entries, source)
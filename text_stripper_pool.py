@@ -0,0 +1,185 @@
+"""
+Persistent worker pool for GC Text Extractor.
+
+Instead of spawning a brand-new multiprocessing.Process (and re-importing every
+dependency) for each file, the pool keeps up to N worker processes warm for the
+whole batch. Workers are only started when there is a task for them, so a batch
+of two files never pays for spawning a worker per CPU core. Every task still runs
+under its own timeout: a worker that overruns it is terminated and replaced, while
+the other workers carry on.
+
+Each worker talks to the parent over its own Pipe, so killing a stuck worker can
+never corrupt a queue that the healthy workers are still writing to.
+"""
+
+import multiprocessing
+from multiprocessing.connection import wait
+import os
+import time
+
+
+def resolve_worker_count(requested):
+    """Turns the 'worker count' setting into a real process count (0 = auto)."""
+    try: requested = int(requested)
+    except (TypeError, ValueError): requested = 0
+    return requested if requested > 0 else (os.cpu_count() or 1)
+
+def _worker_main(target, conn):
+    """Worker loop: receive (seq, args), run target(*args), send back (seq, status, data)."""
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            break
+        if task is None:
+            break
+        seq, args = task
+        try:
+            status, data = target(*args)
+        except Exception as e:
+            status, data = 'error', f"An unexpected error occurred during processing: {e}"
+        try:
+            conn.send((seq, status, data))
+        except (BrokenPipeError, OSError):
+            break
+    conn.close()
+
+
+class _Worker:
+    def __init__(self, target):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_worker_main, args=(target, child_conn), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.seq = None # Sequence number of the task in flight, None when idle
+        self.task_id = None
+        self.deadline = None
+
+    def submit(self, seq, task_id, args, timeout):
+        self.conn.send((seq, args))
+        self.seq, self.task_id = seq, task_id
+        self.deadline = time.monotonic() + timeout if timeout and timeout > 0 else None
+
+    def mark_idle(self):
+        self.seq = self.task_id = self.deadline = None
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        try: self.conn.send(None)
+        except (BrokenPipeError, OSError): pass
+        self.process.join(timeout=2)
+        if self.process.is_alive(): self.process.terminate(); self.process.join()
+        self.conn.close()
+
+
+class WorkerPool:
+    """
+    A fixed-size pool of long-lived worker processes running `target(*args)`.
+    `target` must be a picklable top-level function returning a (status, data) tuple.
+    """
+    def __init__(self, target, num_workers=None):
+        self.target = target
+        self.num_workers = resolve_worker_count(num_workers)
+        self._workers = []
+        self._seq = 0
+
+    def _has_room(self):
+        return len(self._workers) < self.num_workers or any(w.seq is None for w in self._workers)
+
+    def _idle_worker(self):
+        """An idle worker, or a newly started one if all are busy (check _has_room first)."""
+        for worker in self._workers:
+            if worker.seq is None: return worker
+        self._workers.append(_Worker(self.target))
+        return self._workers[-1]
+
+    def _discard(self, worker):
+        """Kills a stuck or dead worker; a replacement is started when there is work for it."""
+        worker.kill()
+        self._workers.remove(worker)
+
+    def run(self, tasks, timeout=None, stop_event=None):
+        """
+        Runs an iterable of (task_id, args) tuples across the pool and yields
+        (task_id, status, data) as results arrive (completion order, not input order).
+        `tasks` may also produce None, meaning "nothing yet": it is asked again after
+        the next result, so it can add follow-up work based on that result. With no
+        task running there is no next result to wait for, so that raises RuntimeError.
+        A task exceeding `timeout` seconds yields status 'timeout'; a worker that
+        dies mid-task yields 'error'. Once `stop_event` is set no new tasks are
+        dispatched, but tasks already in flight are allowed to finish.
+        """
+        self._workers = [w for w in self._workers if w.process.is_alive()]
+        try:
+            yield from self._run(iter(tasks), timeout, stop_event)
+        finally:
+            # If the caller abandons the generator early, don't leave half-done tasks behind
+            for worker in list(self._workers):
+                if worker.seq is not None: self._discard(worker)
+
+    def _run(self, pending, timeout, stop_event):
+        exhausted = False
+        while True:
+            # Hand out work to every idle worker, starting workers as needed
+            while not exhausted:
+                if stop_event is not None and stop_event.is_set():
+                    exhausted = True; break
+                if not self._has_room(): break
+                try:
+                    task = next(pending)
+                except StopIteration:
+                    exhausted = True; break
+                if task is None: break # Nothing to hand out until a running task finishes
+                task_id, args = task
+                self._seq += 1
+                self._idle_worker().submit(self._seq, task_id, args, timeout)
+
+            busy = [w for w in self._workers if w.seq is not None]
+            if not busy:
+                if exhausted: return
+                raise RuntimeError("Task iterator produced None with no task running, so nothing could follow.")
+
+            deadlines = [w.deadline for w in busy if w.deadline is not None]
+            wait_for = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            # Poll at least every second so a worker that dies silently is noticed
+            wait_for = 1.0 if wait_for is None else min(wait_for, 1.0)
+            ready = wait([w.conn for w in busy], timeout=wait_for)
+
+            for worker in busy:
+                if worker.conn in ready:
+                    try:
+                        seq, status, data = worker.conn.recv()
+                    except (EOFError, OSError):
+                        task_id = worker.task_id
+                        self._discard(worker)
+                        yield task_id, 'error', "Worker process exited unexpectedly."
+                        continue
+                    task_id = worker.task_id
+                    worker.mark_idle()
+                    yield task_id, status, data
+                elif worker.deadline is not None and time.monotonic() >= worker.deadline:
+                    task_id = worker.task_id
+                    self._discard(worker)
+                    yield task_id, 'timeout', None
+                elif not worker.process.is_alive():
+                    task_id = worker.task_id
+                    self._discard(worker)
+                    yield task_id, 'error', "Worker process exited unexpectedly."
+
+    def shutdown(self):
+        """Stops every worker. The pool restarts lazily if `run` is called again."""
+        for worker in self._workers:
+            if worker.seq is None: worker.stop()
+            else: worker.kill()
+        self._workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
@@ -0,0 +1,124 @@
+"""
+GC Text Extractor - page-sharded extraction of large PDFs.
+
+PyPDF2 extracts one page at a time on one core, so a single 3,000-page PDF can
+keep a batch running long after the other workers have gone idle. `run_sharded`
+wraps WorkerPool.run for extract_file tasks: a worker that finds a PDF longer
+than the "split PDFs" setting answers 'split' instead of extracting it, and the
+page range is cut into shards that any idle worker can pick up (each opens its
+own PdfReader and writes the raw text of its pages, plus their page numbers, to
+a temp folder). Once every shard is in, one last task streams the shards' text,
+in page order, through the filters. That is the same text the serial path
+extracts, so the output is byte-identical.
+
+Each shard runs under the normal per-file timeout, and if any shard fails the
+whole file is reported with that shard's status.
+"""
+
+import collections
+import itertools
+import os
+import shutil
+import tempfile
+
+
+def shard_bounds(num_pages, num_shards):
+    """Page boundaries splitting `num_pages` into `num_shards` ranges of near-equal size."""
+    return [num_pages * i // num_shards for i in range(num_shards + 1)]
+
+
+class _ShardedFile:
+    def __init__(self, task_id, args, num_shards):
+        self.task_id = task_id
+        self.args = args # The file's original extract_file args
+        self.temp_dir = tempfile.mkdtemp(prefix="text_extractor_shards_")
+        self.shard_paths = [os.path.join(self.temp_dir, f"{i:05d}.txt") for i in range(num_shards)]
+        self.remaining = num_shards
+        self.failure = None # (status, data) of the first shard that failed
+
+    def cleanup(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+
+class _ShardTask:
+    """Task id of a shard (index = shard number) or of the final merge (index = None)."""
+    def __init__(self, sharded_file, index):
+        self.sharded_file = sharded_file
+        self.index = index
+
+
+def run_sharded(pool, tasks, timeout=None, stop_event=None):
+    """
+    Like `pool.run(tasks, ...)` for tasks of the form (task_id, (filepath, settings,
+    stream_path, 'auto')), but PDFs the workers report as too long are split into
+    page shards that run in parallel. Yields exactly one (task_id, status, data) per
+    input task, in completion order. A pool with a single worker has nothing to
+    gain from splitting, so there the PDF is just extracted serially. The pool sees
+    a number per dispatch instead of `task_id`, so task ids need not be unique (but
+    each task needs its own stream_path, see StreamPaths).
+    """
+    injected = collections.deque() # Shard and merge tasks, handed out before new files
+    numbers = itertools.count()
+    task_args = {} # Dispatch number -> (task_id, args), for files in flight
+    sharded_files = set()
+
+    def pending():
+        for task_id, args in tasks:
+            while injected: yield injected.popleft()
+            number = next(numbers)
+            task_args[number] = (task_id, args)
+            yield number, args
+        # Keep the pool waiting (None = nothing to hand out yet) while a file in flight may still split
+        while injected or sharded_files or task_args:
+            yield injected.popleft() if injected else None
+
+    try:
+        # `dispatch` is a file's dispatch number, or the _ShardTask of a shard or merge
+        for dispatch, status, data in pool.run(pending(), timeout=timeout, stop_event=stop_event):
+            if not isinstance(dispatch, _ShardTask):
+                task_id, args = task_args.pop(dispatch)
+                if status != 'split':
+                    yield task_id, status, data
+                    continue
+                filepath, settings, stream_path = args[:3]
+                if pool.num_workers == 1:
+                    task_args[dispatch] = (task_id, args)
+                    injected.append((dispatch, (filepath, settings, stream_path, None)))
+                    continue
+                num_shards = -(-data // settings['pdf_shard_pages_var'])
+                sharded_file = _ShardedFile(task_id, args, num_shards)
+                sharded_files.add(sharded_file)
+                bounds = shard_bounds(data, num_shards)
+                for index, shard_path in enumerate(sharded_file.shard_paths):
+                    shard = ('pages', bounds[index], bounds[index + 1], shard_path)
+                    injected.append((_ShardTask(sharded_file, index), (filepath, settings, stream_path, shard)))
+                continue
+
+            sharded_file = dispatch.sharded_file
+            if dispatch.index is None: # The merge is done, so the file is too
+                sharded_files.discard(sharded_file)
+                sharded_file.cleanup()
+                yield sharded_file.task_id, status, data
+                continue
+            sharded_file.remaining -= 1
+            if status != 'success' and sharded_file.failure is None:
+                sharded_file.failure = (status, data)
+            if sharded_file.remaining > 0:
+                continue
+            if sharded_file.failure is not None:
+                sharded_files.discard(sharded_file)
+                sharded_file.cleanup()
+                yield (sharded_file.task_id,) + sharded_file.failure
+                continue
+            filepath, settings, stream_path = sharded_file.args[:3]
+            merge = ('merge', tuple(sharded_file.shard_paths))
+            injected.append((_ShardTask(sharded_file, None), (filepath, settings, stream_path, merge)))
+    finally:
+        for sharded_file in sharded_files: sharded_file.cleanup()
+
+    # Only reached if the pool stopped handing out work (stop_event) with files half done: split ones,
+    # and ones a single worker was to extract serially after all, still waiting in `task_args`
+    for sharded_file in sharded_files:
+        yield sharded_file.task_id, 'error', "Processing stopped before every page was extracted."
+    for task_id, _ in task_args.values():
+        yield task_id, 'error', "Processing stopped before every page was extracted."
@@ -0,0 +1,125 @@
+"""
+GC Text Extractor - telling text from binary before a file is read as text.
+
+Everything routed to the text extractor used to be decoded whole as UTF-8 with
+errors ignored, so in "Attempt All Dropped Files" mode a stray multi-GB binary was
+read, decoded and filtered into garbage. sniff_text_file looks at a sample from
+the start and the end of the file instead (SAMPLE_BYTES each), in this order:
+
+1. A byte order mark: UTF-8, UTF-16 or UTF-32 text.
+2. A magic number of a common binary format (images, archives, executables,
+   media, databases, PDF): binary.
+3. NUL bytes at every other position, mostly odd or mostly even ones, that
+   decode cleanly: UTF-16 text without a BOM.
+4. More than CONTROL_RATIO_LIMIT control bytes (NUL and the other C0 codes
+   that text doesn't use): binary.
+5. Non-ASCII bytes that aren't UTF-8 (fewer valid multi-byte sequences than
+   invalid bytes) in one sample and no UTF-8 in the other: an 8-bit legacy
+   encoding, read as cp1252. Anything else is read as UTF-8, as before.
+
+An archive member read from its archive (a zip member, or a tar member streamed
+from its offset) is only sampled at the start: reaching its end means
+decompressing, or reading through, everything before it. Members small enough
+to travel with their bytes get both samples.
+
+A verdict costs two small reads, so a binary is rejected in microseconds and a
+text file is decoded with the encoding it was written in.
+"""
+
+import codecs
+
+from text_stripper_archives import input_size, open_input, split_member_path
+
+SAMPLE_BYTES = 8 * 1024
+CONTROL_RATIO_LIMIT = 0.05 # Compressed or random data has about 11% control bytes, text next to none
+UTF16_NUL_RATIO = 0.4 # Share of code units with a NUL high byte for BOM-less UTF-16 (ASCII-heavy text)
+LEGACY_ENCODING = 'cp1252'
+
+_BOMS = ( # UTF-32 first: its little-endian BOM starts with UTF-16's
+    (codecs.BOM_UTF32_LE, 'utf-32'), (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+_MAGIC_NUMBERS = (
+    (b'\x89PNG\r\n\x1a\n', "PNG image"), (b'\xff\xd8\xff', "JPEG image"), (b'GIF87a', "GIF image"), (b'GIF89a', "GIF image"),
+    (b'II*\x00', "TIFF image"), (b'MM\x00*', "TIFF image"), (b'%PDF-', "PDF document"),
+    (b'PK\x03\x04', "zip archive or Office document"), (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', "old Office document"),
+    (b'\x1f\x8b', "gzip data"), (b'\xfd7zXZ\x00', "xz data"), (b'(\xb5/\xfd', "zstd data"),
+    (b"7z\xbc\xaf'\x1c", "7-Zip archive"), (b'Rar!\x1a\x07', "RAR archive"),
+    (b'\x7fELF', "ELF executable"), (b'\xcf\xfa\xed\xfe', "Mach-O executable"), (b'\xca\xfe\xba\xbe', "Java class or Mach-O executable"),
+    (b'SQLite format 3\x00', "SQLite database"), (b'OggS', "Ogg media"), (b'fLaC', "FLAC audio"),
+    (b'ID3\x03', "MP3 audio"), (b'ID3\x04', "MP3 audio"), (b'\x1aE\xdf\xa3', "Matroska/WebM media"),
+    (b'wOFF', "WOFF font"), (b'wOF2', "WOFF font"),
+)
+# C0 controls other than backspace (man page overstrike), tab, newlines, form feed and escape (ANSI colors)
+_CONTROL_BYTES = bytes(range(0x00, 0x08)) + bytes(range(0x0e, 0x1b)) + bytes(range(0x1c, 0x20)) + b'\x7f'
+
+
+def _read_samples(filepath):
+    """(head, tail) samples; the tail is empty when the head holds the whole file."""
+    size = input_size(filepath)
+    with open_input(filepath) as f:
+        if size <= 2 * SAMPLE_BYTES: return f.read(), b''
+        head = f.read(SAMPLE_BYTES)
+        if split_member_path(filepath) is not None and getattr(filepath, 'data', None) is None:
+            return head, b'' # Zip and streamed tar members: reaching the tail means reading up to it
+        f.seek((size - SAMPLE_BYTES) & ~3) # Keeps UTF-16/32 code units aligned
+        return head, f.read(SAMPLE_BYTES)
+
+def _magic_number(head):
+    for magic, description in _MAGIC_NUMBERS:
+        if head.startswith(magic): return description
+    if head[4:8] == b'ftyp': return "MP4/QuickTime media"
+    return None
+
+def _utf16_without_bom(head):
+    """'utf-16-le' or 'utf-16-be' if the NULs fall on one side of the code units and the sample decodes, else None."""
+    units = len(head) // 2
+    if units < 2: return None
+    even_nuls, odd_nuls = head[0:units * 2:2].count(0), head[1:units * 2:2].count(0)
+    if odd_nuls >= units * UTF16_NUL_RATIO and even_nuls < units * 0.05: encoding = 'utf-16-le'
+    elif even_nuls >= units * UTF16_NUL_RATIO and odd_nuls < units * 0.05: encoding = 'utf-16-be'
+    else: return None
+    try:
+        codecs.getincrementaldecoder(encoding)().decode(head[:units * 2], final=False)
+    except UnicodeDecodeError:
+        return None
+    return encoding
+
+def _control_ratio(sample):
+    return (len(sample) - len(sample.translate(None, _CONTROL_BYTES))) / len(sample) if sample else 0.0
+
+def _utf8_evidence(sample):
+    """
+    0 for plain ASCII, 1 for UTF-8 (a sequence cut at either end is fine, and a few
+    invalid bytes are outvoted by valid multi-byte characters), -1 for anything else.
+    """
+    if sample.isascii(): return 0
+    start = 0
+    while start < min(3, len(sample)) and 0x80 <= sample[start] <= 0xbf: start += 1 # Cut off at the front (tail sample)
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(sample[start:], final=False)
+        return 1
+    except UnicodeDecodeError:
+        pass
+    decoded = codecs.getincrementaldecoder('utf-8')('replace').decode(sample[start:], final=False)
+    invalid = decoded.count('\ufffd')
+    return 1 if len(decoded) - invalid - len(decoded.encode('ascii', 'ignore')) >= invalid else -1
+
+def sniff_text_file(filepath):
+    """
+    (encoding, None) for a text file, with the encoding to read it with, or
+    (None, what it looks like) for a binary file.
+    """
+    head, tail = _read_samples(filepath)
+    for bom, encoding in _BOMS:
+        if head.startswith(bom): return encoding, None
+    description = _magic_number(head)
+    if description: return None, description
+    encoding = _utf16_without_bom(head)
+    if encoding: return encoding, None
+    if _control_ratio(head) > CONTROL_RATIO_LIMIT or _control_ratio(tail) > CONTROL_RATIO_LIMIT:
+        return None, "binary data"
+    evidence = (_utf8_evidence(head), _utf8_evidence(tail))
+    if min(evidence) < 0 and max(evidence) <= 0: return LEGACY_ENCODING, None
+    return 'utf-8', None # Including files that mix both, read as before
@@ -0,0 +1,151 @@
+"""
+GC Text Extractor - NumPy batch scoring for the per-segment filters.
+
+The code, number, alphanumeric and word-count checks only compare a few counts
+per segment with thresholds. With NumPy installed, `reject_flags` scores a list
+of segments at once instead of one at a time: the segments are joined into one
+buffer (newline-separated) and decoded to codepoints, a lookup table maps each
+codepoint to its character class (the same classes segment_stats counts), and
+every count is one `reduceat` over the buffer at the segment offsets. Only the
+keyword count of the code check needs the words themselves; it is done in
+Python, and only for the segments whose outcome depends on it. The decisions
+are exactly those of the scalar checks in text_stripper_engine.
+
+NumPy is imported on first use. Without it, `available()` is False and the
+engine keeps its scalar path.
+"""
+
+from text_stripper_engine import (CODE_KEYWORDS_LIST, _char_class_table, is_code_like_segment,
+                                  is_number_heavy_segment, fails_alphanumeric_check, fails_sentence_check)
+
+MAX_BATCH_CHARS = 1 << 20 # Characters scored at a time, which bounds the temporary arrays
+
+_numpy = None
+_whitespace_table = None # Codepoint -> str.isspace, up to U+3000, the highest whitespace codepoint
+
+def available():
+    """True if NumPy can be imported (the import happens here, once)."""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy is not False
+
+def _whitespace_lookup(np):
+    global _whitespace_table
+    if _whitespace_table is None:
+        _whitespace_table = np.array([chr(code).isspace() for code in range(0x3001)], dtype=bool)
+    return _whitespace_table
+
+def _class_codes(np, codepoints, table):
+    """Class letter (as a byte) of every codepoint, through the engine's _CharClassTable."""
+    classes = np.empty(len(codepoints), dtype=np.uint8)
+    is_ascii = codepoints < 128
+    classes[is_ascii] = np.frombuffer(table.ascii_table, dtype=np.uint8)[codepoints[is_ascii]]
+    if not is_ascii.all():
+        others = codepoints[~is_ascii]
+        unique, inverse = np.unique(others, return_inverse=True)
+        unique_classes = ''.join(table[int(code)] for code in unique).encode('ascii')
+        classes[~is_ascii] = np.frombuffer(unique_classes, dtype=np.uint8)[inverse]
+    return classes
+
+def _score_batch(np, segments, plan):
+    table = _char_class_table(plan.symbol_set)
+    joined = '\n'.join(segments) + '\n'
+    codepoints = np.frombuffer(joined.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+    lengths = np.fromiter(map(len, segments), dtype=np.int64, count=len(segments))
+    starts = np.zeros(len(segments), dtype=np.int64)
+    np.cumsum(lengths[:-1] + 1, out=starts[1:])
+    # Each range runs from a segment's start to the next one's, so it also covers the separator,
+    # which is whitespace of class O and so adds nothing to any count
+    count = lambda mask: np.add.reduceat(mask, starts, dtype=np.int64)
+
+    classes = _class_codes(np, codepoints, table)
+    decimals = classes == ord('E')
+    digits = decimals | (classes == ord('D'))
+    alnum = count(digits | (classes == ord('L')))
+    symbols = count(classes == ord('S'))
+    if table.alnum_symbols:
+        symbols += count(np.isin(codepoints, [ord(char) for char in table.alnum_symbols]))
+    whitespace = _whitespace_lookup(np)
+    is_space = (codepoints < len(whitespace)) & whitespace[np.minimum(codepoints, len(whitespace) - 1)]
+    word_starts = ~is_space
+    word_starts[1:] &= is_space[:-1]
+    word_count = count(word_starts)
+    space_words = count(codepoints == 32) + 1 # len(segment.split(' '))
+    # rstrip().endswith(('.', '!', '?')): the last non-whitespace character of each segment
+    last_solid = np.maximum.reduceat(np.where(is_space, -1, np.arange(len(codepoints))), starts)
+    last_char = codepoints[np.maximum(last_solid, 0)]
+    ends_sentence = (last_solid >= 0) & ((last_char == ord('.')) | (last_char == ord('!')) | (last_char == ord('?')))
+
+    rejected = np.zeros(len(segments), dtype=bool)
+    code_args = None
+    for check, args in plan.checks:
+        if check is is_code_like_segment:
+            code_args = args # Last, so its keyword counts are only needed for segments still in play
+        elif check is is_number_heavy_segment:
+            ratio_thresh, min_digits_for_ratio, max_consecutive, min_words_exempt = args
+            heavy = np.zeros(len(segments), dtype=bool)
+            if max_consecutive > 0:
+                # Length of the decimal run ending at each position; runs never cross the separator
+                running = np.cumsum(decimals, dtype=np.int64)
+                running -= np.maximum.accumulate(np.where(decimals, 0, running))
+                heavy |= np.maximum.reduceat(running, starts) >= max_consecutive
+            if ratio_thresh > 0:
+                digit_count = count(digits)
+                heavy |= (digit_count >= min_digits_for_ratio) & (digit_count / np.maximum(lengths, 1) > ratio_thresh)
+            if min_words_exempt > 0:
+                heavy &= space_words < min_words_exempt
+            rejected |= heavy & (lengths > 0)
+        elif check is fails_alphanumeric_check:
+            min_len_for_ratio, threshold, abs_count_fallback = args
+            short = lengths < min_len_for_ratio
+            fails = np.where(short, alnum == 0, (alnum / np.maximum(lengths, 1) < threshold) & (alnum < abs_count_fallback))
+            rejected |= fails | (lengths == 0)
+        elif check is fails_sentence_check:
+            min_words_general_sequence, min_words_punctuated_sentence = args
+            passes = (ends_sentence & (word_count >= min_words_punctuated_sentence)) | (word_count >= min_words_general_sequence)
+            rejected |= ~passes | (word_count == 0)
+        else:
+            raise ValueError(f"No batch scoring for filter check {check.__name__}")
+
+    if code_args is not None:
+        min_keywords, min_symbols, min_words_check, symbol_density_thresh = code_args
+        checked = (space_words >= min_words_check) & (lengths > 0)
+        code_like = checked & (symbols / np.maximum(lengths, 1) > symbol_density_thresh)
+        enough_symbols = symbols >= min_symbols
+        many_symbols = symbols > min_symbols * 2.5
+        if min_keywords <= 0:
+            code_like |= checked & (enough_symbols | many_symbols)
+        else:
+            if min_keywords // 2 <= 0:
+                code_like |= checked & many_symbols
+            undecided = np.flatnonzero(checked & ~code_like & ~rejected & (enough_symbols | many_symbols))
+            for index in undecided.tolist():
+                keyword_hits = sum(1 for word in segments[index].split(' ') if word in CODE_KEYWORDS_LIST or word.lower() in CODE_KEYWORDS_LIST)
+                if (keyword_hits >= min_keywords and enough_symbols[index]) or \
+                   (many_symbols[index] and keyword_hits >= max(0, min_keywords // 2)):
+                    code_like[index] = True
+        rejected |= code_like
+    return rejected.tolist()
+
+def reject_flags(segments, plan):
+    """
+    For each of `segments`, True if one of `plan.checks` rejects it. Returns None if
+    NumPy is missing or batch scoring can't reproduce the scalar checks for this plan,
+    in which case the caller checks the segments one by one.
+    """
+    if not available() or '\n' in plan.symbol_set: # The separator must stay out of every count
+        return None
+    flags, batch, batch_chars = [], [], 0
+    for segment in segments:
+        batch.append(segment)
+        batch_chars += len(segment) + 1
+        if batch_chars >= MAX_BATCH_CHARS:
+            flags.extend(_score_batch(_numpy, batch, plan))
+            batch, batch_chars = [], 0
+    if batch: flags.extend(_score_batch(_numpy, batch, plan))
+    return flags